@@ -0,0 +1,55 @@
+"""
+Benchmark of the compiled Borsh decoder against the anchorpy coder. The
+decoded values are compared in tests/test_decoder.py.
+
+    python -m benchmarks.bench_decoder [-n 2000]
+"""
+
+import json
+from argparse import ArgumentParser
+
+from anchorpy import Coder, Idl
+
+from psol.decoder import CompiledCoder
+
+from .common import account_blobs, instruction_blobs, load_idl, measure, normalize
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=2000, help="Blobs per kind.")
+    args = parser.parse_args()
+
+    idl_json = load_idl()
+    anchor = Coder(Idl.from_json(json.dumps(idl_json)))
+    compiled = CompiledCoder(idl_json)
+
+    accounts = account_blobs(idl_json, args.n)
+    instructions = instruction_blobs(idl_json, args.n)
+
+    for kind, blobs, ref, fast in [
+        (
+            "account",
+            accounts,
+            lambda b: normalize(anchor.accounts.decode(b)),
+            compiled.decode_account,
+        ),
+        (
+            "instruction",
+            instructions,
+            lambda b: normalize(anchor.instruction.parse(b).data),
+            compiled.decode_instruction,
+        ),
+    ]:
+        base = measure(ref, blobs)
+        new = measure(fast, blobs)
+        print(
+            f"{kind:12} anchorpy {base['ops_per_sec']:9.0f}/s"
+            f"  compiled {new['ops_per_sec']:9.0f}/s"
+            f"  speedup {new['ops_per_sec'] / base['ops_per_sec']:5.1f}x"
+            f"  p50 {base['p50_us']:.1f}us -> {new['p50_us']:.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
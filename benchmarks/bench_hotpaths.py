@@ -0,0 +1,241 @@
+"""
+Benchmark of the decode and index hot paths against a saved baseline.
+
+    python -m benchmarks.bench_hotpaths [-n 2000] [--runs 5] [--save-baseline]
+    python -m benchmarks.bench_hotpaths --record-fixtures
+
+Inputs are the recorded fixtures in benchmarks/fixtures, RPC is served by a
+mock transport and psol state lives in a temporary HOME. Every case is
+measured in `--runs` rounds, each time right after a reference case that
+does not use psol, and the median of its throughput relative to the
+reference is compared to the baseline's, so a machine that is slower for
+a while does not read as a regression. The run fails if a case is slower
+than the baseline by more than `--max-regression`.
+"""
+
+import base64
+import contextlib
+import io
+import json
+import os
+import pathlib
+import platform
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+from .common import FIXTURES, load_blobs, load_idl, measure, record_blobs
+
+BASELINE = pathlib.Path(__file__).parent / "baseline.json"
+
+CLUSTER = "mainnet"
+PROGRAM_ID = "Bench11111111111111111111111111111111111111"
+
+# Programs in the discriminator index during lookups.
+INDEXED_PROGRAMS = 1000
+
+# Case measuring the speed of the interpreter, see `run_cases`.
+REFERENCE = "reference"
+
+
+def reference(values: list[int]) -> dict:
+    # Plain python work of the kind decoding does: loops, dicts and ints.
+    return {str(i): v * 2 for i, v in enumerate(values) if v & 1}
+
+
+def pubkeys(count: int) -> list[str]:
+    from solders.pubkey import Pubkey
+
+    return [str(Pubkey.new_unique()) for _ in range(count)]
+
+
+def mock_rpc(psol, accounts: dict[str, bytes]):
+    # Serve getAccountInfo of `accounts` without network access.
+    import httpx
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        data = accounts[payload["params"][0]]
+        value = {
+            "lamports": 1_000_000,
+            "data": [base64.b64encode(data).decode(), "base64"],
+            "owner": PROGRAM_ID,
+            "executable": False,
+            "rentEpoch": 0,
+            "space": len(data),
+        }
+        result = {"context": {"slot": 1}, "value": value}
+        return httpx.Response(
+            200, json={"jsonrpc": "2.0", "id": payload["id"], "result": result}
+        )
+
+    psol.transport.session = httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def cases(n: int) -> list[tuple[str, object, list]]:
+    # psol paths are resolved from HOME at import time.
+    from anchorpy import Coder, Idl
+
+    from psol import output
+    from psol.console import PsolConsole
+    from psol.psol import Psol
+    from psol.utils import SolanaJSONEncoder, to_dict
+
+    idl_json = load_idl()
+    idl_str = json.dumps(idl_json)
+    blobs = load_blobs()
+    accounts = (blobs["accounts"] * n)[:n]
+    instructions = (blobs["instructions"] * n)[:n]
+
+    psol = Psol(CLUSTER, rpc_url="http://127.0.0.1:1")
+    idl_db = psol.idl_db
+    paths = [idl_db.save_idl(CLUSTER, k, idl_str) for k in pubkeys(INDEXED_PROGRAMS)]
+    idl_db.save_idl(CLUSTER, PROGRAM_ID, idl_str)
+
+    keys = pubkeys(len(blobs["accounts"]))
+    mock_rpc(psol, dict(zip(keys, blobs["accounts"])))
+
+    anchorpy = Psol(CLUSTER, rpc_url="http://127.0.0.1:1", decoder="anchorpy")
+    coder = Coder(Idl.from_json(idl_str))
+    parsed_ixs = [coder.instruction.parse(b) for b in instructions]
+    parsed_accounts = [coder.accounts.decode(b).__dict__ for b in accounts]
+
+    index_paths = (paths * n)[:n]
+    discriminators = [b[:8].hex() for b in accounts]
+
+    console = PsolConsole(psol)
+    pda_args = [f"{PROGRAM_ID} {key} seed {i:016x}" for i, key in enumerate(keys)]
+
+    def pda(arg: str):
+        with contextlib.redirect_stdout(io.StringIO()):
+            console.do_pda(arg)
+
+    return [
+        ("index_idl", lambda p: idl_db.index_idl(idl_str, p), index_paths),
+        (
+            "discriminator lookup",
+            lambda d: idl_db._lookup(CLUSTER, "account", d, PROGRAM_ID),
+            discriminators,
+        ),
+        ("decode_ix_data", lambda b: psol.decode_ix_data(b.hex()), instructions),
+        (
+            "decode_ix_data anchorpy",
+            lambda b: anchorpy.decode_ix_data(b.hex()),
+            instructions,
+        ),
+        ("get_account_info", psol.get_account_info, (keys * n)[:n]),
+        ("to_dict", to_dict, parsed_ixs),
+        (
+            "SolanaJSONEncoder",
+            lambda a: json.dumps(a, cls=SolanaJSONEncoder),
+            parsed_accounts,
+        ),
+        ("output.dumps", output.dumps, parsed_accounts),
+        ("do_pda", pda, (pda_args * n)[:n]),
+    ]
+
+
+def run_cases(n: int, runs: int) -> dict:
+    # Median result of each case over `runs` rounds. `relative` is the
+    # median of its throughput over the reference's measured just before.
+    rounds = {}
+    relative = {}
+    ref_items = [list(range(i, i + 32)) for i in range(n)]
+    all_cases = cases(n)
+    for _ in range(runs):
+        for name, func, items in all_cases:
+            ref = measure(reference, ref_items)
+            result = measure(func, items)
+            rounds.setdefault(REFERENCE, []).append(ref)
+            rounds.setdefault(name, []).append(result)
+            relative.setdefault(name, []).append(
+                result["ops_per_sec"] / ref["ops_per_sec"]
+            )
+
+    results = {}
+    for name, measured in rounds.items():
+        results[name] = _median(measured, key=lambda r: r["ops_per_sec"])
+        if name in relative:
+            results[name]["relative"] = _median(relative[name])
+    return results
+
+
+def _median(values: list, key=None):
+    return sorted(values, key=key)[len(values) // 2]
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> bool:
+    failed = False
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        status = ""
+        if base and name != REFERENCE:
+            # Baselines without a reference compare raw throughput.
+            if "relative" in base and "relative" in result:
+                ratio = result["relative"] / base["relative"]
+            else:
+                ratio = result["ops_per_sec"] / base["ops_per_sec"]
+            status = f"  {ratio:5.2f}x baseline"
+            if ratio < 1 - max_regression:
+                status += "  REGRESSION"
+                failed = True
+        print(
+            f"{name:24} {result['ops_per_sec']:9.0f}/s"
+            f"  p50 {result['p50_us']:8.1f}us  p99 {result['p99_us']:8.1f}us{status}"
+        )
+    return failed
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=2000, help="Items per case.")
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Rounds, the median is kept."
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Save results as the baseline."
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        # Unmodified trees measure 0.75x-1.15x on a noisy machine.
+        default=0.35,
+        help="Max throughput drop against the baseline, as a fraction.",
+    )
+    parser.add_argument(
+        "--record-fixtures",
+        action="store_true",
+        help=f"Regenerate the account and instruction blobs in {FIXTURES}.",
+    )
+    args = parser.parse_args()
+
+    if args.record_fixtures:
+        record_blobs(load_idl(), 64)
+        return
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        results = run_cases(args.n, args.runs)
+
+    env = {"python": platform.python_version(), "machine": platform.machine()}
+    if args.save_baseline:
+        BASELINE.write_text(
+            json.dumps(
+                {"env": env, "n": args.n, "runs": args.runs, "results": results},
+                indent=2,
+            )
+            + "\n"
+        )
+
+    baseline = {"results": {}}
+    if BASELINE.exists() and not args.save_baseline:
+        baseline = json.loads(BASELINE.read_text())
+        if baseline.get("env") != env:
+            print(f"baseline recorded on {baseline.get('env')}, running on {env}")
+
+    if compare(results, baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
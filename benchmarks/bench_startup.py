@@ -0,0 +1,105 @@
+"""
+Import-time and cold-start benchmark of the psol CLI with a regression budget.
+
+    python -m benchmarks.bench_startup [-n 10] [--budget-ms 150]
+
+Each case runs in a fresh interpreter. Times are reported on top of a bare
+`python -c pass`, and the run fails if a light command goes over budget or
+loads one of the heavy dependencies.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+# Dependencies that commands without RPC or IDL access must not load.
+HEAVY = ["anchorpy", "solana", "httpx", "numpy", "sqlite3", "asyncio"]
+
+# Run a CLI command, then report which heavy modules it imported.
+RUN_CMD = """
+import json, sys
+from psol.cli import main
+sys.argv = ["psol", "--cmd"] + sys.argv[1:]
+main()
+heavy = sorted({m.split(".")[0] for m in sys.modules} & set(%r))
+print(json.dumps(heavy), file=sys.stderr)
+""" % (
+    HEAVY,
+)
+
+CASES = [
+    ("python -c pass", ["-c", "pass"], True),
+    ("import psol.cli", ["-c", "import psol.cli"], True),
+    ("base58 enc", ["-c", RUN_CMD, "base58", "enc", "00ff"], True),
+    ("pda", ["-c", RUN_CMD, "pda", "11111111111111111111111111111111", "seed"], True),
+    ("import psol.psol", ["-c", "import psol.psol"], False),
+]
+
+
+def run(args: list[str], home: str) -> tuple[float, list[str]]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable] + args,
+        capture_output=True,
+        text=True,
+        env={"HOME": home, "PATH": ""},
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise SystemExit(f"{args[1][:40]!r} failed:\n{proc.stderr}")
+
+    heavy = []
+    if proc.stderr.strip():
+        heavy = json.loads(proc.stderr.strip().splitlines()[-1])
+    return elapsed, heavy
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=10, help="Runs per case.")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=150,
+        help="Max median time of light cases on top of python startup.",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    base = None
+    with tempfile.TemporaryDirectory() as home:
+        for name, case_args, light in CASES:
+            times = []
+            heavy = []
+            for _ in range(args.n):
+                elapsed, heavy = run(case_args, home)
+                times.append(elapsed * 1000)
+            times.sort()
+            median = statistics.median(times)
+            if base is None:
+                base = median
+
+            overhead = median - base
+            status = ""
+            if light and name != CASES[0][0]:
+                if overhead > args.budget_ms:
+                    status = f"  OVER BUDGET ({args.budget_ms:.0f}ms)"
+                    failed = True
+                if heavy:
+                    status += f"  LOADS {','.join(heavy)}"
+                    failed = True
+            print(
+                f"{name:18} p50 {median:7.1f}ms  p90 {times[int(len(times) * 0.9)]:7.1f}ms"
+                f"  +{overhead:6.1f}ms{status}"
+            )
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
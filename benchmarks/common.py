@@ -0,0 +1,180 @@
+import json
+import pathlib
+import random
+import struct
+import time
+
+from pyheck import snake
+from solders.pubkey import Pubkey
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+INTS = {
+    "u8": "B",
+    "i8": "b",
+    "u16": "H",
+    "i16": "h",
+    "u32": "I",
+    "i32": "i",
+    "u64": "Q",
+    "i64": "q",
+}
+
+
+def load_idl(name: str = "idl.json") -> dict:
+    return json.loads((FIXTURES / name).read_text())
+
+
+def random_borsh(ty, types: dict, rnd: random.Random) -> bytes:
+    # Random but valid Borsh encoding of an IDL type.
+    if isinstance(ty, str):
+        if ty in INTS:
+            fmt = INTS[ty]
+            bits = struct.calcsize(fmt) * 8
+            if fmt.islower():
+                v = rnd.randint(-(1 << (bits - 1)), (1 << (bits - 1)) - 1)
+            else:
+                v = rnd.randint(0, (1 << bits) - 1)
+            return struct.pack("<" + fmt, v)
+        if ty in ("u128", "i128"):
+            return rnd.randbytes(16)
+        if ty == "bool":
+            return bytes([rnd.randint(0, 1)])
+        if ty == "f32":
+            return struct.pack("<f", rnd.uniform(-1e6, 1e6))
+        if ty == "f64":
+            return struct.pack("<d", rnd.uniform(-1e12, 1e12))
+        if ty in ("publicKey", "pubkey"):
+            return rnd.randbytes(32)
+        if ty == "string":
+            s = "".join(rnd.choice("abcdefé日 ") for _ in range(rnd.randint(0, 24)))
+            b = s.encode()
+            return struct.pack("<I", len(b)) + b
+        if ty == "bytes":
+            n = rnd.randint(0, 48)
+            return struct.pack("<I", n) + rnd.randbytes(n)
+        raise ValueError(f"Unknown type {ty}")
+
+    if "vec" in ty:
+        n = rnd.randint(0, 8)
+        return struct.pack("<I", n) + b"".join(
+            random_borsh(ty["vec"], types, rnd) for _ in range(n)
+        )
+    if "option" in ty:
+        if rnd.random() < 0.3:
+            return b"\x00"
+        return b"\x01" + random_borsh(ty["option"], types, rnd)
+    if "array" in ty:
+        inner, n = ty["array"]
+        return b"".join(random_borsh(inner, types, rnd) for _ in range(n))
+    if "defined" in ty:
+        typedef = types[ty["defined"]]
+        if typedef["kind"] == "struct":
+            return b"".join(
+                random_borsh(f["type"], types, rnd) for f in typedef["fields"]
+            )
+        i = rnd.randrange(len(typedef["variants"]))
+        fields = typedef["variants"][i].get("fields") or []
+        # Fields of tuple variants are bare types.
+        return bytes([i]) + b"".join(
+            random_borsh(
+                f["type"] if isinstance(f, dict) and "name" in f else f, types, rnd
+            )
+            for f in fields
+        )
+    raise ValueError(f"Unknown type {ty}")
+
+
+def idl_types(idl: dict) -> dict:
+    types = {t["name"]: t["type"] for t in idl.get("types", [])}
+    for account in idl.get("accounts", []):
+        types[account["name"]] = account["type"]
+    return types
+
+
+def account_blobs(idl: dict, count: int, seed: int = 0) -> list[bytes]:
+    from hashlib import sha256
+
+    rnd = random.Random(seed)
+    types = idl_types(idl)
+    blobs = []
+    for i in range(count):
+        account = idl["accounts"][i % len(idl["accounts"])]
+        disc = sha256(f"account:{account['name']}".encode()).digest()[:8]
+        blobs.append(disc + random_borsh({"defined": account["name"]}, types, rnd))
+    return blobs
+
+
+def instruction_blobs(idl: dict, count: int, seed: int = 0) -> list[bytes]:
+    from hashlib import sha256
+
+    rnd = random.Random(seed)
+    types = idl_types(idl)
+    blobs = []
+    for i in range(count):
+        ix = idl["instructions"][i % len(idl["instructions"])]
+        disc = sha256(f"global:{snake(ix['name'])}".encode()).digest()[:8]
+        args = b"".join(random_borsh(arg["type"], types, rnd) for arg in ix["args"])
+        blobs.append(disc + args)
+    return blobs
+
+
+def normalize(obj):
+    # Convert anchorpy decode results to the plain form of the compiled coder.
+    if isinstance(obj, Pubkey):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.hex()
+    if isinstance(obj, dict):
+        return {k: normalize(v) for k, v in obj.items() if not k.startswith("_")}
+    if isinstance(obj, (list, tuple)):
+        return [normalize(v) for v in obj]
+    if hasattr(obj, "_sumtype_attribs"):
+        attrs = [name for name, _ in obj._sumtype_attribs]
+        if attrs == ["tuple_data"]:
+            return {type(obj).__name__: normalize(obj.tuple_data)}
+        return {type(obj).__name__: {k: normalize(getattr(obj, k)) for k in attrs}}
+    if hasattr(obj, "__dict__"):
+        return normalize(obj.__dict__)
+    return obj
+
+
+def measure(func, items: list, repeat: int = 5) -> dict:
+    # Throughput and per-item latency percentiles of the median of `repeat`
+    # runs, after a warm-up run. Unlike the best run, the median is not
+    # moved by one lucky or one preempted run.
+    for item in items:
+        func(item)
+
+    runs = []
+    for _ in range(repeat):
+        latencies = []
+        start = time.perf_counter()
+        for item in items:
+            t = time.perf_counter()
+            func(item)
+            latencies.append(time.perf_counter() - t)
+        runs.append((time.perf_counter() - start, sorted(latencies)))
+
+    runs.sort(key=lambda run: run[0])
+    total, latencies = runs[len(runs) // 2]
+    return {
+        "ops_per_sec": len(items) / total,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+def record_blobs(idl: dict, count: int, path: pathlib.Path = FIXTURES / "blobs.json"):
+    # Freeze generated blobs so results stay comparable when the generator
+    # or the IDL fixture changes.
+    blobs = {
+        "accounts": [b.hex() for b in account_blobs(idl, count)],
+        "instructions": [b.hex() for b in instruction_blobs(idl, count)],
+    }
+    path.write_text(json.dumps(blobs, indent=0) + "\n")
+
+
+def load_blobs(path: pathlib.Path = FIXTURES / "blobs.json") -> dict[str, list[bytes]]:
+    blobs = json.loads(path.read_text())
+    return {kind: [bytes.fromhex(b) for b in items] for kind, items in blobs.items()}
@@ -1 +1,8 @@
-from .psol import Psol
+# Psol is imported on first access, the console and CLI load without the
+# RPC and anchorpy dependencies until a command needs them.
+def __getattr__(name: str):
+    if name == "Psol":
+        from .psol import Psol
+
+        return Psol
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
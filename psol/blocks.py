@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator
+
+from .psol import Psol
+
+# Blocks fetched ahead of the one being decoded.
+FETCH_AHEAD = 4
+
+# Transactions per task sent to a decode worker process.
+DECODE_CHUNK_SIZE = 256
+
+# Psol and coder memo of a decode worker process.
+_worker = None
+_coders = {}
+
+
+def _init_worker(cluster: str, decoder: str):
+    global _worker
+    # Workers only read IDLs, they never send requests.
+    _worker = Psol(cluster, decoder=decoder, offline=True)
+
+
+def _decode_in_worker(txs: list[dict]) -> tuple[list[dict], dict, float]:
+    return _decode_txs(_worker, txs, _coders)
+
+
+def _decode_txs(
+    psol: Psol, txs: list[dict], coders: dict
+) -> tuple[list[dict], dict, float]:
+    # Decoded txs, program id -> [instructions, undecoded] and CPU time.
+    start = time.process_time()
+    records = []
+    programs = {}
+    for tx in txs:
+        record = psol.decode_transaction(tx, coders)
+        for ix in record["instructions"]:
+            counts = programs.setdefault(ix["program_id"], [0, 0])
+            counts[0] += 1
+            if "error" in ix:
+                counts[1] += 1
+        records.append(record)
+    return records, programs, time.process_time() - start
+
+
+class BlockDecoder(object):
+    """
+    Fetch blocks and decode every instruction of their txs by IDL.
+
+    Blocks are fetched on threads up to FETCH_AHEAD slots ahead, their txs
+    are decoded in chunks on `jobs` worker processes while the next block
+    is fetched, and decoded txs are yielded in slot order. Counters of
+    instructions per program and decode times are kept for `summary`.
+    """
+
+    def __init__(self, psol: Psol, jobs: int | None = None) -> None:
+        self.psol = psol
+        self.jobs = jobs or os.cpu_count() or 1
+        self.coders = {}
+
+        self.blocks = 0
+        self.skipped = []
+        self.txs = 0
+        self.programs = {}
+        self.decode_time = 0.0
+        self.wall = 0.0
+
+    def run(self, slots: Iterable[int]) -> Iterator[dict]:
+        start = time.perf_counter()
+        pool = None
+        if self.jobs > 1:
+            # Workers are spawned, forking would copy the locks held by the
+            # fetch and transport threads.
+            pool = ProcessPoolExecutor(
+                self.jobs,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.psol.cluster, self.psol.decoder),
+            )
+        try:
+            with ThreadPoolExecutor(FETCH_AHEAD, thread_name_prefix="psol-block") as io:
+                slots = iter(slots)
+                fetches = deque(
+                    (slot, io.submit(self.psol.get_block, slot))
+                    for slot in islice(slots, FETCH_AHEAD)
+                )
+                decodes = deque()
+                while fetches or decodes:
+                    if fetches:
+                        slot, future = fetches.popleft()
+                        for next_slot in islice(slots, 1):
+                            fetches.append(
+                                (next_slot, io.submit(self.psol.get_block, next_slot))
+                            )
+                        decodes.append(self._submit(pool, slot, future.result()))
+
+                    # Collect a block once the next one is being decoded.
+                    while decodes and (len(decodes) > 1 or not fetches):
+                        yield from self._collect(decodes.popleft())
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            self.wall += time.perf_counter() - start
+
+    def _submit(self, pool: ProcessPoolExecutor | None, slot: int, block: dict | None):
+        if block is None:
+            self.skipped.append(slot)
+            return []
+
+        self.blocks += 1
+        txs = block.get("transactions") or []
+        for tx in txs:
+            tx["slot"] = slot
+            tx["blockTime"] = block.get("blockTime")
+        chunks = [
+            txs[i : i + DECODE_CHUNK_SIZE]
+            for i in range(0, len(txs), DECODE_CHUNK_SIZE)
+        ]
+        if pool is None:
+            # Decoded in process when collected.
+            return chunks
+        return [pool.submit(_decode_in_worker, chunk) for chunk in chunks]
+
+    def _collect(self, tasks: list) -> Iterator[dict]:
+        for task in tasks:
+            if isinstance(task, list):
+                result = _decode_txs(self.psol, task, self.coders)
+            else:
+                result = task.result()
+            records, programs, cpu = result
+
+            self.txs += len(records)
+            self.decode_time += cpu
+            for program_id, (count, undecoded) in programs.items():
+                counts = self.programs.setdefault(program_id, [0, 0])
+                counts[0] += count
+                counts[1] += undecoded
+            yield from records
+
+    def summary(self) -> dict:
+        instructions = sum(count for count, _ in self.programs.values())
+        return {
+            "blocks": self.blocks,
+            "skipped_slots": self.skipped,
+            "txs": self.txs,
+            "instructions": instructions,
+            "wall_s": self.wall,
+            "decode_cpu_s": self.decode_time,
+            "txs_per_s": self.txs / self.wall if self.wall else 0.0,
+            "instructions_per_s": instructions / self.wall if self.wall else 0.0,
+            "programs": [
+                {
+                    "program_id": program_id,
+                    "instructions": count,
+                    "share": count / instructions,
+                    "undecoded": undecoded,
+                }
+                for program_id, (count, undecoded) in sorted(
+                    self.programs.items(), key=lambda item: -item[1][0]
+                )
+            ],
+        }
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any
+
+from .idl import MAX_SQL_PARAMS, PSOL_DATA
+
+RPC_CACHE_DB = PSOL_DATA / "rpc_cache.db"
+PDA_CACHE_DB = PSOL_DATA / "pda_cache.db"
+
+# Evict least recently used entries once the cache grows over this size.
+MAX_CACHE_BYTES = 512 << 20
+
+# Responses of these methods never change once finalized. Accounts are
+# only cached when executable.
+IMMUTABLE_METHODS = {"getTransaction", "getBlock", "getAccountInfo"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+PDA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pdas (
+    key BLOB PRIMARY KEY,
+    pda TEXT NOT NULL,
+    bump INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def _connect(path: pathlib.Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def cacheable(method: str, params: list | None, result: Any = None) -> bool:
+    # Whether a request may be served from the cache, and with `result`
+    # whether its response may be stored.
+    if method not in IMMUTABLE_METHODS:
+        return False
+
+    config = params[1] if params and len(params) > 1 else None
+    if (
+        isinstance(config, dict)
+        and config.get("commitment", "finalized") != "finalized"
+    ):
+        return False
+    if result is None:
+        return True
+
+    if method == "getAccountInfo":
+        value = result.get("value") if isinstance(result, dict) else None
+        return bool(value) and bool(value.get("executable"))
+    return True
+
+
+class RpcCache(object):
+    """
+    Content-addressed cache of immutable RPC results.
+
+    Entries are keyed by the sha256 of the namespace (endpoint), method and
+    params and stored zlib compressed in SQLite. Total size is capped, the
+    least recently used entries are evicted first.
+    """
+
+    def __init__(
+        self, path: pathlib.Path = RPC_CACHE_DB, max_bytes: int = MAX_CACHE_BYTES
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.db.executescript(SCHEMA)
+        self._size = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def key(self, namespace: str, method: str, params: list | None) -> str:
+        request = json.dumps([namespace, method, params or []], sort_keys=True)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def get(self, key: str) -> Any:
+        # Raise CacheMiss if the key is not cached.
+        row = self.db.execute(
+            "SELECT value FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            raise CacheMiss(key)
+
+        self.hits += 1
+        with self.db:
+            self.db.execute(
+                "UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, method: str, result: Any):
+        value = zlib.compress(json.dumps(result).encode(), 1)
+        with self._lock:
+            # Loaded before the insert, which it would count otherwise.
+            size = self.size()
+            with self.db:
+                old = self.db.execute(
+                    "SELECT size FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries"
+                    " (key, method, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, method, value, len(value), time.time()),
+                )
+            self._size = size + len(value) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def size(self) -> int:
+        if self._size is None:
+            row = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries")
+            self._size = row.fetchone()[0]
+        return self._size
+
+    def _evict(self):
+        # Drop the oldest entries down to 90% of the cap.
+        target = self.max_bytes * 0.9
+        rows = self.db.execute("SELECT key, size FROM entries ORDER BY last_used")
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        with self.db:
+            self.db.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def clear(self):
+        with self._lock:
+            with self.db:
+                self.db.execute("DELETE FROM entries")
+            self._size = 0
+        self.db.execute("VACUUM")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        count = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": count,
+            "bytes": self.size(),
+            "max_bytes": self.max_bytes,
+        }
+
+
+class PdaCache(object):
+    """
+    Program derived addresses keyed by program id and seeds, see
+    `pda.seeds_key`. Derivation is deterministic, entries never expire.
+    """
+
+    def __init__(self, path: pathlib.Path = PDA_CACHE_DB) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = _connect(path)
+        self.db.executescript(PDA_SCHEMA)
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, tuple[str, int]]:
+        found = {}
+        for i in range(0, len(keys), MAX_SQL_PARAMS):
+            chunk = keys[i : i + MAX_SQL_PARAMS]
+            rows = self.db.execute(
+                "SELECT key, pda, bump FROM pdas WHERE key IN (%s)"
+                % ",".join("?" * len(chunk)),
+                chunk,
+            )
+            found.update({key: (pda, bump) for key, pda, bump in rows})
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: list[tuple[bytes, str, int]]):
+        # (key, pda, bump) rows.
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO pdas (key, pda, bump) VALUES (?, ?, ?)", items
+            )
@@ -1,7 +1,9 @@
+import sys
 from argparse import ArgumentParser
 
 from .console import PsolConsole
-from .psol import Psol
+from .output import FORMATS
+from .script import JOBS
 
 
 def get_args():
@@ -23,12 +25,63 @@ def get_args():
         help="RPC endpoint.",
     )
 
+    parser.add_argument(
+        "--ws-url",
+        help="Websocket endpoint, derived from the RPC endpoint by default.",
+    )
+
+    parser.add_argument(
+        "--decoder",
+        choices=["compiled", "anchorpy"],
+        default="compiled",
+        help="IDL decoder backend.",
+    )
+
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="pretty",
+        help="Output format, ndjson prints one JSON value per line.",
+    )
+
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only serve RPC data from the local cache.",
+    )
+
     parser.add_argument(
         "--cmd",
         nargs="+",
         help="Execute one command in peth console.",
     )
 
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print time split, RPC calls and cache hits of every command.",
+    )
+
+    parser.add_argument(
+        "--pstats",
+        metavar="DIR",
+        help="With --profile, also dump a cProfile stats file per command.",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--file",
+        help="Run the commands of a script file, one per line.",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=JOBS,
+        help="Commands of --file run at the same time.",
+    )
+
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -42,13 +95,30 @@ def get_args():
 def main():
     args = get_args()
 
-    psol = Psol(args.cluster, args.rpc_url)
-    console = PsolConsole(psol)
+    def _create_psol():
+        from .psol import Psol
+
+        return Psol(
+            args.cluster,
+            args.rpc_url,
+            args.decoder,
+            args.offline,
+            ws_url=args.ws_url,
+        )
+
+    console = PsolConsole(_create_psol)
 
     if args.debug:
         console._debug = True
 
-    if args.cmd:
+    console.format = args.format
+    console.profile = args.profile
+    console.pstats_dir = args.pstats
+
+    if args.file:
+        if console.run_script(args.file, args.jobs):
+            sys.exit(1)
+    elif args.cmd:
         cmd_str = " ".join(args.cmd)
         for cmd in cmd_str.split(";"):
             console.single_command(cmd)
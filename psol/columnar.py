@@ -0,0 +1,279 @@
+import csv
+import hashlib
+import json
+
+import base58
+from pyheck import snake
+from solders.pubkey import Pubkey
+
+SPL_TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+
+# Built-in layouts of fixed-size non-Anchor accounts: program, size, fields.
+# COption<T> is a u32 tag followed by T.
+BUILTIN_LAYOUTS = {
+    "spl-token:account": (
+        SPL_TOKEN_PROGRAM,
+        165,
+        [
+            ("mint", "publicKey"),
+            ("owner", "publicKey"),
+            ("amount", "u64"),
+            ("delegate_option", "u32"),
+            ("delegate", "publicKey"),
+            ("state", "u8"),
+            ("is_native_option", "u32"),
+            ("is_native", "u64"),
+            ("delegated_amount", "u64"),
+            ("close_authority_option", "u32"),
+            ("close_authority", "publicKey"),
+        ],
+    ),
+    "spl-token:mint": (
+        SPL_TOKEN_PROGRAM,
+        82,
+        [
+            ("mint_authority_option", "u32"),
+            ("mint_authority", "publicKey"),
+            ("supply", "u64"),
+            ("decimals", "u8"),
+            ("is_initialized", "bool"),
+            ("freeze_authority_option", "u32"),
+            ("freeze_authority", "publicKey"),
+        ],
+    ),
+}
+
+NUMPY_TYPES = {
+    "bool": "?",
+    "u8": "u1",
+    "i8": "i1",
+    "u16": "<u2",
+    "i16": "<i2",
+    "u32": "<u4",
+    "i32": "<i4",
+    "u64": "<u8",
+    "i64": "<i8",
+    "f32": "<f4",
+    "f64": "<f8",
+}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Columnar decoding requires numpy: pip install numpy")
+    return numpy
+
+
+class ColumnarLayout(object):
+    """
+    Fixed-size account layout as a NumPy structured dtype. Account data of
+    this type can be viewed as one record array without decoding each
+    account into python objects.
+    """
+
+    def __init__(
+        self, name: str, program_id: str, dtype, discriminator: bytes = None
+    ) -> None:
+        self.name = name
+        self.program_id = program_id
+        self.dtype = dtype
+        self.discriminator = discriminator
+        self.offset = len(discriminator) if discriminator else 0
+        self.size = self.offset + dtype.itemsize
+
+    @property
+    def filters(self) -> list[dict]:
+        # getProgramAccounts filters selecting accounts of this layout.
+        if self.discriminator:
+            data = base58.b58encode(self.discriminator).decode()
+            return [{"memcmp": {"offset": 0, "bytes": data}}]
+        return [{"dataSize": self.size}]
+
+    @classmethod
+    def builtin(cls, name: str) -> "ColumnarLayout":
+        program_id, size, fields = BUILTIN_LAYOUTS[name]
+        dtype = _struct_dtype(fields, {})
+        assert dtype.itemsize == size, f"Invalid layout {name}"
+        return cls(name, program_id, dtype)
+
+    @classmethod
+    def from_idl(
+        cls, idl: dict, account_name: str, program_id: str
+    ) -> "ColumnarLayout":
+        types = {t["name"]: t["type"] for t in idl.get("types", [])}
+        for account in idl.get("accounts", []):
+            if "type" in account:
+                types.setdefault(account["name"], account["type"])
+
+        dtype = _type_dtype({"defined": account_name}, types)
+        if dtype.names is None:
+            raise ValueError(f"{account_name} is not a struct")
+        discriminator = hashlib.sha256(f"account:{account_name}".encode()).digest()
+        return cls(account_name, program_id, dtype, discriminator[:8])
+
+    def decode(self, data: bytes):
+        # View concatenated account data as a record array, no copy.
+        np = _numpy()
+        records = np.frombuffer(data, dtype=self._record_dtype())
+        return records["value"]
+
+    def _record_dtype(self):
+        np = _numpy()
+        return np.dtype(
+            {
+                "names": ["value"],
+                "formats": [self.dtype],
+                "offsets": [self.offset],
+                "itemsize": self.size,
+            }
+        )
+
+
+class ColumnarBuilder(object):
+    # Accumulate raw account data of one layout into contiguous buffers.
+
+    def __init__(self, layout: ColumnarLayout) -> None:
+        self.layout = layout
+        self.skipped = 0
+        self._pubkeys = bytearray()
+        self._data = bytearray()
+
+    def add(self, pubkey: bytes, data: bytes) -> bool:
+        # Accounts that are too short or of another type are skipped.
+        size = self.layout.size
+        discriminator = self.layout.discriminator
+        if len(data) < size or (discriminator and data[:8] != discriminator):
+            self.skipped += 1
+            return False
+
+        self._pubkeys += pubkey
+        self._data += data[:size] if len(data) > size else data
+        return True
+
+    def finish(self):
+        np = _numpy()
+        pubkeys = np.frombuffer(bytes(self._pubkeys), dtype=_pubkey_dtype())
+        records = self.layout.decode(bytes(self._data))
+        return pubkeys, records
+
+
+def columns(pubkeys, records) -> dict:
+    # Flatten nested struct fields into "a.b" named columns.
+    cols = {"pubkey": pubkeys}
+
+    def _walk(arr, prefix: str):
+        if arr.dtype.names is None:
+            cols[prefix[:-1]] = arr
+            return
+        for name in arr.dtype.names:
+            _walk(arr[name], f"{prefix}{name}.")
+
+    _walk(records, "")
+    return cols
+
+
+def save_npz(path: str, cols: dict):
+    # Pubkey and 128-bit columns are stored as raw little-endian bytes.
+    np = _numpy()
+    arrays = {}
+    for name, arr in cols.items():
+        if arr.dtype.kind == "V":
+            size = arr.dtype.itemsize
+            arr = np.ascontiguousarray(arr).view(np.uint8)
+            arr = arr.reshape(arr.shape[:-1] + (-1, size))
+        arrays[name] = arr
+    np.savez(path, **arrays)
+
+
+def save_csv(path: str, cols: dict):
+    headers = []
+    values = []
+    for name, arr in cols.items():
+        flat = arr.reshape(len(arr), -1)
+        width = flat.shape[1]
+        headers += (
+            [name]
+            if width == 1 and arr.ndim == 1
+            else [f"{name}[{i}]" for i in range(width)]
+        )
+        kind = (arr.dtype.metadata or {}).get("type")
+        for i in range(width):
+            column = flat[:, i]
+            if kind == "pubkey":
+                values.append([str(Pubkey.from_bytes(v.tobytes())) for v in column])
+            elif kind in ("u128", "i128"):
+                signed = kind == "i128"
+                values.append(
+                    [
+                        int.from_bytes(v.tobytes(), "little", signed=signed)
+                        for v in column
+                    ]
+                )
+            else:
+                values.append(column.tolist())
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(zip(*values))
+
+
+def save(path: str, pubkeys, records):
+    cols = columns(pubkeys, records)
+    if path.endswith(".csv"):
+        save_csv(path, cols)
+    elif path.endswith(".npz"):
+        save_npz(path, cols)
+    else:
+        raise ValueError(f"Unsupported output format {path}, use .npz or .csv")
+
+
+def _pubkey_dtype():
+    return _numpy().dtype("V32", metadata={"type": "pubkey"})
+
+
+def _struct_dtype(fields: list[tuple[str, object]], types: dict):
+    np = _numpy()
+    return np.dtype([(name, _type_dtype(ty, types)) for name, ty in fields])
+
+
+def _type_dtype(ty, types: dict):
+    # Map an IDL type to a packed dtype, ValueError if it has no fixed size.
+    np = _numpy()
+    if isinstance(ty, str):
+        if ty in NUMPY_TYPES:
+            return np.dtype(NUMPY_TYPES[ty])
+        if ty in ("publicKey", "pubkey"):
+            return _pubkey_dtype()
+        if ty in ("u128", "i128"):
+            return np.dtype("V16", metadata={"type": ty})
+        raise ValueError(f"Type {ty} has no fixed size")
+
+    if "array" in ty:
+        inner, n = ty["array"]
+        return np.dtype((_type_dtype(inner, types), (n,)))
+
+    if "defined" in ty:
+        name = ty["defined"]
+        if isinstance(name, dict):
+            name = name["name"]
+        typedef = types[name]
+        if typedef["kind"] == "alias":
+            return _type_dtype(typedef["value"], types)
+        if typedef["kind"] == "enum":
+            # Borsh encodes enums without fields as a single u8.
+            variants = typedef["variants"]
+            if any(v.get("fields") for v in variants):
+                raise ValueError(f"Enum {name} has no fixed size")
+            return np.dtype(
+                "u1",
+                metadata={"type": "enum", "variants": [v["name"] for v in variants]},
+            )
+        fields = typedef["fields"]
+        if fields and not isinstance(fields[0], dict):
+            return _struct_dtype([(f"_{i}", f) for i, f in enumerate(fields)], types)
+        return _struct_dtype([(snake(f["name"]), f["type"]) for f in fields], types)
+
+    raise ValueError(f"Type {json.dumps(ty)} has no fixed size")
@@ -2,28 +2,50 @@ import base64
 import cmd
 import json
 import os
+import sys
+import threading
 import urllib
+from typing import TYPE_CHECKING, Callable
 
 import base58
-import requests
 from solders.message import Message
 from solders.pubkey import Pubkey
 from solders.signature import Signature
 from solders.transaction import VersionedTransaction
 
-from .psol import Psol
-from .utils import SolanaJSONEncoder
+from . import columnar
+from .output import FORMATS, write, write_records
+from .pda import expand_seeds, find_program_addresses
+from .profiler import profiler
+from .script import JOBS, CommandOutput, ScriptRunner, read_script
+
+if TYPE_CHECKING:
+    from .psol import Psol
 
 
 class PsolConsole(cmd.Cmd):
 
     prompt = "psol > "
 
-    def __init__(self, psol: Psol) -> None:
+    def __init__(self, psol: "Psol | Callable[[], Psol]") -> None:
         super().__init__()
-        self.psol: Psol = psol
+        # A factory defers loading Psol until a command needs it.
+        self._psol = psol
 
         self._debug = False
+        # Output format of commands, see `format`.
+        self.format = "pretty"
+        # Print a profile after every command, see `stats`.
+        self.profile = False
+        self.pstats_dir = None
+        self._lock = threading.Lock()
+
+    @property
+    def psol(self) -> "Psol":
+        with self._lock:
+            if callable(self._psol):
+                self._psol = self._psol()
+        return self._psol
 
     @property
     def client(self):
@@ -52,22 +74,55 @@ class PsolConsole(cmd.Cmd):
         else:
             print(self._normal_str(data, full))
 
+    def _print_value(self, value):
+        write(value, self.format)
+
+    def _print_header(self, header: str):
+        # Human readable separators are left out of pure NDJSON output.
+        if self.format != "ndjson":
+            print(header)
+
+    def _print_ndjson(self, records, path=None, flush=False):
+        if path:
+            with open(os.path.expanduser(path), "ab") as f:
+                write_records(records, f, flush)
+            return
+
+        write_records(records, flush=flush)
+
     def _decode_hex_or_base64(self, s: str) -> bytes:
         try:
             return bytes.fromhex(s)
         except Exception:
             return base64.b64decode(s)
 
+    def execute(self, line: str, profile: bool | None = None):
+        """
+        Run one command line, exceptions are raised to the caller.
+        """
+        # ! run system shell.
+        # ? eval python script.
+        if line.startswith("!"):
+            line = "sh " + line[1:]
+        elif line.startswith("?"):
+            line = "py " + line[1:]
+
+        if profile is None:
+            profile = self.profile
+        if profile and line.split()[:1] not in ([], ["stats"]):
+            with profiler.command(line, self._cache_counters, self.pstats_dir) as stats:
+                stop = super().onecmd(line)
+            print(stats.report(), file=sys.stderr)
+            return stop
+        return super().onecmd(line)
+
+    def default(self, line):
+        # Raise instead of printing, so scripts count it as a failure.
+        raise ValueError(f"Unknown command: {line.split()[0]}")
+
     def onecmd(self, line):
         try:
-            # ! run system shell.
-            # ? eval python script.
-            if line.startswith("!"):
-                line = "sh " + line[1:]
-            elif line.startswith("?"):
-                line = "py " + line[1:]
-
-            return super().onecmd(line)
+            return self.execute(line)
         except Exception as e:
             print("Error: ", e)
             if self._debug:
@@ -77,6 +132,16 @@ class PsolConsole(cmd.Cmd):
             super().onecmd(f"help {cmd}")
             return False  # don't stop
 
+    def _cache_counters(self) -> dict:
+        # Hits and misses of the caches that are already open.
+        if callable(self._psol):
+            return {}
+        counters = {"rpc": (self.psol.rpc_cache.hits, self.psol.rpc_cache.misses)}
+        if self.psol._idl_db is not None:
+            idl_cache = self.psol.idl_db.idl_cache
+            counters["idl"] = (idl_cache.hits, idl_cache.misses)
+        return counters
+
     def start_console(self):
         """
         Start a console. Catch Ctrl+C.
@@ -102,6 +167,40 @@ class PsolConsole(cmd.Cmd):
         self._debug = debug
         self.onecmd(cmd)
 
+    def run_script(self, path: str, jobs: int = JOBS) -> int:
+        """
+        Run the commands of a script file on `jobs` threads, return the
+        number of failed commands.
+        """
+        commands = read_script(path)
+        runner = ScriptRunner(self, jobs, os.path.basename(path))
+        if not self.profile:
+            return runner.run(commands)
+
+        # Commands overlap, so the script is profiled as a whole.
+        with profiler.command(
+            f"script {path}", self._cache_counters, self.pstats_dir
+        ) as stats:
+            failed = runner.run(commands)
+        print(stats.report(), file=sys.stderr)
+        return failed
+
+    def do_script(self, arg: str):
+        """
+        script <file> [-j <n>]: Run independent commands of a file, one per
+        line, on <n> threads. Output is printed in file order.
+        """
+        args = arg.split()
+        path = args.pop(0)
+        jobs = JOBS
+        if args and args[0] == "-j":
+            jobs = int(args[1])
+        assert not isinstance(sys.stdout, CommandOutput), "Scripts can not nest"
+
+        failed = self.run_script(path, jobs)
+        if failed:
+            print(f"{failed} commands failed", file=sys.stderr)
+
     def do_sh(self, arg):
         """
         sh <cmd>: Run system shell command.
@@ -169,19 +268,53 @@ class PsolConsole(cmd.Cmd):
         self.psol.set_cluster(cluster)
         print(f"Cluster set to {cluster}")
 
-    def do_fetch_idl(self, arg: str):
+    def do_decoder(self, decoder: str):
         """
-        fetch_idl <program_id>: Fetch IDL from solscan and onchain.
+        decoder [compiled|anchorpy]: Show or change the IDL decoder backend.
         """
-        program_id = arg.strip()
-        src, idl = self.psol.fetch_idl(program_id)
-        if idl is None:
-            print(f"IDL not found for {program_id}")
+        decoder = decoder.strip()
+        if decoder:
+            self.psol.set_decoder(decoder)
+        print(f"Decoder: {self.psol.decoder}")
+
+    def do_format(self, fmt: str):
+        """
+        format [pretty|compact|ndjson]: Print or set the output format.
+        """
+        fmt = fmt.strip()
+        if not fmt:
+            print(self.format)
             return
+        assert fmt in FORMATS, f"Format must be one of {FORMATS}"
+        self.format = fmt
 
-        name = json.loads(idl)["metadata"]["name"]
+    def do_fetch_idl(self, arg: str):
+        """
+        fetch_idl <program_id> [<program_id> ..] [--refresh]: Fetch IDLs onchain, from explorer and solscan.
+        fetch_idl -f <file> [--refresh]: Fetch IDLs of programs listed in file.
+        """
+        args = arg.split()
+        refresh = "--refresh" in args
+        args = [a for a in args if a != "--refresh"]
+        if args[:1] == ["-f"]:
+            assert len(args) == 2, "Usage: fetch_idl -f <file>"
+            with open(os.path.expanduser(args[1])) as f:
+                args = [line.strip() for line in f if line.strip()]
+        assert args, "No program id provided"
 
-        print(f"IDL {name} found for {program_id} from {src}")
+        if len(args) == 1:
+            results = {args[0]: self.psol.fetch_idl(args[0], refresh)}
+        else:
+            results = self.psol.fetch_idls(args, refresh=refresh)
+
+        for program_id, (src, idl) in results.items():
+            if idl is None:
+                print(f"IDL not found for {program_id}")
+                continue
+
+            idl = json.loads(idl)
+            name = idl.get("metadata", {}).get("name") or idl.get("name")
+            print(f"IDL {name} found for {program_id} from {src}")
 
     def do_local_idl(self, file_path: str):
         """
@@ -194,32 +327,494 @@ class PsolConsole(cmd.Cmd):
         idl = open(file_path).read()
         name = json.loads(idl)["metadata"]["name"]
         print(f"IDL {name} loaded from {file_path}")
-        path = self.psol.idl_db.save_idl("local", name, idl)
+        path = self.psol.idl_db.save_idl(self.psol.cluster, name, idl)
         print(f"Saved to {path}")
 
-    def do_account(self, pubkey: str):
+    def do_import_idls(self, arg: str):
+        """
+        import_idls <dir> [options]: Import and index all IDL files (*.json) under dir.
+          -j <n>              Worker processes, default one per CPU.
+          --cluster <name>    Cluster the IDLs are used on, default the current one.
+          --conflicts <file>  Write discriminators shared by programs as NDJSON.
+        Files unchanged since their last import are skipped.
+        """
+        args = arg.split()
+        positional = []
+        jobs = None
+        cluster = self.psol.cluster
+        conflicts_path = None
+        while args:
+            opt = args.pop(0)
+            if opt == "-j":
+                jobs = int(args.pop(0))
+            elif opt == "--cluster":
+                cluster = args.pop(0)
+            elif opt == "--conflicts":
+                conflicts_path = args.pop(0)
+            else:
+                positional.append(opt)
+
+        assert len(positional) == 1, "Usage: import_idls <dir>"
+        report = self.psol.idl_db.import_idls(positional[0], cluster, jobs)
+        for path, error in report["failed"].items():
+            print(f"Failed {path}: {error}")
+
+        print(
+            f"{report['imported']} IDLs imported, {report['unchanged']} unchanged,"
+            f" {len(report['failed'])} failed of {report['files']} files"
+        )
+        conflicts = report["conflicts"]
+        if conflicts_path:
+            with open(os.path.expanduser(conflicts_path), "wb") as f:
+                write_records(conflicts, f)
+            print(f"{len(conflicts)} conflicts written to {conflicts_path}")
+        elif conflicts:
+            print(
+                f"{len(conflicts)} discriminators shared by several programs,"
+                " see --conflicts"
+            )
+
+    def do_idl_cache(self, arg: str):
         """
-        account <pubkey>: Load account info.
+        idl_cache [clear]: Print IDL cache hit/miss counters.
         """
-        account, parsed = self.psol.get_account_info(pubkey)
-        print(json.dumps(account, indent=2, cls=SolanaJSONEncoder))
+        cache = self.psol.idl_db.idl_cache
+        if arg.strip() == "clear":
+            cache.clear()
+        self._print_value(cache.stats())
+
+    def do_rpc_cache(self, arg: str):
+        """
+        rpc_cache [clear]: Print stats of the cache of immutable RPC data.
+        """
+        cache = self.psol.rpc_cache
+        if arg.strip() == "clear":
+            cache.clear()
+        self._print_value(cache.stats())
+
+    def do_stats(self, arg: str):
+        """
+        stats [on|off|clear|--json]: Print the profile of recent commands.
+        `on` profiles every following command, same as `psol --profile`.
+        """
+        arg = arg.strip()
+        if arg in ("on", "off"):
+            self.profile = arg == "on"
+            return
+        if arg == "clear":
+            profiler.history.clear()
+            return
+
+        if not profiler.history:
+            print("No profiled commands, run `stats on` first.")
+        for stats in profiler.history:
+            if arg == "--json":
+                print(json.dumps(stats.to_dict()))
+            else:
+                print(stats.report())
+
+    def do_account(self, arg: str):
+        """
+        account <pubkey>: Load account info.
+        account <pubkey> --fields <a,b.c,..>: Load only some fields of an IDL account,
+            reading their byte ranges if they are at fixed offsets.
+        """
+        args = arg.split()
+        if "--fields" in args:
+            i = args.index("--fields")
+            fields = args[i + 1].split(",")
+            del args[i : i + 2]
+            assert len(args) == 1, "Usage: account <pubkey> --fields <a,b.c>"
+            self._print_value(self.psol.get_account_fields(args[0], fields))
+            return
+
+        assert len(args) == 1, "Usage: account <pubkey>"
+        account, parsed = self.psol.get_account_info(args[0])
+        self._print_value(account)
         if parsed:
-            print("---- Parsed ----")
-            print(json.dumps(parsed, indent=2, cls=SolanaJSONEncoder))
+            self._print_header("---- Parsed ----")
+            self._print_value(parsed)
 
-    def do_name(self, pubkey: str):
+    def do_accounts(self, arg: str):
         """
-        name <pubkey>: Get account name
+        accounts <pubkey> [<pubkey> ..]: Load accounts in batch, print NDJSON.
+        accounts -f <file>: Load accounts listed in file, one per line.
         """
-        name = self.psol.get_account_name(pubkey)
-        print(name)
+        args = arg.split()
+        if args[:1] == ["-f"]:
+            assert len(args) == 2, "Usage: accounts -f <file>"
+            with open(os.path.expanduser(args[1])) as f:
+                pubkeys = (line.strip() for line in f if line.strip())
+                self._print_ndjson(self.psol.get_multiple_accounts(pubkeys))
+        else:
+            assert args, "No pubkey provided"
+            self._print_ndjson(self.psol.get_multiple_accounts(args))
+
+    def do_scan(self, arg: str):
+        """
+        scan <program_id> [account_type] [options]: Scan program accounts, print NDJSON.
+          --memcmp <offset>:<base58>  Extra memcmp filter, repeatable.
+          --size <n>                  dataSize filter.
+          --slice <offset>:<length>   Only fetch a slice of account data.
+          -o <file>                   Append output to file.
+        """
+        args = arg.split()
+        positional = []
+        filters = []
+        data_slice = None
+        output = None
+        while args:
+            opt = args.pop(0)
+            if opt == "--memcmp":
+                offset, data = args.pop(0).split(":", 1)
+                filters.append({"memcmp": {"offset": int(offset), "bytes": data}})
+            elif opt == "--size":
+                filters.append({"dataSize": int(args.pop(0))})
+            elif opt == "--slice":
+                offset, length = args.pop(0).split(":")
+                data_slice = (int(offset), int(length))
+            elif opt == "-o":
+                output = args.pop(0)
+            else:
+                positional.append(opt)
+
+        assert 1 <= len(positional) <= 2, "Usage: scan <program_id> [account_type]"
+        program_id = positional[0]
+        account_type = positional[1] if len(positional) == 2 else None
+        records = self.psol.scan_program_accounts(
+            program_id, account_type, filters, data_slice
+        )
+        self._print_ndjson(records, output)
+
+    def do_columnar(self, arg: str):
+        """
+        columnar <account_type> -o <file.npz|file.csv> [options]: Decode fixed-size accounts into columns.
+          account_type may be an IDL account or spl-token:account, spl-token:mint.
+          --program <id>  Program to scan, defaults to the IDL's program.
+          -f <file>       Load accounts listed in file instead of scanning.
+        """
+        args = arg.split()
+        positional = []
+        program_id = None
+        pubkeys_file = None
+        output = None
+        while args:
+            opt = args.pop(0)
+            if opt == "--program":
+                program_id = args.pop(0)
+            elif opt == "-f":
+                pubkeys_file = os.path.expanduser(args.pop(0))
+            elif opt == "-o":
+                output = args.pop(0)
+            else:
+                positional.append(opt)
+
+        assert (
+            len(positional) == 1 and output
+        ), "Usage: columnar <account_type> -o <file>"
+        if pubkeys_file:
+            with open(pubkeys_file) as f:
+                pubkeys = [line.strip() for line in f if line.strip()]
+        else:
+            pubkeys = None
+
+        pubkeys, records, skipped = self.psol.get_columnar(
+            positional[0], pubkeys, program_id
+        )
+        columnar.save(output, pubkeys, records)
+        print(f"{len(records)} accounts written to {output}, {skipped} skipped")
+
+    def _watch_args(self, arg: str) -> tuple[list[str], list[dict], str | None]:
+        # Positional args, --memcmp/--size filters and -o output.
+        args = arg.split()
+        positional = []
+        filters = []
+        output = None
+        while args:
+            opt = args.pop(0)
+            if opt == "--memcmp":
+                offset, data = args.pop(0).split(":", 1)
+                filters.append({"memcmp": {"offset": int(offset), "bytes": data}})
+            elif opt == "--size":
+                filters.append({"dataSize": int(args.pop(0))})
+            elif opt == "-o":
+                output = args.pop(0)
+            else:
+                positional.append(opt)
+        return positional, filters, output
+
+    def do_watch_account(self, arg: str):
+        """
+        watch_account <pubkey> [<pubkey> ..] [-o <file>]: Stream decoded account updates as NDJSON.
+        """
+        pubkeys, _, output = self._watch_args(arg)
+        assert pubkeys, "No pubkey provided"
+        self._print_ndjson(self.psol.watch_account(pubkeys), output, flush=True)
+
+    def do_poll_accounts(self, arg: str):
+        """
+        poll_accounts <pubkey> [<pubkey> ..] [options]: Poll accounts, print changes as NDJSON.
+          -f <file>         Poll accounts listed in file.
+          --interval <s>    Seconds between polls, default 5.
+          -o <file>         Append records to file.
+        The first poll prints every account, later ones only changed accounts
+        with a `diff` of the decoded fields.
+        """
+        args = arg.split()
+        pubkeys = []
+        kwargs = {}
+        output = None
+        while args:
+            opt = args.pop(0)
+            if opt == "-f":
+                with open(os.path.expanduser(args.pop(0))) as f:
+                    pubkeys += [line.strip() for line in f if line.strip()]
+            elif opt == "--interval":
+                kwargs["interval"] = float(args.pop(0))
+            elif opt == "-o":
+                output = args.pop(0)
+            else:
+                pubkeys.append(opt)
+
+        assert pubkeys, "No pubkey provided"
+        records = self.psol.poll_accounts(pubkeys, **kwargs)
+        self._print_ndjson(records, output, flush=True)
+
+    def do_watch_program(self, arg: str):
+        """
+        watch_program <program_id> [account_type] [options]: Stream decoded updates of program accounts.
+          --memcmp <offset>:<base58>  Extra memcmp filter, repeatable.
+          --size <n>                  dataSize filter.
+          -o <file>                   Append output to file.
+        """
+        positional, filters, output = self._watch_args(arg)
+        assert (
+            1 <= len(positional) <= 2
+        ), "Usage: watch_program <program_id> [account_type]"
+        account_type = positional[1] if len(positional) == 2 else None
+        records = self.psol.watch_program(positional[0], account_type, filters)
+        self._print_ndjson(records, output, flush=True)
+
+    def do_watch_logs(self, arg: str):
+        """
+        watch_logs [<address> ..] [-o <file>]: Stream logs of txs mentioning the addresses, or of all txs.
+        """
+        addresses, _, output = self._watch_args(arg)
+        self._print_ndjson(self.psol.watch_logs(addresses), output, flush=True)
+
+    def do_name(self, arg: str):
+        """
+        name <pubkey> [<pubkey> ..] [--refresh]: Get account names
+        name --tx <sig> [--refresh]: Get names of all accounts of a tx
+        """
+        args = arg.split()
+        refresh = "--refresh" in args
+        args = [a for a in args if a != "--refresh"]
+        if args[:1] == ["--tx"]:
+            assert len(args) == 2, "Usage: name --tx <sig>"
+            tx = self.psol.get_transaction(args[1])
+            loaded = (tx.get("meta") or {}).get("loadedAddresses") or {}
+            args = (
+                tx["transaction"]["message"]["accountKeys"]
+                + loaded.get("writable", [])
+                + loaded.get("readonly", [])
+            )
+        assert args, "No pubkey provided"
+
+        names = self.psol.get_account_names(args, refresh)
+        if len(names) == 1:
+            print(names[args[0]])
+            return
+
+        for pubkey, name in names.items():
+            print(f"{pubkey}\t{name}")
 
     def do_tx(self, tx_sig: str):
         """
         tx <sig>: Print tx info.
         """
         tx = self.psol.get_transaction(tx_sig)
-        print(json.dumps(tx, indent=2, cls=SolanaJSONEncoder))
+        self._print_value(tx)
+
+    def do_tx_parse(self, arg: str):
+        """
+        tx_parse <sig> [<sig> ..] [-j <n>]: Fetch and decode txs by IDL.
+        tx_parse -f <file> [-j <n>]: Decode txs listed in file, print NDJSON.
+        """
+        args = arg.split()
+        sigs = []
+        from .psol import MAX_IN_FLIGHT
+
+        max_in_flight = MAX_IN_FLIGHT
+        while args:
+            opt = args.pop(0)
+            if opt == "-j":
+                max_in_flight = int(args.pop(0))
+            elif opt == "-f":
+                with open(os.path.expanduser(args.pop(0))) as f:
+                    sigs += [line.strip() for line in f if line.strip()]
+            else:
+                sigs.append(opt)
+
+        assert sigs, "No signature provided"
+        txs = self.psol.decode_transactions(sigs, max_in_flight)
+        if len(txs) == 1:
+            self._print_value(txs[0])
+        else:
+            self._print_ndjson(txs)
+
+    def do_events(self, arg: str):
+        """
+        events <sig> [<sig> ..] [-j <n>]: Decode Anchor events of txs, print NDJSON.
+        events -f <file> [-j <n>]: Decode events of txs listed in file.
+        events --address <addr> [--limit <n>] [--before <sig>] [-o <file>]:
+            Decode events of the recent txs of an address, newest first.
+        """
+        args = arg.split()
+        sigs = []
+        address = None
+        limit = 1000
+        before = None
+        output = None
+        from .psol import MAX_IN_FLIGHT, SIGNATURES_PAGE_SIZE
+
+        max_in_flight = MAX_IN_FLIGHT
+        while args:
+            opt = args.pop(0)
+            if opt == "-j":
+                max_in_flight = int(args.pop(0))
+            elif opt == "-f":
+                with open(os.path.expanduser(args.pop(0))) as f:
+                    sigs += [line.strip() for line in f if line.strip()]
+            elif opt == "--address":
+                address = args.pop(0)
+            elif opt == "--limit":
+                limit = int(args.pop(0))
+            elif opt == "--before":
+                before = args.pop(0)
+            elif opt == "-o":
+                output = args.pop(0)
+            else:
+                sigs.append(opt)
+
+        if address:
+            assert not sigs, "Usage: events --address <addr>"
+            pages = self.psol.get_signatures(address, limit, before)
+        else:
+            assert sigs, "No signature provided"
+            # Fetched and printed a page at a time.
+            size = SIGNATURES_PAGE_SIZE
+            pages = [sigs[i : i + size] for i in range(0, len(sigs), size)]
+        events = self.psol.iter_events(pages, max_in_flight)
+        self._print_ndjson(events, output, flush=output is None)
+
+    def do_block(self, arg: str):
+        """
+        block <slot> [options]: Decode all txs of a block, print NDJSON and stats.
+          -j <n>       Decode worker processes, default one per CPU.
+          -o <file>    Append decoded txs to file.
+          --stats      Only print stats.
+        """
+        self._decode_blocks(arg, "block")
+
+    def do_blocks(self, arg: str):
+        """
+        blocks <start>..<end> [options]: Decode all txs of a slot range (end included).
+          Options as `block`. Blocks are fetched while previous ones are decoded.
+        """
+        self._decode_blocks(arg, "blocks")
+
+    def _decode_blocks(self, arg: str, cmd: str):
+        args = arg.split()
+        positional = []
+        jobs = None
+        output = None
+        stats_only = False
+        while args:
+            opt = args.pop(0)
+            if opt == "-j":
+                jobs = int(args.pop(0))
+            elif opt == "-o":
+                output = args.pop(0)
+            elif opt == "--stats":
+                stats_only = True
+            else:
+                positional.append(opt)
+
+        if cmd == "block":
+            assert len(positional) == 1, "Usage: block <slot>"
+            slots = [int(positional[0])]
+        else:
+            assert (
+                len(positional) == 1 and ".." in positional[0]
+            ), "Usage: blocks <start>..<end>"
+            start, end = map(int, positional[0].split(".."))
+            assert start <= end, f"Empty range {positional[0]}"
+            slots = range(start, end + 1)
+
+        from .blocks import BlockDecoder
+
+        decoder = BlockDecoder(self.psol, jobs)
+        records = decoder.run(slots)
+        if stats_only:
+            for _ in records:
+                pass
+        else:
+            self._print_ndjson(records, output)
+
+        summary = decoder.summary()
+        self._print_header("---- Stats ----")
+        if self.format == "ndjson" or not summary["programs"]:
+            self._print_value(summary)
+            return
+        # A table is easier to read than hundreds of program objects.
+        programs = summary.pop("programs")
+        self._print_value(summary)
+        for p in programs:
+            print(
+                f"{p['program_id']:<44}  {p['instructions']:>8}"
+                f"  {p['share'] * 100:5.1f}%  {p['undecoded']:>8} undecoded"
+            )
+
+    def do_crawl(self, arg: str):
+        """
+        crawl <address> [options]: Crawl and decode address history into NDJSON.
+          -o <file>        Output file, default ~/.psol/crawl/<cluster>_<address>.ndjson
+          -j <n>           Max concurrent requests.
+          --until <sig>    Stop at this signature (exclusive).
+          --limit <n>      Max transactions to crawl in this run.
+          --reset          Drop the checkpoint and start from the newest tx.
+        """
+        args = arg.split()
+        positional = []
+        kwargs = {}
+        limit = None
+        reset = False
+        while args:
+            opt = args.pop(0)
+            if opt == "-o":
+                kwargs["output"] = os.path.expanduser(args.pop(0))
+            elif opt == "-j":
+                kwargs["max_in_flight"] = int(args.pop(0))
+            elif opt == "--until":
+                kwargs["until"] = args.pop(0)
+            elif opt == "--limit":
+                limit = int(args.pop(0))
+            elif opt == "--reset":
+                reset = True
+            else:
+                positional.append(opt)
+
+        assert len(positional) == 1, "Usage: crawl <address>"
+        from .crawler import Crawler
+
+        crawler = Crawler(self.psol, positional[0], **kwargs)
+        if reset:
+            crawler.reset()
+        written = crawler.run(limit)
+        print(f"{written} txs written to {crawler.output} ({crawler.count} in total)")
+        if crawler.failed:
+            print(f"{len(crawler.failed)} txs failed, they are retried on the next run")
 
     def do_tx_base64(self, tx_sig: str):
         """
@@ -260,7 +855,7 @@ class PsolConsole(cmd.Cmd):
         """
         data = self._decode_hex_or_base64(ix_data)
         decoded = self.psol.decode_ix_data(data.hex())
-        print(json.dumps(decoded, indent=2, cls=SolanaJSONEncoder))
+        self._print_value(decoded)
 
     def do_tx_decode(self, tx_data: str):
         """
@@ -283,26 +878,18 @@ class PsolConsole(cmd.Cmd):
         """
         data = self._decode_hex_or_base64(tx_data)
 
-        url = self.client._provider.endpoint_uri
-        resp = requests.post(
-            url,
-            json={
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "simulateTransaction",
-                "params": [
-                    base64.b64encode(data).decode(),
-                    {
-                        "encoding": "base64",
-                        "sigVerify": False,
-                        "replaceRecentBlockhash": True,
-                    },
-                ],
-            },
-            headers={"Content-Type": "application/json"},
-        )
-        value = resp.json()["result"]["value"]
-        print(json.dumps(value, indent=2))
+        value = self.psol.transport.call(
+            "simulateTransaction",
+            [
+                base64.b64encode(data).decode(),
+                {
+                    "encoding": "base64",
+                    "sigVerify": False,
+                    "replaceRecentBlockhash": True,
+                },
+            ],
+        )["value"]
+        self._print_value(value)
 
         # tx = VersionedTransaction.from_bytes(data)
         # resp = self.client.simulate_transaction(tx, sig_verify=False)
@@ -318,27 +905,54 @@ class PsolConsole(cmd.Cmd):
 
     def do_pda(self, arg_str: str):
         """
-        pda <program_id> [<pubkey|hex|string>, ..]: Find program address.
+        pda <program_id> [<seed> ..] [options]: Find program addresses.
+          Seeds are pubkeys, hex or strings, or templates that expand to
+          every combination, printed as NDJSON:
+          u8|u16|u32|u64|u128[be]:<n>  Integer, little-endian unless `be`.
+          {a..b}                       Integers a to b as decimal strings.
+          u64:{a..b}                   Integers a to b, encoded.
+          @<file>                      Pubkeys listed in file.
+          str:<s>, hex:<h>             Force a string or hex seed.
+          -j <n>       Worker processes, default one per CPU.
+          -o <file>    Append output to file.
+          --fetch      Also fetch the accounts, in batches.
+          --no-cache   Do not use the cache of derived addresses.
         """
         args = arg_str.split()
-        program_id = Pubkey.from_string(args[0])
-        seeds = []
-        for value in args[1:]:
-            try:
-                pubkey = Pubkey.from_string(value)
-                seeds.append(bytes(pubkey))
-                continue
-            except ValueError:
-                pass
-
-            try:
-                seeds.append(bytes.fromhex(value))
-                continue
-            except ValueError:
-                pass
+        program_id = Pubkey.from_string(args.pop(0))
+        templates = []
+        jobs = None
+        output = None
+        fetch = False
+        use_cache = True
+        while args:
+            opt = args.pop(0)
+            if opt == "-j":
+                jobs = int(args.pop(0))
+            elif opt == "-o":
+                output = args.pop(0)
+            elif opt == "--fetch":
+                fetch = True
+            elif opt == "--no-cache":
+                use_cache = False
+            else:
+                templates.append(opt)
+
+        combinations = expand_seeds(templates)
+        first = next(combinations)
+        if next(combinations, None) is None and not (output or fetch):
+            pda, bump = Pubkey.find_program_address(first[1], program_id)
+            print("PDA:", pda)
+            print("Bump:", bump)
+            return
 
-            seeds.append(bytes(value, "utf-8"))
+        from .cache import PdaCache
 
-        pda, bump = Pubkey.find_program_address(seeds, program_id)
-        print("PDA:", pda)
-        print("Bump:", bump)
+        cache = PdaCache() if use_cache else None
+        records = find_program_addresses(program_id, templates, jobs, cache)
+        if fetch:
+            accounts = self.psol.get_multiple_accounts(r["pda"] for r in records)
+            records = (
+                {**record, **account} for record, account in zip(records, accounts)
+            )
+        self._print_ndjson(records, output)
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+from hashlib import sha256
+from typing import AsyncIterator
+
+from .idl import PSOL_DATA
+from .output import dumps
+from .psol import MAX_IN_FLIGHT, TX_BATCH_SIZE, Psol
+
+CRAWL_DATA = PSOL_DATA / "crawl"
+
+RETRIES = 3
+
+# Save the checkpoint every N written transactions.
+CHECKPOINT_INTERVAL = 100
+
+
+class Crawler(object):
+    """
+    Crawl the transaction history of an address, newest first.
+
+    Signatures are paged with getSignaturesForAddress `before`/`until`
+    cursors, transactions are fetched with bounded concurrency and decoded
+    by IDL, and written in order to an append-only NDJSON file. The
+    checkpoint stores the last written signature and the output offset so
+    an interrupted crawl resumes exactly where it stopped.
+
+    Signatures whose tx could not be fetched are kept in the checkpoint
+    instead of being written, and are fetched again first on the next run.
+    Retried txs are appended after the ones already written.
+    """
+
+    def __init__(
+        self,
+        psol: Psol,
+        address: str,
+        output: str | None = None,
+        until: str | None = None,
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ) -> None:
+        self.psol = psol
+        self.address = address
+        self.until = until
+        self.max_in_flight = max_in_flight
+
+        name = f"{psol.cluster}_{address}"
+        self.output = output or str(CRAWL_DATA / f"{name}.ndjson")
+        if output:
+            # One checkpoint per output file, crawls of the same address into
+            # different files do not resume from each other.
+            digest = sha256(os.path.abspath(output).encode()).hexdigest()[:16]
+            name = f"{name}_{digest}"
+        self.checkpoint_path = CRAWL_DATA / f"{name}.checkpoint.json"
+
+        self.before = None
+        self.count = 0
+        self.offset = 0
+        self.failed: list[str] = []
+
+    def load_checkpoint(self):
+        checkpoint = None
+        if self.checkpoint_path.exists():
+            checkpoint = json.loads(self.checkpoint_path.read_text())
+        if checkpoint is None or checkpoint["output"] != os.path.abspath(self.output):
+            # Fresh crawl, keep whatever the output file already holds.
+            if os.path.exists(self.output):
+                self.offset = os.path.getsize(self.output)
+            return
+
+        self.before = checkpoint["before"]
+        self.count = checkpoint["count"]
+        self.offset = checkpoint["offset"]
+        # Checkpoints of older versions have no failed signatures.
+        self.failed = checkpoint.get("failed", [])
+        self.until = self.until or checkpoint["until"]
+
+    def save_checkpoint(self, pending: list[str] = ()):
+        # `pending` are failed signatures not retried yet in this run.
+        checkpoint = {
+            "address": self.address,
+            "output": os.path.abspath(self.output),
+            "before": self.before,
+            "until": self.until,
+            "count": self.count,
+            "offset": self.offset,
+            "failed": [*pending, *self.failed],
+        }
+        tmp = self.checkpoint_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(checkpoint, indent=2))
+        tmp.replace(self.checkpoint_path)
+
+    def reset(self):
+        self.checkpoint_path.unlink(missing_ok=True)
+        self.before = None
+        self.count = 0
+        self.offset = 0
+        self.failed = []
+
+    def run(self, limit: int | None = None) -> int:
+        """
+        Crawl until the history (or `limit` transactions) is exhausted and
+        return the number of transactions written in this run.
+        """
+        CRAWL_DATA.mkdir(parents=True, exist_ok=True)
+        self.load_checkpoint()
+
+        # Failed signatures of previous runs are retried first, they stay
+        # pending in the checkpoint until their batch comes back.
+        pending = self.failed
+        self.failed = []
+        # Fetched on the transport loop, decoded and written on this thread
+        # so the loop keeps the next batches in flight meanwhile.
+        batches = self.psol.transport.iterate(self._fetch_batches(pending[:], limit))
+        coders = {}
+        written = 0
+        with open(self.output, "ab") as f:
+            f.truncate(self.offset)
+            f.seek(self.offset)
+            for retry, batch, txs in batches:
+                for signature, tx in zip(batch, txs):
+                    if retry:
+                        pending.remove(signature)
+                    else:
+                        self.before = signature
+                    if "error" in tx:
+                        self.failed.append(signature)
+                        continue
+
+                    f.write(dumps(self.psol.decode_transaction(tx, coders)) + b"\n")
+                    self.count += 1
+                    written += 1
+                    if written % CHECKPOINT_INTERVAL == 0:
+                        f.flush()
+                        self.offset = f.tell()
+                        self.save_checkpoint(pending)
+
+            f.flush()
+            self.offset = f.tell()
+            self.save_checkpoint()
+        return written
+
+    async def _fetch_batches(
+        self, retries: list[str], limit: int | None
+    ) -> AsyncIterator[tuple[bool, list[str], list[dict]]]:
+        # (retry, signatures, txs) of the batches of failed signatures to
+        # retry, then of each page in signature order. Up to
+        # `max_in_flight` batches are fetched ahead.
+        sem = asyncio.Semaphore(self.max_in_flight)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_in_flight * 2)
+
+        async def _fetch(signatures: list[str]) -> list[dict]:
+            async with sem:
+                return await self.psol.get_transactions_async(signatures, RETRIES)
+
+        async def _produce():
+            try:
+                for i in range(0, len(retries), TX_BATCH_SIZE):
+                    batch = retries[i : i + TX_BATCH_SIZE]
+                    await queue.put((True, batch, asyncio.create_task(_fetch(batch))))
+
+                pages = self.psol.get_signatures_async(
+                    self.address, limit, self.before, self.until
+                )
+                async for signatures in pages:
+                    for i in range(0, len(signatures), TX_BATCH_SIZE):
+                        batch = signatures[i : i + TX_BATCH_SIZE]
+                        task = asyncio.create_task(_fetch(batch))
+                        await queue.put((False, batch, task))
+            finally:
+                await queue.put(None)
+
+        producer = asyncio.create_task(_produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                retry, batch, task = item
+                yield retry, batch, await task
+            await producer
+        finally:
+            producer.cancel()
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item:
+                    item[2].cancel()
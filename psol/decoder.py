@@ -0,0 +1,481 @@
+import struct
+from hashlib import sha256
+from typing import Any
+
+from pyheck import snake
+from solders.pubkey import Pubkey
+
+# Borsh primitives with a fixed size: struct format and value converter.
+PRIMITIVES = {
+    "bool": ("?", None),
+    "u8": ("B", None),
+    "i8": ("b", None),
+    "u16": ("H", None),
+    "i16": ("h", None),
+    "u32": ("I", None),
+    "i32": ("i", None),
+    "f32": ("f", None),
+    "u64": ("Q", None),
+    "i64": ("q", None),
+    "f64": ("d", None),
+    "u128": ("16s", "_u128"),
+    "i128": ("16s", "_i128"),
+    "publicKey": ("32s", "_pubkey"),
+    "pubkey": ("32s", "_pubkey"),
+}
+
+
+def _u128(b: bytes) -> int:
+    return int.from_bytes(b, "little")
+
+
+def _i128(b: bytes) -> int:
+    return int.from_bytes(b, "little", signed=True)
+
+
+def _pubkey(b: bytes) -> str:
+    return str(Pubkey.from_bytes(b))
+
+
+def _truncated(off: int):
+    raise ValueError(f"Data too short at offset {off}")
+
+
+class UnsupportedType(NotImplementedError):
+    """An IDL type the compiled decoder cannot read, use the anchorpy coder."""
+
+
+class _Fixed(object):
+    # A fixed-size layout: struct format, number of unpacked values, and a
+    # function building the python expression for the value from the index
+    # of its first item in the unpacked tuple `t`.
+
+    def __init__(self, fmt: str, count: int, expr) -> None:
+        self.fmt = fmt
+        self.count = count
+        self.expr = expr
+        self.size = struct.calcsize("<" + fmt)
+
+
+class CompiledCoder(object):
+    """
+    Decoder generated from an IDL: every struct and enum is compiled into a
+    python function that reads Borsh data from a memoryview and returns
+    plain dicts. Consecutive fixed-size fields are read with one precomputed
+    `struct.Struct`. Pubkeys are returned as base58 strings, `bytes` as hex
+    strings and enums as `{variant: fields}`.
+
+    Raises UnsupportedType for IDL types it does not support, callers
+    should fall back to the anchorpy coder in that case.
+    """
+
+    def __init__(self, idl: dict) -> None:
+        self.types = {t["name"]: t["type"] for t in idl.get("types", [])}
+        for account in idl.get("accounts", []):
+            if "type" in account:
+                self.types.setdefault(account["name"], account["type"])
+
+        self._structs: list[struct.Struct] = []
+        self._fixed_cache: dict[str, _Fixed | None] = {}
+        # (account, path) -> field_slice result.
+        self._slices: dict[tuple[str, str], tuple[int, int, Any] | None] = {}
+        self._var = 0
+        self._sources: list[str] = []
+
+        for name, ty in self.types.items():
+            self._compile_typedef(name, ty)
+
+        self.account_names: dict[bytes, str] = {}
+        for account in idl.get("accounts", []):
+            name = account["name"]
+            disc = bytes(account.get("discriminator") or b"") or _discriminator(
+                f"account:{name}"
+            )
+            self.account_names[disc] = name
+
+        self.instruction_names: dict[bytes, str] = {}
+        self.instruction_accounts: dict[str, list[str]] = {}
+        for ix in idl.get("instructions", []):
+            name = snake(ix["name"])
+            disc = bytes(ix.get("discriminator") or b"") or _discriminator(
+                f"global:{name}"
+            )
+            self.instruction_names[disc] = name
+            self.instruction_accounts[name] = _flatten_accounts(ix["accounts"])
+            self._compile_struct(f"_ix_{name}", ix["args"])
+
+        # Events of new IDLs are types, older ones list their fields.
+        self.event_names: dict[bytes, str] = {}
+        self._event_funcs: dict[str, str] = {}
+        for event in idl.get("events", []):
+            name = event["name"]
+            disc = bytes(event.get("discriminator") or b"") or _discriminator(
+                f"event:{name}"
+            )
+            self.event_names[disc] = name
+            if "fields" in event:
+                self._compile_struct(f"_ev_{name}", event["fields"])
+                self._event_funcs[name] = _func_name(f"_ev_{name}")
+            elif name in self.types:
+                self._event_funcs[name] = _func_name(name)
+            else:
+                raise UnsupportedType(f"Type not found {name}")
+
+        namespace = {
+            "_u128": _u128,
+            "_i128": _i128,
+            "_pubkey": _pubkey,
+            "_truncated": _truncated,
+            "_unpack_from": struct.unpack_from,
+        }
+        for i, s in enumerate(self._structs):
+            namespace[f"_S{i}"] = s
+        self.source = "\n\n".join(self._sources)
+        exec(compile(self.source, "<psol.decoder>", "exec"), namespace)
+        self._namespace = namespace
+
+    def decode_account(self, data: bytes) -> tuple[str, dict]:
+        name = self.account_names[bytes(data[:8])]
+        value, _ = self._namespace[_func_name(name)](memoryview(data), 8)
+        return name, value
+
+    def decode_instruction(self, data: bytes) -> tuple[str, dict]:
+        name = self.instruction_names[bytes(data[:8])]
+        value, _ = self._namespace[_func_name(f"_ix_{name}")](memoryview(data), 8)
+        return name, value
+
+    def decode_event(self, data: bytes) -> tuple[str, dict]:
+        name = self.event_names[bytes(data[:8])]
+        value, _ = self._namespace[self._event_funcs[name]](memoryview(data), 8)
+        return name, value
+
+    def field_slice(self, account: str, path: str) -> tuple[int, int, Any] | None:
+        """
+        (offset, size, decode) of a field of an account, given as a dotted
+        path of field names and array indexes, e.g. `bids.0.price`. Calling
+        `decode(buf, off)` reads the field at `off` of a memoryview. None if
+        a member before the field or the field itself has no fixed size.
+        """
+        key = (account, path)
+        if key not in self._slices:
+            self._slices[key] = self._field_slice(account, path)
+        return self._slices[key]
+
+    def _field_slice(self, account: str, path: str) -> tuple[int, int, Any] | None:
+        ty = ("defined", account)
+        offset = 8
+        for part in path.split("."):
+            ty = self._resolve(ty)
+            if isinstance(ty, tuple) and self.types[ty[1]]["kind"] == "struct":
+                fields = self.types[ty[1]]["fields"]
+                for field in fields if _named(fields) else []:
+                    if snake(field["name"]) == snake(part):
+                        ty = field["type"]
+                        break
+                    layout = self._fixed(field["type"])
+                    if layout is None:
+                        return None
+                    offset += layout.size
+                else:
+                    raise KeyError(f"Field not found {path}")
+            elif isinstance(ty, dict) and "array" in ty and part.isdigit():
+                inner, n = ty["array"]
+                if not isinstance(n, int) or int(part) >= n:
+                    raise KeyError(f"Index out of range {path}")
+                item = self._fixed(inner)
+                if item is None:
+                    return None
+                offset += int(part) * item.size
+                ty = inner
+            elif isinstance(ty, dict) and ("vec" in ty or "option" in ty):
+                # Members of vecs and options have no fixed offset.
+                return None
+            elif isinstance(ty, tuple) and self.types[ty[1]]["kind"] == "enum":
+                return None
+            else:
+                raise KeyError(f"Field not found {path}")
+
+        layout = self._fixed(ty)
+        if layout is None:
+            return None
+        # The struct is bound to the function, not added to the decoder ones.
+        namespace = {
+            **self._namespace,
+            "_unpack_field": struct.Struct("<" + layout.fmt).unpack_from,
+        }
+        decode = eval(
+            f"lambda buf, off: (lambda t: {layout.expr(0)})(_unpack_field(buf, off))",
+            namespace,
+        )
+        return offset, layout.size, decode
+
+    def _new_var(self) -> str:
+        self._var += 1
+        return f"v{self._var}"
+
+    def _new_struct(self, fmt: str) -> str:
+        self._structs.append(struct.Struct("<" + fmt))
+        return f"_S{len(self._structs) - 1}"
+
+    def _resolve(self, ty):
+        # Inline aliases, return ("defined", name) for structs and enums.
+        while isinstance(ty, dict) and "defined" in ty:
+            name = ty["defined"]
+            if isinstance(name, dict):
+                name = name["name"]
+            if name not in self.types:
+                raise UnsupportedType(f"Type not found {name}")
+            typedef = self.types[name]
+            if typedef["kind"] == "alias":
+                ty = typedef["value"]
+                continue
+            return ("defined", name)
+        return ty
+
+    def _fixed(self, ty) -> _Fixed | None:
+        ty = self._resolve(ty)
+        if isinstance(ty, str):
+            if ty not in PRIMITIVES:
+                return None
+            fmt, conv = PRIMITIVES[ty]
+            if conv:
+                return _Fixed(fmt, 1, lambda i, c=conv: f"{c}(t[{i}])")
+            return _Fixed(fmt, 1, lambda i: f"t[{i}]")
+
+        if isinstance(ty, tuple):
+            name = ty[1]
+            if name not in self._fixed_cache:
+                self._fixed_cache[name] = None  # Recursive types are not fixed.
+                self._fixed_cache[name] = self._fixed_struct(self.types[name])
+            return self._fixed_cache[name]
+
+        if "array" in ty:
+            inner, n = ty["array"]
+            if not isinstance(n, int):
+                return None
+            if self._resolve(inner) == "u8":
+                return _Fixed(f"{n}s", 1, lambda i: f"list(t[{i}])")
+            item = self._fixed(inner)
+            if item is None:
+                return None
+            if item.count == 1 and item.expr("i") == "t[i]":
+                return _Fixed(item.fmt * n, n, lambda i: f"list(t[{i}:{i} + {n}])")
+            k = item.count
+            self._var += 1
+            j = f"_j{self._var}"
+            return _Fixed(
+                item.fmt * n,
+                n * k,
+                lambda i: f"[{item.expr(f'{i} + {j} * {k}')} for {j} in range({n})]",
+            )
+        return None
+
+    def _fixed_struct(self, typedef: dict) -> _Fixed | None:
+        if typedef["kind"] != "struct":
+            return None
+        fields = typedef["fields"]
+        if not _named(fields):
+            return None
+        layouts = []
+        for field in fields:
+            layout = self._fixed(field["type"])
+            if layout is None:
+                return None
+            layouts.append((snake(field["name"]), layout))
+
+        def _expr(i):
+            items = []
+            offset = 0
+            for name, layout in layouts:
+                items.append(f"{name!r}: {layout.expr(f'{i} + {offset}')}")
+                offset += layout.count
+            return "{" + ", ".join(items) + "}"
+
+        return _Fixed(
+            "".join(layout.fmt for _, layout in layouts),
+            sum(layout.count for _, layout in layouts),
+            _expr,
+        )
+
+    def _compile_typedef(self, name: str, typedef: dict):
+        kind = typedef["kind"]
+        if kind == "struct":
+            fields = typedef["fields"]
+            if not _named(fields):
+                self._compile_tuple(name, fields)
+            else:
+                self._compile_struct(name, fields)
+        elif kind == "enum":
+            self._compile_enum(name, typedef["variants"])
+        elif kind != "alias":
+            raise UnsupportedType(f"Unknown type {kind}")
+
+    def _compile_struct(self, name: str, fields: list[dict]):
+        lines = [f"def {_func_name(name)}(buf, off):"]
+        items = self._emit_fields(fields, lines, "    ")
+        lines.append(f"    return {{{items}}}, off")
+        self._sources.append("\n".join(lines))
+
+    def _compile_tuple(self, name: str, types: list):
+        lines = [f"def {_func_name(name)}(buf, off):"]
+        values = self._emit_values(types, lines, "    ")
+        lines.append(f"    return [{', '.join(values)}], off")
+        self._sources.append("\n".join(lines))
+
+    def _compile_enum(self, name: str, variants: list[dict]):
+        lines = [
+            f"def {_func_name(name)}(buf, off):",
+            "    tag = buf[off]",
+            "    off += 1",
+        ]
+        for i, variant in enumerate(variants):
+            lines.append(f"    {'if' if i == 0 else 'elif'} tag == {i}:")
+            fields = variant.get("fields")
+            key = repr(variant["name"])
+            if not fields:
+                lines.append(f"        return {{{key}: {{}}}}, off")
+            elif _named(fields):
+                items = self._emit_fields(fields, lines, "        ")
+                lines.append(f"        return {{{key}: {{{items}}}}}, off")
+            else:
+                values = self._emit_values(fields, lines, "        ")
+                lines.append(f"        return {{{key}: [{', '.join(values)}]}}, off")
+        lines.append(f"    raise ValueError(f'Invalid {name} variant {{tag}}')")
+        self._sources.append("\n".join(lines))
+
+    def _emit_fields(self, fields: list[dict], lines: list[str], indent: str) -> str:
+        types = [field["type"] for field in fields]
+        values = self._emit_values(types, lines, indent)
+        return ", ".join(
+            f"{snake(field['name'])!r}: {var}" for field, var in zip(fields, values)
+        )
+
+    def _emit_values(self, types: list, lines: list[str], indent: str) -> list[str]:
+        # Decode values into local variables, batching fixed-size runs.
+        values = []
+        run = []
+
+        def _flush():
+            if not run:
+                return
+            s = self._new_struct("".join(layout.fmt for layout in run))
+            lines.append(f"{indent}t = {s}.unpack_from(buf, off)")
+            lines.append(f"{indent}off += {s}.size")
+            i = 0
+            for layout in run:
+                var = self._new_var()
+                lines.append(f"{indent}{var} = {layout.expr(i)}")
+                values.append(var)
+                i += layout.count
+            run.clear()
+
+        for ty in types:
+            layout = self._fixed(ty)
+            if layout is not None:
+                run.append(layout)
+                continue
+            _flush()
+            values.append(self._emit(ty, lines, indent))
+        _flush()
+        return values
+
+    def _emit(self, ty, lines: list[str], indent: str) -> str:
+        # Emit statements decoding one value at `off`, return its variable.
+        var = self._new_var()
+        layout = self._fixed(ty)
+        if layout is not None:
+            s = self._new_struct(layout.fmt)
+            lines.append(f"{indent}t = {s}.unpack_from(buf, off)")
+            lines.append(f"{indent}off += {s}.size")
+            lines.append(f"{indent}{var} = {layout.expr(0)}")
+            return var
+
+        ty = self._resolve(ty)
+        if isinstance(ty, tuple):
+            lines.append(f"{indent}{var}, off = {_func_name(ty[1])}(buf, off)")
+        elif ty in ("string", "bytes"):
+            self._emit_len(var, lines, indent)
+            conv = (
+                "str(buf[off:end], 'utf-8')" if ty == "string" else "buf[off:end].hex()"
+            )
+            lines.append(f"{indent}{var} = {conv}")
+            lines.append(f"{indent}off = end")
+        elif isinstance(ty, dict) and "option" in ty:
+            lines.append(f"{indent}if buf[off]:")
+            lines.append(f"{indent}    off += 1")
+            inner = self._emit(ty["option"], lines, indent + "    ")
+            lines.append(f"{indent}    {var} = {inner}")
+            lines.append(f"{indent}else:")
+            lines.append(f"{indent}    off += 1")
+            lines.append(f"{indent}    {var} = None")
+        elif isinstance(ty, dict) and "vec" in ty:
+            self._emit_len(var, lines, indent, size_of=ty["vec"])
+            self._emit_items(var, ty["vec"], f"n_{var}", lines, indent)
+        elif isinstance(ty, dict) and "array" in ty:
+            inner, n = ty["array"]
+            if not isinstance(n, int):
+                # e.g. {"generic": "N"} of a generic struct.
+                raise UnsupportedType(f"Unsupported array length {n}")
+            self._emit_items(var, inner, str(n), lines, indent)
+        else:
+            raise UnsupportedType(f"Unsupported type {ty}")
+        return var
+
+    def _emit_len(self, var: str, lines: list[str], indent: str, size_of=None):
+        # Read the u32 length prefix and check the data is long enough.
+        n = f"n_{var}"
+        size = 1
+        if size_of is not None:
+            layout = self._fixed(size_of)
+            size = layout.size if layout else 0
+        lines.append(f"{indent}{n} = _unpack_from('<I', buf, off)[0]")
+        lines.append(f"{indent}off += 4")
+        if size:
+            lines.append(f"{indent}end = off + {n} * {size}")
+            lines.append(f"{indent}if end > len(buf):")
+            lines.append(f"{indent}    _truncated(off)")
+
+    def _emit_items(self, var: str, ty, n: str, lines: list[str], indent: str):
+        layout = self._fixed(ty)
+        if layout is not None and self._resolve(ty) == "u8":
+            lines.append(f"{indent}{var} = list(buf[off:off + {n}])")
+            lines.append(f"{indent}off += {n}")
+        elif layout is not None and layout.count == 1 and layout.expr(0) == "t[0]":
+            lines.append(
+                f"{indent}{var} = list(_unpack_from(f'<{{{n}}}{layout.fmt}', buf, off))"
+            )
+            lines.append(f"{indent}off += {n} * {layout.size}")
+        elif layout is not None:
+            s = self._new_struct(layout.fmt)
+            lines.append(
+                f"{indent}{var} = [{layout.expr(0)} for t in"
+                f" {s}.iter_unpack(buf[off:off + {n} * {layout.size}])]"
+            )
+            lines.append(f"{indent}off += {n} * {layout.size}")
+        else:
+            lines.append(f"{indent}{var} = []")
+            lines.append(f"{indent}for _ in range({n}):")
+            item = self._emit(ty, lines, indent + "    ")
+            lines.append(f"{indent}    {var}.append({item})")
+
+
+def _func_name(name: str) -> str:
+    return "_dec_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def _named(fields: list) -> bool:
+    return not fields or (isinstance(fields[0], dict) and "name" in fields[0])
+
+
+def _discriminator(preimage: str) -> bytes:
+    return sha256(preimage.encode()).digest()[:8]
+
+
+def _flatten_accounts(items: list[dict], prefix: str = "") -> list[str]:
+    names = []
+    for item in items:
+        if "accounts" in item:
+            names += _flatten_accounts(item["accounts"], f"{prefix}{item['name']}.")
+        else:
+            names.append(prefix + item["name"])
+    return names
@@ -1,7 +1,20 @@
-import atexit
+from __future__ import annotations
+
 import json
+import os
 import pathlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from hashlib import sha256
+from typing import TYPE_CHECKING
+
+from .decoder import CompiledCoder
+from .profiler import profiler
+
+if TYPE_CHECKING:
+    from anchorpy import Coder, Idl
 
 HOME = pathlib.Path().home()
 PSOL_DATA = HOME / ".psol"
@@ -11,41 +24,318 @@ ACCOUNTS_IDL = PSOL_DATA / "accounts_idl.json"
 INSTRUCTIONS_IDL = PSOL_DATA / "instructions_idl.json"
 TYPES_IDL = PSOL_DATA / "types_idl.json"
 NAMES = PSOL_DATA / "names.json"
+INDEX_DB = PSOL_DATA / "index.db"
+
+# IDL_CACHE directory of IDLs loaded from local files by older versions,
+# they are used on every cluster.
+LOCAL_CLUSTER = "local"
+
+# SQLite limits the number of host parameters of a statement.
+MAX_SQL_PARAMS = 900
+
+# IDL files parsed per task sent to an import worker process, and the
+# number of changed files below which they are parsed in process.
+IMPORT_CHUNK_SIZE = 16
+IMPORT_MIN_PARALLEL = 64
+
+# Bumped when index_idl indexes more of an IDL, saved IDLs are then
+# indexed again. 1: events.
+INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS discriminators (
+    cluster TEXT NOT NULL,
+    program_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    discriminator TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (cluster, program_id, kind, discriminator)
+);
+CREATE INDEX IF NOT EXISTS discriminators_by_cluster
+    ON discriminators (kind, discriminator, cluster);
+CREATE TABLE IF NOT EXISTS names (
+    pubkey TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS idl_files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    program_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS idl_misses (
+    cluster TEXT NOT NULL,
+    program_id TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (cluster, program_id)
+);
+"""
+
+
+# LRU cache of parsed IDLs and their coders, keyed by IDL path.
+# An entry is invalidated when the file mtime or size changes.
+class IdlCache(object):
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        # Script workers share the cache.
+        self._lock = threading.Lock()
+
+    def _stamp(self, path: str) -> tuple:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def _entry(self, path: str) -> dict:
+        stamp = self._stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry["stamp"] == stamp:
+                self.hits += 1
+                self._entries.move_to_end(path)
+                return entry
+            self.misses += 1
+
+        entry = {"stamp": stamp, "json": pathlib.Path(path).read_text()}
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get(self, path: str) -> tuple[Idl, Coder]:
+        entry = self._entry(path)
+        if "coder" not in entry:
+            # anchorpy is slow to import, only load it when it is used.
+            from anchorpy import Coder, Idl
+
+            entry["idl"] = Idl.from_json(entry["json"])
+            entry["coder"] = Coder(entry["idl"])
+        return entry["idl"], entry["coder"]
 
-if not ACCOUNTS_IDL.parent.exists():
-    ACCOUNTS_IDL.parent.mkdir(parents=True)
+    def get_compiled(self, path: str) -> CompiledCoder | None:
+        # None if the IDL uses types the compiled decoder does not support.
+        entry = self._entry(path)
+        if "compiled" not in entry:
+            try:
+                entry["compiled"] = CompiledCoder(json.loads(entry["json"]))
+            except Exception:
+                # Unsupported types, or generated code that does not compile.
+                entry["compiled"] = None
+        return entry["compiled"]
 
-if not INSTRUCTIONS_IDL.parent.exists():
-    INSTRUCTIONS_IDL.parent.mkdir(parents=True)
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.hits = 0
+        self.misses = 0
 
-if not NAMES.parent.exists():
-    NAMES.parent.mkdir(parents=True)
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+# Discriminator preimage prefix of each indexed IDL section.
+INDEXED_SECTIONS = {
+    "accounts": ("account", "account"),
+    "instructions": ("instruction", "global"),
+    "events": ("event", "event"),
+}
+
+
+def discriminator_rows(
+    idl: dict, cluster: str, program_id: str, path: str
+) -> list[tuple]:
+    # Rows of the discriminators table for one IDL.
+    rows = []
+    for section, (kind, prefix) in INDEXED_SECTIONS.items():
+        for item in idl.get(section, []):
+            name = item["name"]
+            discriminator = sha256(f"{prefix}:{name}".encode()).digest()[:8].hex()
+            rows.append((cluster, program_id, kind, discriminator, name, path))
+    return rows
+
+
+def _import_idl_files(tasks: list[tuple[str, str | None]], cluster: str) -> list[dict]:
+    # Runs in worker processes: hash each file, parse changed ones and
+    # return their content and index rows.
+    dir = IDL_CACHE / cluster
+    results = []
+    for path, previous_digest in tasks:
+        try:
+            st = os.stat(path)
+            data = pathlib.Path(path).read_bytes()
+            digest = sha256(data).hexdigest()
+            idl = json.loads(data)
+            assert "instructions" in idl, "Not an IDL"
+            metadata = idl.get("metadata") or {}
+            program_id = (
+                idl.get("address")
+                or metadata.get("address")
+                or metadata.get("name")
+                or idl["name"]
+            )
+        except Exception as e:
+            results.append({"path": path, "error": str(e) or type(e).__name__})
+            continue
+
+        result = {
+            "program_id": program_id,
+            "file": (path, st.st_mtime_ns, st.st_size, digest, program_id),
+        }
+        if digest != previous_digest:
+            saved = str(dir / f"{program_id}.json")
+            result["data"] = data
+            result["rows"] = discriminator_rows(idl, cluster, program_id, saved)
+        results.append(result)
+    return results
+
+
+def _map_chunks(func, tasks: list, cluster: str, jobs: int | None) -> list:
+    # func(chunk, cluster) over chunks of tasks, in worker processes for
+    # large inputs. Results are flattened in task order.
+    chunks = [
+        tasks[i : i + IMPORT_CHUNK_SIZE]
+        for i in range(0, len(tasks), IMPORT_CHUNK_SIZE)
+    ]
+    if jobs == 1 or len(tasks) < IMPORT_MIN_PARALLEL:
+        return [r for chunk in chunks for r in func(chunk, cluster)]
+
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import repeat
+
+    with ProcessPoolExecutor(jobs) as pool:
+        return [r for rs in pool.map(func, chunks, repeat(cluster)) for r in rs]
 
 
 class IdlDatabase(object):
 
-    def __init__(self) -> None:
-        if not ACCOUNTS_IDL.exists():
-            self.accounts = {}
-        else:
-            self.accounts = json.loads(ACCOUNTS_IDL.read_text())
+    def __init__(self, path: pathlib.Path = INDEX_DB) -> None:
+        self.idl_cache = IdlCache()
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # One connection per thread, WAL lets readers and writers overlap.
+        self._local = threading.local()
+        self.db.executescript(SCHEMA)
+        self.migrate_schema()
+        self.migrate_json()
+        self.migrate_index()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def migrate_schema(self):
+        # Names indexed before expiry support have no expires_at, they are
+        # treated as expired.
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(names)")]
+        if "expires_at" not in columns:
+            with self.db:
+                self.db.execute("ALTER TABLE names ADD COLUMN expires_at REAL")
+        # Replaced by discriminators_by_cluster.
+        self.db.execute("DROP INDEX IF EXISTS discriminators_lookup")
 
-        if not INSTRUCTIONS_IDL.exists():
-            self.instructions = {}
-        else:
-            self.instructions = json.loads(INSTRUCTIONS_IDL.read_text())
+    def migrate_json(self):
+        # Import the legacy JSON index files once, then move them aside.
+        legacy = [
+            (ACCOUNTS_IDL, "account"),
+            (INSTRUCTIONS_IDL, "instruction"),
+        ]
+        with self.db:
+            for file, kind in legacy:
+                if not file.exists():
+                    continue
+                rows = []
+                for discriminator, (path, name) in json.loads(file.read_text()).items():
+                    cluster, program_id = self._program_of_path(path)
+                    rows.append((cluster, program_id, kind, discriminator, name, path))
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO discriminators"
+                    " (cluster, program_id, kind, discriminator, name, path)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
 
-        if not NAMES.exists():
-            self.names = {}
-        else:
-            self.names = json.loads(NAMES.read_text())
+            if NAMES.exists():
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO names (pubkey, name) VALUES (?, ?)",
+                    json.loads(NAMES.read_text()).items(),
+                )
 
-        atexit.register(self.save)
+        for file in (ACCOUNTS_IDL, INSTRUCTIONS_IDL, NAMES):
+            if file.exists():
+                file.replace(file.with_suffix(".json.bak"))
 
-    def save(self):
-        ACCOUNTS_IDL.write_text(json.dumps(self.accounts, indent=2))
-        INSTRUCTIONS_IDL.write_text(json.dumps(self.instructions, indent=2))
-        NAMES.write_text(json.dumps(self.names, indent=2))
+    def migrate_index(self):
+        (version,) = self.db.execute("PRAGMA user_version").fetchone()
+        if version >= INDEX_VERSION:
+            return
+
+        rows = self.db.execute(
+            "SELECT DISTINCT cluster, program_id, path FROM discriminators"
+        ).fetchall()
+        for cluster, program_id, path in rows:
+            try:
+                idl = pathlib.Path(path).read_text()
+            except FileNotFoundError:
+                continue
+            self.index_idl(idl, path, cluster, program_id)
+        self.db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def _program_of_path(self, path: str) -> tuple[str, str]:
+        # IDLs are saved as IDL_CACHE/<cluster>/<program_id>.json
+        p = pathlib.Path(path)
+        return p.parent.name, p.stem
+
+    def get_name(self, pubkey: str) -> str | None:
+        return self.get_names([pubkey]).get(pubkey)
+
+    def set_name(self, pubkey: str, name: str, ttl: float | None = None):
+        self.set_names({pubkey: name}, ttl)
+
+    def get_names(self, pubkeys: list[str]) -> dict[str, str]:
+        # Unexpired entries only. An empty name is a cached miss.
+        names = {}
+        now = time.time()
+        for i in range(0, len(pubkeys), MAX_SQL_PARAMS):
+            chunk = pubkeys[i : i + MAX_SQL_PARAMS]
+            rows = self.db.execute(
+                "SELECT pubkey, name FROM names"
+                f" WHERE pubkey IN ({', '.join('?' * len(chunk))})"
+                " AND expires_at > ?",
+                (*chunk, now),
+            )
+            names.update(rows)
+        return names
+
+    def set_names(self, names: dict[str, str], ttl: float | None = None):
+        # Entries without a ttl never expire.
+        expires_at = time.time() + ttl if ttl is not None else float("inf")
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO names (pubkey, name, expires_at)"
+                " VALUES (?, ?, ?)",
+                [(pubkey, name, expires_at) for pubkey, name in names.items()],
+            )
 
     def save_idl(self, cluster: str, program_id: str, idl: str) -> str:
 
@@ -55,10 +345,44 @@ class IdlDatabase(object):
             dir.mkdir(parents=True)
 
         path = dir / f"{program_id}.json"
-        path.write_text(idl)
-        self.index_idl(idl, str(path))
+        # Saving the same IDL again, e.g. on refresh, keeps its index rows.
+        if not (
+            path.exists()
+            and path.read_text() == idl
+            and self._indexed(cluster, program_id)
+        ):
+            path.write_text(idl)
+            self.index_idl(idl, str(path))
+        with self.db:
+            self.db.execute(
+                "DELETE FROM idl_misses WHERE cluster = ? AND program_id = ?",
+                (cluster, program_id),
+            )
         return str(path)
 
+    def _indexed(self, cluster: str, program_id: str) -> bool:
+        row = self.db.execute(
+            "SELECT 1 FROM discriminators WHERE cluster = ? AND program_id = ? LIMIT 1",
+            (cluster, program_id),
+        ).fetchone()
+        return row is not None
+
+    def is_idl_missing(self, cluster: str, program_id: str) -> bool:
+        # True if a lookup found no IDL and the miss has not expired yet.
+        row = self.db.execute(
+            "SELECT expires_at FROM idl_misses WHERE cluster = ? AND program_id = ?",
+            (cluster, program_id),
+        ).fetchone()
+        return bool(row) and row[0] > time.time()
+
+    def set_idl_missing(self, cluster: str, program_id: str, ttl: float):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO idl_misses (cluster, program_id, expires_at)"
+                " VALUES (?, ?, ?)",
+                (cluster, program_id, time.time() + ttl),
+            )
+
     def get_idl(self, cluster: str, program_id: str) -> str | None:
         try:
             idl_path = IDL_CACHE / cluster / f"{program_id}.json"
@@ -73,36 +397,259 @@ class IdlDatabase(object):
         except FileNotFoundError:
             return None
 
+    def load_coder_by_program(
+        self, cluster: str, program_id: str, compiled: bool = False
+    ) -> tuple[Idl | None, Coder | CompiledCoder | None]:
+        idl_path = IDL_CACHE / cluster / f"{program_id}.json"
+        if not idl_path.exists():
+            return None, None
+
+        return self._load_coder(str(idl_path), compiled)
+
+    @profiler.timed("idl")
+    def _load_coder(
+        self, path: str, compiled: bool
+    ) -> tuple[Idl | None, Coder | CompiledCoder | None]:
+        if compiled:
+            return None, self.idl_cache.get_compiled(path)
+        return self.idl_cache.get(path)
+
     def _account_discriminator(self, name: str) -> str:
         return sha256(f"account:{name}".encode()).digest()[:8].hex()
 
-    def _instruction_discriminator(self, name: str) -> str:
-        return sha256(f"global:{name}".encode()).digest()[:8].hex()
+    def index_idl(
+        self,
+        idl_str: str,
+        path: str,
+        cluster: str | None = None,
+        program_id: str | None = None,
+    ):
+        if cluster is None or program_id is None:
+            cluster, program_id = self._program_of_path(path)
+
+        rows = discriminator_rows(json.loads(idl_str), cluster, program_id, path)
+        # Replace the program's previous entries in one transaction.
+        with self.db:
+            self._replace_rows([(cluster, program_id)], rows)
+
+    def _replace_rows(self, programs: list[tuple[str, str]], rows: list[tuple]):
+        # Callers hold the transaction.
+        self.db.executemany(
+            "DELETE FROM discriminators WHERE cluster = ? AND program_id = ?",
+            programs,
+        )
+        self.db.executemany(
+            "INSERT OR REPLACE INTO discriminators"
+            " (cluster, program_id, kind, discriminator, name, path)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def import_idls(self, root: str, cluster: str, jobs: int | None = None) -> dict:
+        """
+        Import every *.json IDL under `root` into IDL_CACHE/<cluster>, named
+        by program address (or IDL name if it has none).
 
-    def index_idl(self, idl_str: str, path: str):
-        idl = json.loads(idl_str)
-        for account in idl.get("accounts", []):
-            name = account["name"]
-            discriminator = self._account_discriminator(name)
-            self.accounts[discriminator] = [path, name]
+        Files with the mtime and size of their last import are skipped, the
+        others are hashed, parsed and indexed in `jobs` worker processes and
+        committed in one transaction. Files whose content did not change are
+        not indexed again.
+        """
+        known = {
+            path: (mtime_ns, size, digest)
+            for path, mtime_ns, size, digest in self.db.execute(
+                "SELECT path, mtime_ns, size, sha256 FROM idl_files"
+            )
+        }
+        files = []
+        for dirpath, _, names in os.walk(os.path.expanduser(root)):
+            for name in names:
+                if name.endswith(".json"):
+                    files.append(os.path.abspath(os.path.join(dirpath, name)))
+        files.sort()
 
-        for instruction in idl.get("instructions", []):
-            name = instruction["name"]
-            discriminator = self._instruction_discriminator(name)
-            self.instructions[discriminator] = [path, name]
+        tasks = []
+        unchanged = 0
+        for path in files:
+            st = os.stat(path)
+            previous = known.get(path)
+            if previous and previous[:2] == (st.st_mtime_ns, st.st_size):
+                unchanged += 1
+            else:
+                tasks.append((path, previous[2] if previous else None))
 
-    def load_idl_by_account_discriminator(self, discriminator: str) -> tuple[str, str]:
-        if discriminator not in self.accounts:
+        results = _map_chunks(_import_idl_files, tasks, cluster, jobs)
+
+        failed = {}
+        imported = 0
+        # Program id -> result, later files of a program replace earlier ones.
+        programs = {}
+        seen = []
+        for result in results:
+            if "error" in result:
+                failed[result["path"]] = result["error"]
+                continue
+            seen.append(result["file"])
+            if "rows" not in result:
+                unchanged += 1
+                continue
+            programs[result["program_id"]] = result
+            imported += 1
+
+        dir = IDL_CACHE / cluster
+        dir.mkdir(parents=True, exist_ok=True)
+        rows = []
+        for program_id, result in programs.items():
+            (dir / f"{program_id}.json").write_bytes(result["data"])
+            rows += result["rows"]
+
+        with self.db:
+            self._replace_rows([(cluster, p) for p in programs], rows)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO idl_files"
+                " (path, mtime_ns, size, sha256, program_id)"
+                " VALUES (?, ?, ?, ?, ?)",
+                seen,
+            )
+        return {
+            "files": len(files),
+            "imported": imported,
+            "unchanged": unchanged,
+            "failed": failed,
+            "conflicts": self.discriminator_conflicts(cluster, list(programs)),
+        }
+
+    def discriminator_conflicts(
+        self, cluster: str, program_ids: list[str] | None = None
+    ) -> list[dict]:
+        # Discriminators shared by programs of `cluster`, only those of
+        # `program_ids` if given.
+        conflicts = []
+        rows = self.db.execute(
+            "SELECT kind, discriminator, group_concat(program_id, ' '),"
+            " group_concat(name, ' ')"
+            " FROM discriminators WHERE cluster = ?"
+            " GROUP BY kind, discriminator HAVING count(*) > 1",
+            (cluster,),
+        )
+        wanted = set(program_ids) if program_ids is not None else None
+        for kind, discriminator, programs, names in rows:
+            programs = programs.split()
+            if wanted is not None and wanted.isdisjoint(programs):
+                continue
+            conflicts.append(
+                {
+                    "kind": kind,
+                    "discriminator": discriminator,
+                    "names": sorted(set(names.split())),
+                    "programs": programs,
+                }
+            )
+        return conflicts
+
+    @profiler.timed("idl")
+    def _lookup(
+        self,
+        cluster: str,
+        kind: str,
+        discriminator: str,
+        program_id: str | None = None,
+    ) -> tuple[str, str] | None:
+        # Entries of the cluster, then those loaded from local files before
+        # they were saved per cluster.
+        clusters = [cluster] if cluster == LOCAL_CLUSTER else [cluster, LOCAL_CLUSTER]
+        for c in clusters:
+            row = self._lookup_cluster(c, kind, discriminator, program_id)
+            if row:
+                return row
+        return None
+
+    def _lookup_cluster(
+        self,
+        cluster: str,
+        kind: str,
+        discriminator: str,
+        program_id: str | None,
+    ) -> tuple[str, str] | None:
+        # The entry of the given program by primary key, else the most
+        # recently indexed one of the cluster, both without a sort.
+        if program_id:
+            row = self.db.execute(
+                "SELECT path, name FROM discriminators"
+                " WHERE cluster = ? AND program_id = ? AND kind = ?"
+                " AND discriminator = ?",
+                (cluster, program_id, kind, discriminator),
+            ).fetchone()
+            if row:
+                return row
+        return self.db.execute(
+            "SELECT path, name FROM discriminators"
+            " WHERE kind = ? AND discriminator = ? AND cluster = ?"
+            " ORDER BY rowid DESC LIMIT 1",
+            (kind, discriminator, cluster),
+        ).fetchone()
+
+    def load_idl_by_account_discriminator(
+        self, cluster: str, discriminator: str, program_id: str | None = None
+    ) -> tuple[str, str]:
+        row = self._lookup(cluster, "account", discriminator, program_id)
+        if not row:
             return "", ""
 
-        path, name = self.accounts[discriminator]
+        path, name = row
         return open(path).read(), name
 
     def load_idl_by_instruction_discriminator(
-        self, discriminator: str
+        self, cluster: str, discriminator: str, program_id: str | None = None
     ) -> tuple[str, str]:
-        if discriminator not in self.instructions:
+        row = self._lookup(cluster, "instruction", discriminator, program_id)
+        if not row:
             return "", ""
 
-        path, name = self.instructions[discriminator]
+        path, name = row
         return open(path).read(), name
+
+    def load_coder_by_account_discriminator(
+        self,
+        cluster: str,
+        discriminator: str,
+        program_id: str | None = None,
+        compiled: bool = False,
+    ) -> tuple[Idl | None, Coder | CompiledCoder | None, str]:
+        row = self._lookup(cluster, "account", discriminator, program_id)
+        if not row:
+            return None, None, ""
+
+        path, name = row
+        idl, coder = self._load_coder(path, compiled)
+        return idl, coder, name
+
+    def load_coder_by_instruction_discriminator(
+        self,
+        cluster: str,
+        discriminator: str,
+        program_id: str | None = None,
+        compiled: bool = False,
+    ) -> tuple[Idl | None, Coder | CompiledCoder | None, str]:
+        row = self._lookup(cluster, "instruction", discriminator, program_id)
+        if not row:
+            return None, None, ""
+
+        path, name = row
+        idl, coder = self._load_coder(path, compiled)
+        return idl, coder, name
+
+    def load_coder_by_event_discriminator(
+        self,
+        cluster: str,
+        discriminator: str,
+        program_id: str | None = None,
+        compiled: bool = False,
+    ) -> tuple[Idl | None, Coder | CompiledCoder | None, str]:
+        row = self._lookup(cluster, "event", discriminator, program_id)
+        if not row:
+            return None, None, ""
+
+        path, name = row
+        idl, coder = self._load_coder(path, compiled)
+        return idl, coder, name
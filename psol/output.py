@@ -0,0 +1,119 @@
+import io
+import json
+import sys
+from typing import IO, Any, Iterable
+
+from solders.pubkey import Pubkey
+
+from .profiler import profiler
+
+# pretty: indented JSON, record streams one per line.
+# compact: every value on one line, headers kept.
+# ndjson: every value on one line, nothing but JSON.
+FORMATS = ("pretty", "compact", "ndjson")
+
+_orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # Types JSON does not know, converted one level at a time: the encoder
+    # calls back for the objects nested in the returned value.
+    if isinstance(obj, Pubkey):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.hex()
+
+    # anchorpy enum variants as {variant: fields} like the compiled decoder.
+    attribs = getattr(obj, "_sumtype_attribs", None)
+    if attribs is not None:
+        names = [name for name, _ in attribs]
+        if names == ["tuple_data"]:
+            return {type(obj).__name__: obj.tuple_data}
+        return {type(obj).__name__: {name: getattr(obj, name) for name in names}}
+
+    # anchorpy structs are dataclasses.
+    fields = getattr(obj, "__dict__", None)
+    if fields:
+        return {k: v for k, v in fields.items() if not k.startswith("_")}
+    return str(obj)
+
+
+_ENCODER = json.JSONEncoder(default=_default, separators=(",", ":"), ensure_ascii=False)
+_PRETTY_ENCODER = json.JSONEncoder(default=_default, indent=2, ensure_ascii=False)
+
+
+def _fast_json():
+    # orjson is optional, `pip install psol[fast]`.
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    return _orjson
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """
+    Serialize in one pass, unknown objects are converted when reached
+    instead of copying the whole tree first. Uses orjson when installed.
+    """
+    with profiler.section("serialize"):
+        orjson = _fast_json()
+        if orjson:
+            # Leave dataclasses and datetimes to `_default` like json does.
+            option = (
+                orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_PASSTHROUGH_DATETIME
+            )
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, default=_default, option=option)
+            except orjson.JSONEncodeError:
+                # e.g. u128 values, orjson only supports 64-bit integers.
+                pass
+
+        encoder = _PRETTY_ENCODER if pretty else _ENCODER
+        return encoder.encode(obj).encode()
+
+
+def _binary(file: IO) -> IO | None:
+    # Binary stream to write encoded bytes to, below the text layer of
+    # stdout when there is one. None if only text can be written.
+    if not isinstance(file, io.TextIOBase):
+        return file
+    buffer = getattr(file, "buffer", None)
+    if buffer is not None:
+        file.flush()
+    return buffer
+
+
+def write(obj: Any, fmt: str = "pretty", file: IO | None = None):
+    # One value followed by a newline.
+    file = file or sys.stdout
+    data = dumps(obj, pretty=fmt == "pretty") + b"\n"
+    buffer = _binary(file)
+    if buffer is None:
+        file.write(data.decode())
+    else:
+        buffer.write(data)
+        buffer.flush()
+
+
+def write_records(records: Iterable, file: IO | None = None, flush: bool = False):
+    # One line per record, written as records arrive.
+    file = file or sys.stdout
+    buffer = _binary(file)
+    for record in records:
+        line = dumps(record) + b"\n"
+        if buffer is None:
+            file.write(line.decode())
+        else:
+            buffer.write(line)
+        if flush:
+            (buffer or file).flush()
+    (buffer or file).flush()
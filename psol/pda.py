@@ -0,0 +1,153 @@
+import itertools
+import os
+import re
+from typing import TYPE_CHECKING, Iterator
+
+from solders.pubkey import Pubkey
+
+if TYPE_CHECKING:
+    from .cache import PdaCache
+
+# Addresses derived per task sent to a worker process.
+CHUNK_SIZE = 2000
+
+# Below this, starting worker processes costs more than it saves.
+MIN_PARALLEL = 10000
+
+INT_SEED = re.compile(r"^(u8|u16|u32|u64|u128)(be)?:(.+)$")
+RANGE = re.compile(r"^\{(-?\d+)\.\.(-?\d+)\}$")
+INT_SIZES = {"u8": 1, "u16": 2, "u32": 4, "u64": 8, "u128": 16}
+
+
+def _int_encoder(kind: str, big_endian: bool):
+    size = INT_SIZES[kind]
+    order = "big" if big_endian else "little"
+    return lambda v: int(v).to_bytes(size, order)
+
+
+def _constant(value: str) -> bytes:
+    # Pubkey, hex or utf-8 string, same as a single `pda` seed.
+    if value.startswith("str:"):
+        return value[4:].encode()
+    if value.startswith("hex:"):
+        return bytes.fromhex(value[4:])
+    try:
+        return bytes(Pubkey.from_string(value))
+    except ValueError:
+        pass
+    try:
+        return bytes.fromhex(value)
+    except ValueError:
+        return value.encode()
+
+
+def parse_seed(template: str) -> list[tuple[object, bytes]]:
+    """
+    Expand one seed template into (value, seed bytes) pairs.
+
+        u8|u16|u32|u64|u128[be]:<n>   integer, little-endian unless `be`
+        {a..b}                        integers a to b, as decimal strings
+        u64:{a..b}                    integers a to b, encoded
+        @<file>                       pubkeys listed in a file
+        str:<s>, hex:<h>              string or hex, else guessed
+
+    Constant seeds expand to a single pair with a None value.
+    """
+    if template.startswith("@"):
+        with open(os.path.expanduser(template[1:])) as f:
+            keys = [line.strip() for line in f if line.strip()]
+        return [(k, bytes(Pubkey.from_string(k))) for k in keys]
+
+    encode = None
+    m = INT_SEED.match(template)
+    if m:
+        encode = _int_encoder(m[1], bool(m[2]))
+        template = m[3]
+        if not RANGE.match(template):
+            return [(None, encode(template))]
+
+    m = RANGE.match(template)
+    if m:
+        start, end = int(m[1]), int(m[2])
+        assert start <= end, f"Empty range {template}"
+        encode = encode or (lambda i: str(i).encode())
+        return [(i, encode(i)) for i in range(start, end + 1)]
+
+    return [(None, _constant(template))]
+
+
+def expand_seeds(templates: list[str]) -> Iterator[tuple[list, list[bytes]]]:
+    # Every combination of the expanded seeds, the last template varies
+    # fastest. Yields the values of the varying seeds and the seeds.
+    expanded = [parse_seed(t) for t in templates]
+    for combination in itertools.product(*expanded):
+        values = [v for v, _ in combination if v is not None]
+        yield values, [seed for _, seed in combination]
+
+
+def derive(program_id: bytes, seeds_list: list[list[bytes]]) -> list[tuple[str, int]]:
+    # Runs in worker processes, arguments and results are plain types.
+    program = Pubkey(program_id)
+    find = Pubkey.find_program_address
+    results = []
+    for seeds in seeds_list:
+        pda, bump = find(seeds, program)
+        results.append((str(pda), bump))
+    return results
+
+
+def derive_many(
+    program_id: Pubkey, seeds_list: list[list[bytes]], jobs: int | None = None
+) -> list[tuple[str, int]]:
+    """
+    `find_program_address` of every seeds list, in order. Large inputs are
+    split over `jobs` processes, default one per CPU.
+    """
+    if jobs == 1 or len(seeds_list) < MIN_PARALLEL:
+        return derive(bytes(program_id), seeds_list)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunks = [
+        seeds_list[i : i + CHUNK_SIZE] for i in range(0, len(seeds_list), CHUNK_SIZE)
+    ]
+    results = []
+    with ProcessPoolExecutor(jobs) as pool:
+        for chunk in pool.map(derive, itertools.repeat(bytes(program_id)), chunks):
+            results += chunk
+    return results
+
+
+def seeds_key(program: bytes, seeds: list[bytes]) -> bytes:
+    # Length prefixed, so different splits of the same bytes differ.
+    return program + b"".join([bytes((len(seed),)) + seed for seed in seeds])
+
+
+def find_program_addresses(
+    program_id: Pubkey,
+    templates: list[str],
+    jobs: int | None = None,
+    cache: "PdaCache | None" = None,
+) -> list[dict]:
+    """
+    Derive the address of every seed combination of `templates`, see
+    `parse_seed`. Known addresses come from `cache`, new ones are added.
+    """
+    combinations = list(expand_seeds(templates))
+    program = bytes(program_id)
+    keys = [seeds_key(program, seeds) for _, seeds in combinations]
+    known = cache.get_many(keys) if cache else {}
+
+    missing = [i for i, key in enumerate(keys) if key not in known]
+    derived = derive_many(program_id, [combinations[i][1] for i in missing], jobs)
+    if cache and derived:
+        cache.put_many(
+            [(keys[i], pda, bump) for i, (pda, bump) in zip(missing, derived)]
+        )
+    known.update((keys[i], result) for i, result in zip(missing, derived))
+
+    records = []
+    for (values, _), key in zip(combinations, keys):
+        pda, bump = known[key]
+        records.append({"pda": pda, "bump": bump, "seeds": values})
+    return records
@@ -0,0 +1,154 @@
+import time
+from hashlib import blake2b
+from typing import TYPE_CHECKING, Iterator
+
+from .utils import diff
+
+if TYPE_CHECKING:
+    from .psol import Psol
+
+# Seconds between the start of two polls.
+POLL_INTERVAL = 5.0
+
+
+class AccountPoller(object):
+    """
+    Watch many accounts by polling, where websockets are not available.
+
+    Every poll sends all getMultipleAccounts chunks in JSON-RPC batches with
+    `minContextSlot` set to the newest slot seen, so results never go back
+    in time. Between polls only the hash and decoded value of each account
+    are kept, accounts whose data, lamports or owner changed are decoded and
+    returned with a field-level `diff` against their previous value.
+    """
+
+    def __init__(
+        self,
+        psol: "Psol",
+        pubkeys: list[str],
+        interval: float = POLL_INTERVAL,
+        commitment: str = "confirmed",
+    ) -> None:
+        self.psol = psol
+        self.pubkeys = list(dict.fromkeys(pubkeys))
+        self.interval = interval
+        self.commitment = commitment
+        self.slot = 0
+        # pubkey -> (hash, parsed) of the last seen state, hash None if the
+        # account does not exist.
+        self.state: dict[str, tuple[bytes | None, dict | None]] = {}
+        self.polls = 0
+
+    def __iter__(self) -> Iterator[dict]:
+        while True:
+            start = time.monotonic()
+            yield from self.poll()
+            time.sleep(max(self.interval - (time.monotonic() - start), 0))
+
+    def _fetch(self) -> Iterator[tuple[int, str, dict | None]]:
+        # (slot, pubkey, base64 account) of every pubkey whose chunk the
+        # node could serve at `minContextSlot`.
+        from .psol import MAX_MULTIPLE_ACCOUNTS
+        from .transport import RPCError
+
+        config = {"encoding": "base64", "commitment": self.commitment}
+        if self.slot:
+            config["minContextSlot"] = self.slot
+        chunks = [
+            self.pubkeys[i : i + MAX_MULTIPLE_ACCOUNTS]
+            for i in range(0, len(self.pubkeys), MAX_MULTIPLE_ACCOUNTS)
+        ]
+        calls = [("getMultipleAccounts", [chunk, config]) for chunk in chunks]
+        for chunk, result in zip(chunks, self.psol.transport.batch(calls)):
+            if isinstance(result, RPCError):
+                # e.g. the node is behind `minContextSlot`, retried next poll.
+                continue
+            slot = result["context"]["slot"]
+            for pubkey, value in zip(chunk, result["value"]):
+                yield slot, pubkey, value
+
+    def poll(self) -> list[dict]:
+        """
+        Fetch every account once and return records of the changed ones.
+        The first poll returns the initial state of every account.
+        """
+        from .psol import _account_from_json
+
+        records = []
+        # (record, hash) of changed accounts, and those without an IDL.
+        changed = []
+        unparsed = []
+        newest = self.slot
+        for slot, pubkey, value in self._fetch():
+            newest = max(newest, slot)
+            digest = _digest(value)
+            previous = self.state.get(pubkey)
+            if previous is not None and previous[0] == digest:
+                continue
+
+            record = {"slot": slot, "pubkey": pubkey}
+            records.append(record)
+            if value is None:
+                record["error"] = "Account not found"
+                self.state[pubkey] = (None, None)
+                continue
+
+            account = _account_from_json(value)
+            record["account"] = self.psol._account_to_dict(account)
+            name, parsed = self.psol.decode_account_data(
+                account.data, str(account.owner)
+            )
+            if name:
+                record["type"] = name
+                record["parsed"] = parsed
+            else:
+                unparsed.append(record)
+            changed.append((record, digest))
+
+        self.slot = newest
+        if unparsed:
+            self._parse_json(unparsed)
+        for record, digest in changed:
+            parsed = record.get("parsed")
+            _, previous = self.state.get(record["pubkey"], (None, None))
+            if previous is not None and parsed is not None:
+                record["diff"] = diff(previous, parsed)
+            self.state[record["pubkey"]] = (digest, parsed)
+
+        self.polls += 1
+        return records
+
+    def _parse_json(self, records: list[dict]):
+        # Accounts without an IDL are parsed by the node if it knows them,
+        # e.g. token accounts.
+        from .psol import MAX_MULTIPLE_ACCOUNTS
+        from .transport import RPCError
+
+        config = {
+            "encoding": "jsonParsed",
+            "commitment": self.commitment,
+            "minContextSlot": self.slot,
+        }
+        chunks = [
+            records[i : i + MAX_MULTIPLE_ACCOUNTS]
+            for i in range(0, len(records), MAX_MULTIPLE_ACCOUNTS)
+        ]
+        calls = [
+            ("getMultipleAccounts", [[r["pubkey"] for r in chunk], config])
+            for chunk in chunks
+        ]
+        for chunk, result in zip(chunks, self.psol.transport.batch(calls)):
+            if isinstance(result, RPCError):
+                continue
+            for record, value in zip(chunk, result["value"]):
+                if value and isinstance(value["data"], dict):
+                    record["parsed"] = value["data"]
+
+
+def _digest(value: dict | None) -> bytes | None:
+    # Hash of the base64 data, lamports and owner, None if not found.
+    if value is None:
+        return None
+    h = blake2b(value["data"][0].encode(), digest_size=16)
+    h.update(f"{value['lamports']}:{value['owner']}".encode())
+    return h.digest()
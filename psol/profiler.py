@@ -0,0 +1,204 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable
+
+# Where the wall time of a command goes. Time of nested sections is only
+# counted in the innermost one, e.g. IDL loading during decoding is `idl`.
+SECTIONS = ("rpc", "idl", "decode", "serialize")
+
+# Commands kept for the `stats` command.
+HISTORY = 20
+
+
+class CommandStats(object):
+
+    def __init__(self, line: str) -> None:
+        self.line = line
+        self.wall = 0.0
+        self.sections = dict.fromkeys(SECTIONS, 0.0)
+        self.rpc_calls = Counter()
+        self.rpc_bytes = 0
+        # Cache name -> (hits, misses) during the command.
+        self.caches = {}
+        self.pstats = None
+
+    def to_dict(self) -> dict:
+        other = self.wall - sum(self.sections.values())
+        return {
+            "command": self.line,
+            "wall_ms": self.wall * 1000,
+            "ms": {
+                **{k: v * 1000 for k, v in self.sections.items()},
+                "other": max(other, 0) * 1000,
+            },
+            "rpc_calls": dict(self.rpc_calls),
+            "rpc_bytes": self.rpc_bytes,
+            "caches": {
+                name: {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                }
+                for name, (hits, misses) in self.caches.items()
+            },
+        }
+
+    def report(self) -> str:
+        d = self.to_dict()
+        times = "  ".join(f"{k} {v:.1f}ms" for k, v in d["ms"].items())
+        calls = ", ".join(f"{m} x{n}" for m, n in self.rpc_calls.most_common())
+        caches = ", ".join(
+            f"{name} {c['hits']}/{c['hits'] + c['misses']} hits"
+            for name, c in d["caches"].items()
+        )
+        lines = [
+            f"---- profile: {self.line} ----",
+            f"wall {d['wall_ms']:.1f}ms  {times}",
+            f"rpc: {calls or 'none'}, {self.rpc_bytes / 1024:.1f}KB received",
+        ]
+        if caches:
+            lines.append(f"cache: {caches}")
+        if self.pstats:
+            lines.append(f"pstats: {self.pstats}")
+        return "\n".join(lines)
+
+
+class _NullSection(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSection()
+
+
+class _Section(object):
+
+    __slots__ = ("profiler", "stats", "name", "parent", "token", "start", "child")
+
+    def __init__(self, profiler: "Profiler", stats: CommandStats, name: str) -> None:
+        self.profiler = profiler
+        self.stats = stats
+        self.name = name
+        self.child = 0.0
+
+    def __enter__(self):
+        stack = self.profiler._stack
+        self.parent = stack.get()
+        self.token = stack.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.profiler._stack.reset(self.token)
+        with self.profiler._lock:
+            self.stats.sections[self.name] += max(elapsed - self.child, 0)
+            if self.parent is not None:
+                self.parent.child += elapsed
+        return False
+
+
+class Profiler(object):
+    """
+    Per-command wall time split, RPC counters and cache hit rates.
+
+    Instrumented code runs in `section(name)` or a `timed(name)` function,
+    both are no-ops unless a command is being profiled. Sections nest across calls and
+    asyncio tasks of one thread, RPC issued from the transport loop thread
+    is counted on its own.
+    """
+
+    def __init__(self) -> None:
+        self.current = None
+        self.history = deque(maxlen=HISTORY)
+        self._lock = threading.Lock()
+        self._stack = contextvars.ContextVar("psol_profile_section", default=None)
+
+    def section(self, name: str):
+        stats = self.current
+        if stats is None:
+            return _NULL
+        return _Section(self, stats, name)
+
+    def timed(self, name: str):
+        # Decorator running the function in `section(name)`.
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self.current is None:
+                    return func(*args, **kwargs)
+                with self.section(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count_rpc(self, method: str, calls: int = 1):
+        stats = self.current
+        if stats is not None:
+            with self._lock:
+                stats.rpc_calls[method] += calls
+
+    def count_bytes(self, size: int):
+        stats = self.current
+        if stats is not None:
+            with self._lock:
+                stats.rpc_bytes += size
+
+    @contextmanager
+    def command(
+        self,
+        line: str,
+        caches: Callable[[], dict] | None = None,
+        pstats_dir: str | None = None,
+    ):
+        # Profile everything run in the block as command `line`.
+        stats = CommandStats(line)
+        before = caches() if caches else {}
+        profile = None
+        if pstats_dir:
+            import cProfile
+
+            profile = cProfile.Profile()
+
+        self.current = stats
+        start = time.perf_counter()
+        try:
+            if profile:
+                profile.enable()
+            yield stats
+        finally:
+            if profile:
+                profile.disable()
+            stats.wall = time.perf_counter() - start
+            self.current = None
+
+            after = caches() if caches else {}
+            for name, (hits, misses) in after.items():
+                hits0, misses0 = before.get(name, (0, 0))
+                stats.caches[name] = (hits - hits0, misses - misses0)
+
+            if profile:
+                # cProfile only sees the calling thread, not the transport loop.
+                pstats_dir = os.path.expanduser(pstats_dir)
+                os.makedirs(pstats_dir, exist_ok=True)
+                name = (line.split() or ["empty"])[0]
+                path = os.path.join(
+                    pstats_dir, f"{int(time.time() * 1000)}_{name}.pstats"
+                )
+                profile.dump_stats(path)
+                stats.pstats = path
+            self.history.append(stats)
+
+
+profiler = Profiler()
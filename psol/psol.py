@@ -1,14 +1,35 @@
+from __future__ import annotations
+
 import asyncio
+import base64
 import json
+import struct
+import threading
+import zlib
+from hashlib import sha256
+from itertools import islice
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Iterator
 
-import requests
-from anchorpy import Idl, Program, Provider
+import base58
+import httpx
+from pyheck import snake
 from solana.rpc.api import Client
+from solders.account import Account
 from solders.pubkey import Pubkey
 from solders.signature import Signature
 
+from .cache import RpcCache
+from .columnar import BUILTIN_LAYOUTS, ColumnarBuilder, ColumnarLayout
+from .decoder import CompiledCoder
 from .idl import IdlDatabase
-from .utils import to_dict
+from .poller import POLL_INTERVAL, AccountPoller
+from .profiler import profiler
+from .subscriptions import Subscriptions, ws_url_of
+from .transport import OfflineError, RPCError, Transport
+from .utils import iter_json_array, to_dict
+
+if TYPE_CHECKING:
+    from anchorpy import Coder, Idl, Provider
 
 RPC_URL = {
     "mainnet": "https://api.mainnet-beta.solana.com",
@@ -16,32 +37,147 @@ RPC_URL = {
     "devnet": "https://api.devnet.solana.com",
 }
 
+# getMultipleAccounts accepts at most 100 pubkeys per request.
+MAX_MULTIPLE_ACCOUNTS = 100
+
+# Projected fields less than this many bytes apart share one dataSlice.
+SLICE_GAP = 256
+
+# getProgramAccounts responses are parsed while being downloaded.
+SCAN_CHUNK_SIZE = 1 << 16
+SCAN_TIMEOUT = httpx.Timeout(300, connect=10)
+
+DECODERS = ("compiled", "anchorpy")
+
+# Default number of concurrent requests for bulk transaction fetches.
+MAX_IN_FLIGHT = 16
+RETRY_DELAY = 0.5
+
+# Per-source IDL lookup timeouts, in seconds.
+IDL_TIMEOUTS = {"onchain": 10, "explorer": 10, "solscan": 10}
+
+# Programs without an IDL are not looked up again until the miss expires.
+IDL_MISS_TTL = 24 * 3600
+
+# Account labels are refreshed after a week, misses after a day.
+NAME_TTL = 7 * 24 * 3600
+NAME_MISS_TTL = 24 * 3600
+NAME_TIMEOUT = 10
+# Keys per solana.fm accounts request.
+NAME_CHUNK_SIZE = 50
+
+# getTransaction calls sent per JSON-RPC batch request.
+TX_BATCH_SIZE = 20
+TX_CONFIG = {"encoding": "json", "maxSupportedTransactionVersion": 100}
+
+BLOCK_CONFIG = {
+    "encoding": "json",
+    "maxSupportedTransactionVersion": 0,
+    "transactionDetails": "full",
+    "rewards": False,
+}
+# Block cleaned up, not available, skipped slot (also in long-term storage).
+MISSING_BLOCK_ERRORS = {-32001, -32004, -32007, -32009}
+
+# getSignaturesForAddress returns at most 1000 signatures per page.
+SIGNATURES_PAGE_SIZE = 1000
+
+# Anchor `emit!` events are logged as `Program data: <base64>`. `emit_cpi!`
+# events are a self-invocation with this tag, the event discriminator and
+# the event data.
+PROGRAM_DATA = "Program data: "
+EVENT_IX_TAG = sha256(b"anchor:event").digest()[:8]
+
 
 class Psol(object):
 
-    def __init__(self, cluster="mainnet", rpc_url=None) -> None:
+    def __init__(
+        self,
+        cluster="mainnet",
+        rpc_url=None,
+        decoder="compiled",
+        offline=False,
+        rpc_cache: RpcCache | None = None,
+        ws_url=None,
+    ) -> None:
         assert cluster in RPC_URL, f"Cluster {cluster} not supported"
         self.cluster = cluster
+        self.set_decoder(decoder)
 
         if not rpc_url:
             rpc_url = RPC_URL[cluster]
 
-        self.provider = Provider.local(rpc_url)
-        self.client = Client(rpc_url)
+        # Immutable RPC results are cached on disk, offline mode only
+        # serves from that cache.
+        self.rpc_cache = rpc_cache or RpcCache()
+        self.rpc_url = rpc_url
+        self.ws_url = ws_url or ws_url_of(rpc_url)
+        self.transport = Transport(rpc_url, cache=self.rpc_cache, offline=offline)
+        self._idl_db = None
+        self._lock = threading.Lock()
 
-        self.idl_db = IdlDatabase()
+    @property
+    def idl_db(self) -> IdlDatabase:
+        # Opened on first use, commands without IDL access skip it.
+        with self._lock:
+            if self._idl_db is None:
+                self._idl_db = IdlDatabase()
+        return self._idl_db
 
-    def fetch_idl_onchain(self, program_id: str) -> str:
-        async def _fetch(program_id: str) -> str:
-            idl = await Program.fetch_raw_idl(program_id, self.provider)
-            return idl
+    @property
+    def client(self) -> Client:
+        return self.transport.client
 
-        return asyncio.run(_fetch(program_id))
+    @property
+    def provider(self) -> Provider:
+        return self.transport.provider
+
+    def fetch_idl_onchain(self, program_id: str) -> str:
+        idls = self.transport.run(self._fetch_idls_onchain([program_id]))
+        assert program_id in idls, f"IDL not found for program: {program_id}"
+        return idls[program_id]
 
     def fetch_idl_solscan(self, program_id: str) -> str:
+        idl = self.transport.run(self._fetch_idl_solscan(program_id))
+        assert idl, f"IDL not found for program: {program_id}"
+        return idl
+
+    def fetch_idl_explorer(self, program_id: str) -> str:
+        idl = self.transport.run(self._fetch_idl_explorer(program_id))
+        assert idl, f"IDL not found for program: {program_id}"
+        return idl
+
+    async def _fetch_idls_onchain(self, program_ids: list[str]) -> dict[str, str]:
+        # Anchor keeps the zlib compressed IDL in an account derived from the
+        # program id, so many IDLs are loaded with a few getMultipleAccounts.
+        async def _fetch(chunk: list[str]) -> dict[str, str]:
+            addresses = [_idl_address(program_id) for program_id in chunk]
+            resp = await self.transport.async_client.get_multiple_accounts(addresses)
+            idls = {}
+            for program_id, account in zip(chunk, resp.value):
+                if account is None:
+                    continue
+                try:
+                    idls[program_id] = _decode_idl_account(account.data)
+                except Exception:
+                    pass
+            return idls
+
+        chunks = [
+            program_ids[i : i + MAX_MULTIPLE_ACCOUNTS]
+            for i in range(0, len(program_ids), MAX_MULTIPLE_ACCOUNTS)
+        ]
+        results = await asyncio.gather(*[_fetch(chunk) for chunk in chunks])
+        return {k: v for idls in results for k, v in idls.items()}
+
+    async def _fetch_idl_onchain(self, program_id: str) -> str | None:
+        idls = await self._fetch_idls_onchain([program_id])
+        return idls.get(program_id)
+
+    async def _fetch_idl_solscan(self, program_id: str) -> str | None:
         assert self.cluster == "mainnet", "Only support mainnet"
 
-        r = requests.get(
+        r = await self.transport.async_session.get(
             f"https://api-v2.solscan.io/v2/account/anchor_idl?address={program_id}",
             headers={
                 "Accept-Language": "en,zh-CN;q=0.9,zh;q=0.8",
@@ -50,14 +186,15 @@ class Psol(object):
                 "accept": "application/json, text/plain, */*",
             },
         )
+        r.raise_for_status()
         resp = r.json()
         assert resp["success"], "Solscan API failed"
-        return json.dumps(resp["data"])
+        return json.dumps(resp["data"]) if resp["data"] else None
 
-    def fetch_idl_explorer(self, program_id: str) -> str:
+    async def _fetch_idl_explorer(self, program_id: str) -> str | None:
         assert self.cluster == "mainnet", "Only support mainnet"
 
-        r = requests.get(
+        r = await self.transport.async_session.get(
             f"https://explorer.solana.com/api/anchor?programAddress={program_id}&cluster=0",
             headers={
                 "Accept-Language": "en,zh-CN;q=0.9,zh;q=0.8",
@@ -66,66 +203,150 @@ class Psol(object):
                 "accept": "application/json, text/plain, */*",
             },
         )
+        r.raise_for_status()
         resp = r.json()
-        return json.dumps(resp["idl"])
+        return json.dumps(resp["idl"]) if resp.get("idl") else None
 
-    def fetch_idl(self, program_id: str) -> tuple[str, str | None]:
+    def _idl_sources(self, onchain: bool = True) -> dict:
+        sources = {}
+        if onchain:
+            sources["onchain"] = self._fetch_idl_onchain
+        if self.cluster == "mainnet":
+            sources["explorer"] = self._fetch_idl_explorer
+            sources["solscan"] = self._fetch_idl_solscan
+        return sources
+
+    async def _race_idl(self, program_id: str, sources: dict) -> tuple[str, str | None]:
+        # Query all sources at once and take the first valid IDL. The result
+        # is "NotFound" only if every source answered, "Error" otherwise.
+        async def _try(src: str, fetch) -> tuple[str, str | None, bool]:
+            try:
+                idl = await asyncio.wait_for(fetch(program_id), IDL_TIMEOUTS[src])
+            except Exception:
+                return src, None, False
+            return src, idl if _valid_idl(idl) else None, True
 
+        tasks = [asyncio.create_task(_try(src, f)) for src, f in sources.items()]
+        answered = True
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                src, idl, ok = await next_result
+                if idl:
+                    return src, idl
+                answered = answered and ok
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return ("NotFound" if answered else "Error"), None
+
+    def _cached_idl(self, program_id: str) -> tuple[str, str | None] | None:
         idl = self.idl_db.get_idl(self.cluster, program_id)
         if idl:
             return "local", idl
+        if self.idl_db.is_idl_missing(self.cluster, program_id):
+            return "NotFound", None
+        return None
 
-        def _get_idl():
-            try:
-                idl = self.fetch_idl_explorer(program_id)
-                return "explorer", idl
-            except Exception:
-                pass
+    def _save_fetched_idl(self, program_id: str, src: str, idl: str | None):
+        if idl:
+            self.idl_db.save_idl(self.cluster, program_id, idl)
+        elif src == "NotFound":
+            self.idl_db.set_idl_missing(self.cluster, program_id, IDL_MISS_TTL)
+
+    def fetch_idl(
+        self, program_id: str, refresh: bool = False
+    ) -> tuple[str, str | None]:
+        cached = None if refresh else self._cached_idl(program_id)
+        if cached:
+            return cached
+        if self.transport.offline:
+            return "NotFound", None
 
+        src, idl = self.transport.run(self._race_idl(program_id, self._idl_sources()))
+        self._save_fetched_idl(program_id, src, idl)
+        return src, idl
+
+    def fetch_idls(
+        self,
+        program_ids: Iterable[str],
+        max_in_flight: int = MAX_IN_FLIGHT,
+        refresh: bool = False,
+    ) -> dict[str, tuple[str, str | None]]:
+        # Bulk fetch_idl. Local IDLs and known misses are served from the
+        # cache, the rest is loaded on-chain in getMultipleAccounts chunks
+        # and what is left is raced across the off-chain sources.
+        program_ids = list(dict.fromkeys(program_ids))
+        results = {}
+        for program_id in program_ids:
+            cached = None if refresh else self._cached_idl(program_id)
+            if cached:
+                results[program_id] = cached
+
+        async def _fetch_all(missing: list[str]) -> dict:
+            fetched = {}
             try:
-                idl = self.fetch_idl_solscan(program_id)
-                return "solscan", idl
+                idls = await asyncio.wait_for(
+                    self._fetch_idls_onchain(missing), IDL_TIMEOUTS["onchain"]
+                )
             except Exception:
-                pass
+                idls = {}
+            for program_id, idl in idls.items():
+                if _valid_idl(idl):
+                    fetched[program_id] = ("onchain", idl)
 
-            return "NotFound", None
+            sem = asyncio.Semaphore(max_in_flight)
+            sources = self._idl_sources(onchain=False)
 
-        typ, idl = _get_idl()
-        if idl:
-            self.idl_db.save_idl(self.cluster, program_id, idl)
-            return typ, idl
+            async def _race(program_id: str):
+                async with sem:
+                    fetched[program_id] = await self._race_idl(program_id, sources)
 
-        return "NotFound", None
+            await asyncio.gather(*[_race(p) for p in missing if p not in fetched])
+            return fetched
+
+        missing = [p for p in program_ids if p not in results]
+        if self.transport.offline:
+            results.update(dict.fromkeys(missing, ("NotFound", None)))
+        elif missing:
+            fetched = self.transport.run(_fetch_all(missing))
+            for program_id, (src, idl) in fetched.items():
+                self._save_fetched_idl(program_id, src, idl)
+            results.update(fetched)
+
+        return {program_id: results[program_id] for program_id in program_ids}
+
+    def set_decoder(self, decoder: str):
+        # "compiled" falls back to anchorpy for IDLs it can not compile.
+        assert decoder in DECODERS, f"Decoder {decoder} not supported"
+        self.decoder = decoder
 
     def set_cluster(self, cluster: str):
         assert cluster in RPC_URL, f"Cluster {cluster} not supported"
-        rpc_url = RPC_URL[cluster]
-        self.provider = Provider.local(rpc_url)
-        self.client = Client(rpc_url)
-
-    def get_account_info(self, _pubkey: str) -> tuple[dict, dict]:
-        pubkey = Pubkey.from_string(_pubkey)
-        account = self.client.get_account_info(pubkey).value
-        assert account, f"Account not found: {pubkey}"
+        self.cluster = cluster
+        self.rpc_url = RPC_URL[cluster]
+        self.ws_url = ws_url_of(self.rpc_url)
+        offline = self.transport.offline
+        self.transport.close()
+        self.transport = Transport(self.rpc_url, cache=self.rpc_cache, offline=offline)
 
+    def _account_to_dict(self, account: Account) -> dict:
         acc_dict = json.loads(account.to_json())
         acc_dict["data"] = account.data[:100].hex()
         size = len(account.data)
         if size > 100:
             acc_dict["data"] += "..."
         acc_dict["size"] = size
+        return acc_dict
 
-        discriminator = account.data[:8].hex()
-        idl_str, name = self.idl_db.load_idl_by_account_discriminator(discriminator)
-        parsed_data = {}
-        if idl_str:
-            idl = Idl.from_json(idl_str)
+    def get_account_info(self, _pubkey: str) -> tuple[dict, dict]:
+        pubkey = Pubkey.from_string(_pubkey)
+        account = self.client.get_account_info(pubkey).value
+        assert account, f"Account not found: {pubkey}"
 
-            async def _fetch_acc():
-                program = Program(idl, pubkey, self.provider)
-                return await program.account[name].fetch(pubkey)
+        acc_dict = self._account_to_dict(account)
 
-            parsed_data = asyncio.run(_fetch_acc()).__dict__
+        _, parsed_data = self.decode_account_data(account.data, str(account.owner))
 
         if not parsed_data:
             acc = self.client.get_account_info_json_parsed(pubkey).value
@@ -136,51 +357,440 @@ class Psol(object):
 
         return acc_dict, parsed_data
 
-    def get_account_name(self, pubkey: str) -> str:
-        assert self.cluster == "mainnet", "Only support mainnet"
+    def get_account_fields(self, pubkey: str, fields: list[str]) -> dict:
+        """
+        Only `fields` (dotted paths, see `CompiledCoder.field_slice`) of an
+        IDL account. Fields at fixed offsets are read from `dataSlice` byte
+        ranges fetched in one batch, the whole account is fetched if one
+        follows a variable-length member or the IDL is not compiled.
+        """
+        config = {"encoding": "base64", "dataSlice": {"offset": 0, "length": 8}}
+        head = self.transport.call("getAccountInfo", [pubkey, config])
+        value = head["value"]
+        assert value, f"Account not found: {pubkey}"
+        slot = head["context"]["slot"]
+        discriminator = base64.b64decode(value["data"][0])
 
-        if pubkey in self.idl_db.names:
-            return self.idl_db.names[pubkey]
+        coder = None
+        if self.decoder == "compiled":
+            _, coder, name = self.idl_db.load_coder_by_account_discriminator(
+                self.cluster, discriminator.hex(), value["owner"], compiled=True
+            )
+        slices = [coder.field_slice(name, f) for f in fields] if coder else [None]
+        if None in slices:
+            return self._get_account_fields_full(pubkey, fields, slot)
 
-        try:
-            r = requests.get(
-                f"https://api-v2.solscan.io/v2/account?address={pubkey}",
-                headers={
-                    "Accept-Language": "en,zh-CN;q=0.9,zh;q=0.8",
-                    "Origin": "https://solscan.io",
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-                    "accept": "application/json, text/plain, */*",
-                },
+        # Nearby fields are read with one range.
+        ranges = []
+        for offset, size, _ in sorted(slices, key=lambda s: s[0]):
+            if ranges and offset - ranges[-1][1] <= SLICE_GAP:
+                ranges[-1][1] = max(ranges[-1][1], offset + size)
+            else:
+                ranges.append([offset, offset + size])
+        calls = [
+            (
+                "getAccountInfo",
+                [
+                    pubkey,
+                    {
+                        "encoding": "base64",
+                        "dataSlice": {"offset": start, "length": end - start},
+                        "minContextSlot": slot,
+                    },
+                ],
             )
-            resp = r.json()
-            assert resp["success"], "Solscan API failed"
-            name = resp["data"]["notifications"]["label"]
-            if name:
-                self.idl_db.names[pubkey] = name
-                return name
-        except Exception:
-            pass
+            for start, end in ranges
+        ]
+        views = []
+        for (start, end), result in zip(ranges, self.transport.batch(calls)):
+            if isinstance(result, RPCError):
+                raise result
+            assert result["value"], f"Account not found: {pubkey}"
+            slot = max(slot, result["context"]["slot"])
+            data = base64.b64decode(result["value"]["data"][0])
+            if len(data) < end - start:
+                raise ValueError(f"Data too short at offset {start + len(data)}")
+            views.append((start, memoryview(data)))
 
-        try:
-            r = requests.post(
-                "https://api.solana.fm/v0/accounts",
-                headers={
-                    "content-type": "application/json",
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-                    "accept": "application/json",
-                },
-                json={"accountHashes": [pubkey]},
+        values = {}
+        for path, (offset, _, decode) in zip(fields, slices):
+            start, view = next(v for v in reversed(views) if v[0] <= offset)
+            values[path] = decode(view, offset - start)
+        return {
+            "pubkey": pubkey,
+            "slot": slot,
+            "owner": value["owner"],
+            "lamports": value["lamports"],
+            "type": name,
+            "fields": values,
+        }
+
+    def _get_account_fields_full(
+        self, pubkey: str, fields: list[str], min_slot: int
+    ) -> dict:
+        config = {"encoding": "base64", "minContextSlot": min_slot}
+        resp = self.transport.call("getAccountInfo", [pubkey, config])
+        assert resp["value"], f"Account not found: {pubkey}"
+        account = _account_from_json(resp["value"])
+        name, parsed = self.decode_account_data(account.data, str(account.owner))
+        assert name, f"Unknown account type of {pubkey}"
+        return {
+            "pubkey": pubkey,
+            "slot": resp["context"]["slot"],
+            "owner": str(account.owner),
+            "lamports": account.lamports,
+            "type": name,
+            "fields": {path: _pick(parsed, path) for path in fields},
+        }
+
+    def iter_multiple_accounts(
+        self, pubkeys: Iterable[str], chunk_size: int = MAX_MULTIPLE_ACCOUNTS
+    ) -> Iterator[list[tuple[Pubkey, Account | None]]]:
+        # Yield one getMultipleAccounts chunk at a time, in input order.
+        assert 0 < chunk_size <= MAX_MULTIPLE_ACCOUNTS, "Invalid chunk size"
+
+        pubkeys = iter(pubkeys)
+        while True:
+            chunk = [Pubkey.from_string(pk) for pk in islice(pubkeys, chunk_size)]
+            if not chunk:
+                return
+
+            accounts = self.client.get_multiple_accounts(chunk).value
+            yield list(zip(chunk, accounts))
+
+    def get_multiple_accounts(
+        self, pubkeys: Iterable[str], chunk_size: int = MAX_MULTIPLE_ACCOUNTS
+    ) -> Iterator[dict]:
+        # Records are yielded in input order, only one chunk is held in memory.
+        for chunk in self.iter_multiple_accounts(pubkeys, chunk_size):
+            records = []
+            unparsed = []
+            for pubkey, account in chunk:
+                record = {"pubkey": str(pubkey)}
+                if account is None:
+                    record["error"] = "Account not found"
+                else:
+                    record["account"] = self._account_to_dict(account)
+                    name, parsed = self.decode_account_data(
+                        account.data, str(account.owner)
+                    )
+                    if name:
+                        record["type"] = name
+                        record["parsed"] = parsed
+                    else:
+                        unparsed.append(len(records))
+                records.append(record)
+
+            if unparsed:
+                resp = self.client.get_multiple_accounts_json_parsed(
+                    [chunk[i][0] for i in unparsed]
+                )
+                for i, acc in zip(unparsed, resp.value):
+                    if acc and not isinstance(acc.data, bytes):
+                        records[i]["parsed"] = json.loads(acc.data.to_json())
+
+            yield from records
+
+    def iter_program_accounts(
+        self,
+        program_id: str,
+        filters: list[dict] | None = None,
+        data_slice: tuple[int, int] | None = None,
+    ) -> Iterator[tuple[str, Account]]:
+        # `filters` are raw getProgramAccounts filters, e.g.
+        # {"memcmp": {"offset": 8, "bytes": "<base58>"}} or {"dataSize": 165}.
+        # The response is parsed while it is being downloaded.
+        config = {"encoding": "base64", "filters": list(filters or [])}
+        if data_slice:
+            offset, length = data_slice
+            config["dataSlice"] = {"offset": offset, "length": length}
+
+        chunks = self.transport.stream(
+            "getProgramAccounts",
+            [program_id, config],
+            SCAN_CHUNK_SIZE,
+            SCAN_TIMEOUT,
+        )
+        for item in iter_json_array(chunks):
+            yield item["pubkey"], _account_from_json(item["account"])
+
+    def account_type_filter(self, account_type: str) -> dict:
+        discriminator = self.idl_db._account_discriminator(account_type)
+        return {
+            "memcmp": {
+                "offset": 0,
+                "bytes": base58.b58encode(bytes.fromhex(discriminator)).decode(),
+            }
+        }
+
+    def scan_program_accounts(
+        self,
+        program_id: str,
+        account_type: str | None = None,
+        filters: list[dict] | None = None,
+        data_slice: tuple[int, int] | None = None,
+    ) -> Iterator[dict]:
+        filters = list(filters or [])
+        if account_type:
+            filters.insert(0, self.account_type_filter(account_type))
+
+        for pubkey, account in self.iter_program_accounts(
+            program_id, filters, data_slice
+        ):
+            record = {
+                "pubkey": pubkey,
+                "account": self._account_to_dict(account),
+            }
+            # A sliced account can only be decoded if the IDL layout is
+            # complete, so keep the raw bytes in that case.
+            if not data_slice:
+                name, parsed = self.decode_account_data(account.data, program_id)
+                if name:
+                    record["type"] = name
+                    record["parsed"] = parsed
+            yield record
+
+    def columnar_layout(
+        self, account_type: str, program_id: str | None = None
+    ) -> ColumnarLayout:
+        if account_type in BUILTIN_LAYOUTS:
+            return ColumnarLayout.builtin(account_type)
+
+        discriminator = self.idl_db._account_discriminator(account_type)
+        row = self.idl_db._lookup(self.cluster, "account", discriminator, program_id)
+        assert row, f"IDL of account {account_type} not found"
+
+        path, name = row
+        idl = json.loads(open(path).read())
+        if program_id is None:
+            program_id = idl.get("address") or idl.get("metadata", {}).get("address")
+        if program_id is None:
+            _, program_id = self.idl_db._program_of_path(path)
+        return ColumnarLayout.from_idl(idl, name, program_id)
+
+    def get_columnar(
+        self,
+        account_type: str,
+        pubkeys: Iterable[str] | None = None,
+        program_id: str | None = None,
+    ):
+        # Decode all accounts of a fixed-size type into one record array.
+        # Accounts are fetched by pubkeys if given, otherwise by program scan.
+        layout = self.columnar_layout(account_type, program_id)
+        builder = ColumnarBuilder(layout)
+        if pubkeys is not None:
+            for chunk in self.iter_multiple_accounts(pubkeys):
+                for pubkey, account in chunk:
+                    if account is not None:
+                        builder.add(bytes(pubkey), account.data)
+        else:
+            for pubkey, account in self.iter_program_accounts(
+                layout.program_id, layout.filters
+            ):
+                builder.add(base58.b58decode(pubkey), account.data)
+
+        pubkeys, records = builder.finish()
+        return pubkeys, records, builder.skipped
+
+    def watch_account(
+        self, pubkeys: list[str], commitment: str = "confirmed"
+    ) -> Iterator[dict]:
+        subscriptions = Subscriptions(self.ws_url, commitment)
+        for pubkey in pubkeys:
+            subscriptions.account(pubkey)
+        return self.watch(subscriptions)
+
+    def watch_program(
+        self,
+        program_id: str,
+        account_type: str | None = None,
+        filters: list[dict] | None = None,
+        commitment: str = "confirmed",
+    ) -> Iterator[dict]:
+        filters = list(filters or [])
+        if account_type:
+            filters.insert(0, self.account_type_filter(account_type))
+        subscriptions = Subscriptions(self.ws_url, commitment)
+        subscriptions.program(program_id, filters)
+        return self.watch(subscriptions)
+
+    def watch_logs(
+        self, mentions: list[str] | None = None, commitment: str = "confirmed"
+    ) -> Iterator[dict]:
+        # Logs of all txs if no address is given.
+        subscriptions = Subscriptions(self.ws_url, commitment)
+        for address in mentions or [None]:
+            subscriptions.logs(address)
+        return self.watch(subscriptions)
+
+    def poll_accounts(
+        self,
+        pubkeys: list[str],
+        interval: float = POLL_INTERVAL,
+        commitment: str = "confirmed",
+    ) -> Iterator[dict]:
+        # Polling alternative to `watch_account`, for many accounts or
+        # nodes without websockets. Records carry a `diff` once changed.
+        if self.transport.offline:
+            raise OfflineError("Polling")
+        return iter(AccountPoller(self, pubkeys, interval, commitment))
+
+    def watch(self, subscriptions: Subscriptions) -> Iterator[dict]:
+        # Decoded notifications in arrival order. The websocket is only read
+        # as fast as the caller consumes records.
+        if self.transport.offline:
+            raise OfflineError("Subscription")
+
+        for kind, key, result in self.transport.iterate(subscriptions.__aiter__()):
+            yield self._decode_notification(kind, key, result)
+
+    def _decode_notification(self, kind: str, key: str, result: dict) -> dict:
+        slot = result["context"]["slot"]
+        value = result["value"]
+        if kind == "logs":
+            return {
+                "slot": slot,
+                "signature": value["signature"],
+                "err": value["err"],
+                "logs": value["logs"],
+            }
+
+        pubkey = key
+        if kind == "program":
+            pubkey, value = value["pubkey"], value["account"]
+        account = _account_from_json(value)
+        record = {
+            "slot": slot,
+            "pubkey": pubkey,
+            "account": self._account_to_dict(account),
+        }
+        name, parsed = self.decode_account_data(account.data, str(account.owner))
+        if name:
+            record["type"] = name
+            record["parsed"] = parsed
+        return record
+
+    @profiler.timed("decode")
+    def decode_account_data(
+        self, data: bytes, program_id: str | None = None
+    ) -> tuple[str, dict]:
+        discriminator = data[:8].hex()
+        if self.decoder == "compiled":
+            _, coder, name = self.idl_db.load_coder_by_account_discriminator(
+                self.cluster, discriminator, program_id, compiled=True
             )
-            resp = r.json()
-            assert resp["status"] == "Success", "solana.fm API failed"
-            name += resp["result"][0]["data"]["friendlyName"]
+            if coder:
+                try:
+                    return coder.decode_account(data)
+                except Exception:
+                    # Retried with the anchorpy coder below.
+                    pass
+
+        _, coder, name = self.idl_db.load_coder_by_account_discriminator(
+            self.cluster, discriminator, program_id
+        )
+        if not coder:
+            return "", {}
+
+        return name, coder.accounts.decode(data).__dict__
+
+    def get_account_name(self, pubkey: str) -> str:
+        return self.get_account_names([pubkey])[pubkey]
+
+    def get_account_names(
+        self, pubkeys: Iterable[str], refresh: bool = False
+    ) -> dict[str, str]:
+        # Labels of many accounts, "Unknown" if no provider has one. Cached
+        # names and misses are served locally, the rest is resolved by
+        # solscan and solana.fm concurrently.
+        assert self.cluster == "mainnet", "Only support mainnet"
+
+        pubkeys = list(dict.fromkeys(pubkeys))
+        names = {} if refresh else self.idl_db.get_names(pubkeys)
+        missing = [pubkey for pubkey in pubkeys if pubkey not in names]
+        if missing and not self.transport.offline:
+            names.update(self.transport.run(self._resolve_names(missing)))
+
+        return {pubkey: names.get(pubkey) or "Unknown" for pubkey in pubkeys}
+
+    async def _resolve_names(self, pubkeys: list[str]) -> dict[str, str]:
+        solscan, solana_fm = await asyncio.gather(
+            self._fetch_names_solscan(pubkeys), self._fetch_names_solana_fm(pubkeys)
+        )
+
+        # A key is a cached miss only if both providers answered for it.
+        found = {}
+        missed = {}
+        for pubkey in pubkeys:
+            name = solscan.get(pubkey) or solana_fm.get(pubkey)
             if name:
-                self.idl_db.names[pubkey] = name
-                return name
-        except Exception:
-            pass
+                found[pubkey] = name
+            elif pubkey in solscan and pubkey in solana_fm:
+                missed[pubkey] = ""
+        self.idl_db.set_names(found, NAME_TTL)
+        self.idl_db.set_names(missed, NAME_MISS_TTL)
+        return found
+
+    async def _fetch_names_solscan(self, pubkeys: list[str]) -> dict[str, str]:
+        # Solscan has no batch endpoint, one request per key. Keys that
+        # failed are left out, answered keys without label map to "".
+        sem = asyncio.Semaphore(MAX_IN_FLIGHT)
+        names = {}
+
+        async def _fetch(pubkey: str):
+            async with sem:
+                try:
+                    r = await self.transport.async_session.get(
+                        f"https://api-v2.solscan.io/v2/account?address={pubkey}",
+                        headers={
+                            "Accept-Language": "en,zh-CN;q=0.9,zh;q=0.8",
+                            "Origin": "https://solscan.io",
+                            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
+                            "accept": "application/json, text/plain, */*",
+                        },
+                        timeout=NAME_TIMEOUT,
+                    )
+                    resp = r.json()
+                    assert resp["success"], "Solscan API failed"
+                    notifications = resp["data"].get("notifications") or {}
+                    names[pubkey] = notifications.get("label") or ""
+                except Exception:
+                    pass
+
+        await asyncio.gather(*[_fetch(pubkey) for pubkey in pubkeys])
+        return names
+
+    async def _fetch_names_solana_fm(self, pubkeys: list[str]) -> dict[str, str]:
+        async def _fetch(chunk: list[str]) -> dict[str, str]:
+            try:
+                r = await self.transport.async_session.post(
+                    "https://api.solana.fm/v0/accounts",
+                    headers={
+                        "content-type": "application/json",
+                        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
+                        "accept": "application/json",
+                    },
+                    json={"accountHashes": chunk},
+                    timeout=NAME_TIMEOUT,
+                )
+                resp = r.json()
+                assert resp["status"] == "Success", "solana.fm API failed"
+            except Exception:
+                return {}
+
+            names = dict.fromkeys(chunk, "")
+            for item in resp["result"] or []:
+                pubkey = item.get("accountHash")
+                if pubkey in names:
+                    names[pubkey] = (item.get("data") or {}).get("friendlyName") or ""
+            return names
 
-        return "Unknown"
+        chunks = [
+            pubkeys[i : i + NAME_CHUNK_SIZE]
+            for i in range(0, len(pubkeys), NAME_CHUNK_SIZE)
+        ]
+        results = await asyncio.gather(*[_fetch(chunk) for chunk in chunks])
+        return {k: v for names in results for k, v in names.items()}
 
     def get_transaction(self, signature: str) -> dict:
         tx_sig = Signature.from_string(signature)
@@ -191,17 +801,435 @@ class Psol(object):
         tx_dict = json.loads(tx.to_json())
         return tx_dict
 
+    def get_block(self, slot: int) -> dict | None:
+        # None if there is no block at the slot.
+        try:
+            return self.transport.call("getBlock", [slot, BLOCK_CONFIG])
+        except RPCError as e:
+            if e.code in MISSING_BLOCK_ERRORS:
+                return None
+            raise
+
+    def get_transactions(
+        self, signatures: list[str], max_in_flight: int = MAX_IN_FLIGHT
+    ) -> list[dict]:
+        # Fetch in JSON-RPC batches, at most `max_in_flight` at a time.
+        # Failed lookups are returned in place as {"signature", "error"}.
+        async def _fetch_all():
+            sem = asyncio.Semaphore(max_in_flight)
+
+            async def _fetch(batch: list[str]) -> list[dict]:
+                async with sem:
+                    return await self.get_transactions_async(batch)
+
+            batches = [
+                signatures[i : i + TX_BATCH_SIZE]
+                for i in range(0, len(signatures), TX_BATCH_SIZE)
+            ]
+            results = await asyncio.gather(*[_fetch(b) for b in batches])
+            return [tx for batch in results for tx in batch]
+
+        return self.transport.run(_fetch_all())
+
+    async def get_transactions_async(
+        self, signatures: list[str], retries: int = 0
+    ) -> list[dict]:
+        # One batch request. Errors are returned as {"signature", "error"}
+        # once retries run out.
+        calls = [("getTransaction", [sig, TX_CONFIG]) for sig in signatures]
+        for attempt in range(retries + 1):
+            try:
+                results = await self.transport.batch_async(calls)
+                break
+            except Exception as e:
+                if attempt == retries:
+                    return [{"signature": sig, "error": str(e)} for sig in signatures]
+                await asyncio.sleep(RETRY_DELAY * 2**attempt)
+
+        txs = []
+        for signature, result in zip(signatures, results):
+            if isinstance(result, RPCError):
+                txs.append({"signature": signature, "error": str(result)})
+            elif result is None:
+                error = f"Transaction not found: {signature}"
+                txs.append({"signature": signature, "error": error})
+            else:
+                txs.append(result)
+        return txs
+
+    def decode_transactions(
+        self, signatures: list[str], max_in_flight: int = MAX_IN_FLIGHT
+    ) -> list[dict]:
+        txs = self.get_transactions(signatures, max_in_flight)
+        return [tx if "error" in tx else self.decode_transaction(tx) for tx in txs]
+
+    def decode_transaction(self, tx: dict, coders: dict | None = None) -> dict:
+        # `coders` memoizes coder lookups across many txs, see decode_event.
+        message = tx["transaction"]["message"]
+        meta = tx.get("meta") or {}
+        loaded = meta.get("loadedAddresses") or {}
+        keys = (
+            message["accountKeys"]
+            + loaded.get("writable", [])
+            + loaded.get("readonly", [])
+        )
+        inner = {
+            item["index"]: item["instructions"]
+            for item in meta.get("innerInstructions") or []
+        }
+
+        instructions = []
+        for i, ix in enumerate(message["instructions"]):
+            instructions.append(self._decode_tx_instruction(str(i), ix, keys, coders))
+            for j, inner_ix in enumerate(inner.get(i, [])):
+                instructions.append(
+                    self._decode_tx_instruction(f"{i}.{j}", inner_ix, keys, coders)
+                )
+
+        return {
+            "signature": tx["transaction"]["signatures"][0],
+            "slot": tx.get("slot"),
+            "blockTime": tx.get("blockTime"),
+            "err": meta.get("err"),
+            "instructions": instructions,
+        }
+
+    def _decode_tx_instruction(
+        self, index: str, ix: dict, keys: list[str], coders: dict | None = None
+    ) -> dict:
+        program_id = keys[ix["programIdIndex"]]
+        accounts = [keys[i] for i in ix["accounts"]]
+        data = base58.b58decode(ix["data"])
+
+        record = {"index": index, "program_id": program_id}
+        decoded = self.decode_instruction(program_id, accounts, data, coders)
+        if "error" in decoded:
+            record["accounts"] = accounts
+            record["data"] = data.hex()
+        record.update(decoded)
+        return record
+
+    def _load_instruction_coder(
+        self, program_id: str, discriminator: bytes, compiled: bool
+    ) -> tuple[Idl | None, Coder | CompiledCoder | None]:
+        # Prefer the IDL fetched for this program, fall back to the index.
+        idl, coder = self.idl_db.load_coder_by_program(
+            self.cluster, program_id, compiled
+        )
+        if coder:
+            if compiled:
+                names = coder.instruction_names
+            else:
+                names = coder.instruction.sighash_to_name
+            if discriminator in names:
+                return idl, coder
+
+        idl, coder, _ = self.idl_db.load_coder_by_instruction_discriminator(
+            self.cluster, discriminator.hex(), program_id, compiled
+        )
+        return idl, coder
+
+    @profiler.timed("decode")
+    def decode_instruction(
+        self,
+        program_id: str,
+        accounts: list[str],
+        data: bytes,
+        coders: dict | None = None,
+    ) -> dict:
+        coders = {} if coders is None else coders
+        discriminator = data[:8]
+        key = (program_id, discriminator)
+        if key not in coders:
+            compiled = self.decoder == "compiled"
+            idl, coder = self._load_instruction_coder(
+                program_id, discriminator, compiled
+            )
+            if compiled and not coder:
+                compiled = False
+                idl, coder = self._load_instruction_coder(
+                    program_id, discriminator, False
+                )
+            coders[key] = idl, coder, compiled
+
+        idl, coder, compiled = coders[key]
+        if not coder:
+            return {"error": f"Unknow discriminator {discriminator.hex()}"}
+
+        try:
+            if compiled:
+                name, args = coder.decode_instruction(data)
+                names = coder.instruction_accounts[name]
+            else:
+                ix_parsed = coder.instruction.parse(data)
+                name, args = ix_parsed.name, to_dict(ix_parsed.data)
+                names = []
+                for idl_ix in idl.instructions:
+                    if snake(idl_ix.name) == name:
+                        names = _flatten_accounts(idl_ix.accounts)
+                        break
+        except Exception as e:
+            return {"error": f"Decode failed: {e}"}
+
+        decoded = {
+            "name": name,
+            "args": args,
+            "accounts": dict(zip(names, accounts)),
+        }
+        if len(accounts) > len(names):
+            decoded["remaining_accounts"] = accounts[len(names) :]
+        return decoded
+
+    def get_signatures(
+        self,
+        address: str,
+        limit: int | None = None,
+        before: str | None = None,
+        until: str | None = None,
+    ) -> Iterator[list[str]]:
+        return self.transport.iterate(
+            self.get_signatures_async(address, limit, before, until)
+        )
+
+    async def get_signatures_async(
+        self,
+        address: str,
+        limit: int | None = None,
+        before: str | None = None,
+        until: str | None = None,
+    ) -> AsyncIterator[list[str]]:
+        # Pages of signatures of txs mentioning `address`, newest first,
+        # from `before` down to `until` (both exclusive).
+        while limit is None or limit > 0:
+            config = {"limit": min(SIGNATURES_PAGE_SIZE, limit or SIGNATURES_PAGE_SIZE)}
+            if before:
+                config["before"] = before
+            if until:
+                config["until"] = until
+            items = await self.transport.call_async(
+                "getSignaturesForAddress", [address, config]
+            )
+            if not items:
+                break
+            signatures = [item["signature"] for item in items]
+            yield signatures
+            before = signatures[-1]
+            if limit is not None:
+                limit -= len(signatures)
+
+    def iter_events(
+        self,
+        signatures: Iterable[list[str]],
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ) -> Iterator[dict]:
+        # Events of each page of signatures, a page is fetched at a time and
+        # a coder is only looked up once per program and discriminator.
+        coders = {}
+        for page in signatures:
+            for tx in self.get_transactions(page, max_in_flight):
+                if "error" in tx:
+                    yield tx
+                    continue
+                yield from self.decode_events(tx, coders)
+
+    def decode_events(self, tx: dict, coders: dict | None = None) -> Iterator[dict]:
+        """
+        Anchor events of a fetched tx, both logged (`source` "log") and
+        self-CPI (`source` "cpi") ones, by top-level instruction. Only the
+        logs and inner instructions are read, the tx itself is not decoded.
+        """
+        coders = {} if coders is None else coders
+        meta = tx.get("meta") or {}
+        found = list(_log_events(meta.get("logMessages") or []))
+
+        message = tx["transaction"]["message"]
+        loaded = meta.get("loadedAddresses") or {}
+        keys = (
+            message["accountKeys"]
+            + loaded.get("writable", [])
+            + loaded.get("readonly", [])
+        )
+        for item in meta.get("innerInstructions") or []:
+            for j, ix in enumerate(item["instructions"]):
+                data = base58.b58decode(ix["data"])
+                if data[:8] == EVENT_IX_TAG:
+                    program_id = keys[ix["programIdIndex"]]
+                    index = f"{item['index']}.{j}"
+                    found.append((item["index"], index, "cpi", program_id, data[8:]))
+        found.sort(key=lambda event: event[0])
+
+        header = {
+            "signature": tx["transaction"]["signatures"][0],
+            "slot": tx.get("slot"),
+            "blockTime": tx.get("blockTime"),
+            "err": meta.get("err"),
+        }
+        for _, index, source, program_id, data in found:
+            record = {
+                **header,
+                "instruction": index,
+                "source": source,
+                "program_id": program_id,
+            }
+            record.update(self.decode_event(program_id, data, coders))
+            yield record
+
+    def _load_event_coder(
+        self, program_id: str, discriminator: bytes, compiled: bool
+    ) -> tuple[Idl | None, Coder | CompiledCoder | None]:
+        # Prefer the IDL fetched for this program, fall back to the index.
+        idl, coder = self.idl_db.load_coder_by_program(
+            self.cluster, program_id, compiled
+        )
+        if coder:
+            if compiled:
+                names = coder.event_names
+            else:
+                names = coder.events.discriminators
+            if discriminator in names:
+                return idl, coder
+
+        idl, coder, _ = self.idl_db.load_coder_by_event_discriminator(
+            self.cluster, discriminator.hex(), program_id, compiled
+        )
+        return idl, coder
+
+    @profiler.timed("decode")
+    def decode_event(
+        self, program_id: str, data: bytes, coders: dict | None = None
+    ) -> dict:
+        # `coders` memoizes coder lookups across the events of many txs.
+        discriminator = data[:8]
+        coders = {} if coders is None else coders
+        key = (program_id, discriminator)
+        if key not in coders:
+            coder = None
+            if self.decoder == "compiled":
+                _, coder = self._load_event_coder(program_id, discriminator, True)
+            if not coder:
+                _, coder = self._load_event_coder(program_id, discriminator, False)
+            coders[key] = coder
+
+        coder = coders[key]
+        if not coder:
+            return {
+                "error": f"Unknow discriminator {discriminator.hex()}",
+                "data": data.hex(),
+            }
+
+        try:
+            if isinstance(coder, CompiledCoder):
+                name, args = coder.decode_event(data)
+            else:
+                event = coder.events.parse(data)
+                name, args = event.name, to_dict(event.data)
+        except Exception as e:
+            return {"error": f"Decode failed: {e}", "data": data.hex()}
+        return {"name": name, "data": args}
+
+    @profiler.timed("decode")
     def decode_ix_data(self, ix_data: str) -> dict:
 
         discriminator = ix_data[:16]
-        idl_str, name = self.idl_db.load_idl_by_instruction_discriminator(discriminator)
-        if not idl_str:
-            return {"error": f"Unknow discriminator {discriminator}"}
+        ix_bytes = bytes.fromhex(ix_data)
+        if self.decoder == "compiled":
+            _, coder, _ = self.idl_db.load_coder_by_instruction_discriminator(
+                self.cluster, discriminator, compiled=True
+            )
+            if coder:
+                try:
+                    name, args = coder.decode_instruction(ix_bytes)
+                    return {"data": args, "name": name}
+                except Exception:
+                    # Retried with the anchorpy coder below.
+                    pass
 
-        idl = Idl.from_json(idl_str)
-        program = Program(idl, Pubkey.default(), self.provider)
+        _, coder, name = self.idl_db.load_coder_by_instruction_discriminator(
+            self.cluster, discriminator
+        )
+        if not coder:
+            return {"error": f"Unknow discriminator {discriminator}"}
 
-        ix_bytes = bytes.fromhex(ix_data)
-        ix_parsed = program.coder.instruction.parse(ix_bytes)
+        ix_parsed = coder.instruction.parse(ix_bytes)
 
         return to_dict(ix_parsed)
+
+
+def _account_from_json(value: dict) -> Account:
+    # Account of a base64 encoded RPC response.
+    return Account(
+        value["lamports"],
+        base64.b64decode(value["data"][0]),
+        Pubkey.from_string(value["owner"]),
+        value["executable"],
+        value["rentEpoch"],
+    )
+
+
+def _log_events(logs: list[str]) -> Iterator[tuple[int, str, str, str, bytes]]:
+    # (top-level instruction, index, "log", program id, data) of `Program
+    # data:` lines, attributed to the program running when they were logged.
+    stack = []
+    ix = -1
+    for line in logs:
+        if line.startswith(PROGRAM_DATA):
+            if stack:
+                data = base64.b64decode(line[len(PROGRAM_DATA) :])
+                yield ix, str(ix), "log", stack[-1], data
+        elif line.startswith("Program "):
+            parts = line.split()
+            if parts[1].endswith(":"):
+                # Program log:, Program return: and the like.
+                continue
+            if len(parts) == 4 and parts[2] == "invoke":
+                if parts[3] == "[1]":
+                    ix += 1
+                stack.append(parts[1])
+            elif len(parts) >= 3 and parts[2] in ("success", "failed:") and stack:
+                stack.pop()
+
+
+def _pick(value, path: str):
+    # Field of a decoded value by dotted path of names and list indexes.
+    try:
+        for part in path.split("."):
+            if isinstance(value, (list, tuple)):
+                value = value[int(part)]
+            elif isinstance(value, dict):
+                value = value[part] if part in value else value[snake(part)]
+            else:
+                value = getattr(value, snake(part))
+    except (KeyError, IndexError, ValueError, AttributeError):
+        raise KeyError(f"Field not found {path}")
+    return to_dict(value)
+
+
+def _flatten_accounts(items, prefix: str = "") -> list[str]:
+    from anchorpy_core.idl import IdlAccounts
+
+    names = []
+    for item in items:
+        if isinstance(item, IdlAccounts):
+            names += _flatten_accounts(item.accounts, f"{prefix}{item.name}.")
+        else:
+            names.append(prefix + item.name)
+    return names
+
+
+def _idl_address(program_id: str) -> Pubkey:
+    program_id = Pubkey.from_string(program_id)
+    base = Pubkey.find_program_address([], program_id)[0]
+    return Pubkey.create_with_seed(base, "anchor:idl", program_id)
+
+
+def _decode_idl_account(data: bytes) -> str:
+    # 8 bytes discriminator, 32 bytes authority, u32 length and zlib data.
+    (size,) = struct.unpack_from("<I", data, 40)
+    return zlib.decompress(data[44 : 44 + size]).decode()
+
+
+def _valid_idl(idl: str | None) -> bool:
+    try:
+        return "instructions" in json.loads(idl)
+    except Exception:
+        return False
@@ -0,0 +1,128 @@
+import io
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .console import PsolConsole
+
+# Worker threads of a script, commands are expected to wait on RPC.
+JOBS = 8
+
+# Commands that change console or cluster state. They run alone, after
+# every command before them finished.
+BARRIERS = {"cluster", "decoder", "format", "stats", "script"}
+
+
+def read_script(path: str) -> list[tuple[int, str]]:
+    # (line number, command) of each non-empty line, `#` starts a comment.
+    commands = []
+    with open(os.path.expanduser(path)) as f:
+        for i, line in enumerate(f, 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                commands.append((i, line))
+    return commands
+
+
+class CommandOutput(io.TextIOBase):
+    """
+    `sys.stdout` replacement while a script runs. Output of a command run
+    on a worker thread goes to that command's buffer, anything else to the
+    real stdout.
+    """
+
+    def __init__(self, stdout) -> None:
+        self.stdout = stdout
+        self._local = threading.local()
+
+    @property
+    def target(self):
+        return getattr(self._local, "buffer", None) or self.stdout
+
+    @property
+    def buffer(self):
+        # Raises AttributeError for a command buffer, which is text only.
+        return self.target.buffer
+
+    def capture(self, buffer: io.StringIO | None):
+        self._local.buffer = buffer
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        return self.target.write(s)
+
+    def flush(self):
+        self.target.flush()
+
+
+class ScriptRunner(object):
+    """
+    Run independent console commands on a thread pool.
+
+    The workers share the console's `Psol`, so its RPC transport and caches.
+    Output is printed in script order as soon as all commands before it are
+    done. A failed command prints its error to stderr and the script goes
+    on with the next one.
+    """
+
+    def __init__(
+        self, console: "PsolConsole", jobs: int = JOBS, name: str = "script"
+    ) -> None:
+        self.console = console
+        self.jobs = jobs
+        self.name = name
+        self.failed = 0
+
+    def _run(self, line: str) -> tuple[str, Exception | None]:
+        out = io.StringIO()
+        sys.stdout.capture(out)
+        try:
+            self.console.execute(line, profile=False)
+            return out.getvalue(), None
+        except Exception as e:
+            return out.getvalue(), e
+        finally:
+            sys.stdout.capture(None)
+
+    def _report(self, lineno: int, line: str, result: tuple[str, Exception | None]):
+        out, error = result
+        sys.stdout.write(out)
+        if error is not None:
+            self.failed += 1
+            sys.stdout.flush()
+            print(f"Error: {self.name}:{lineno}: {line}: {error}", file=sys.stderr)
+
+    def run(self, commands: list[tuple[int, str]]) -> int:
+        # Return the number of failed commands.
+        stdout = sys.stdout
+        sys.stdout = CommandOutput(stdout)
+        try:
+            with ThreadPoolExecutor(
+                self.jobs, thread_name_prefix="psol-script"
+            ) as pool:
+                pending = deque()
+                for lineno, line in commands:
+                    barrier = line.split()[0] in BARRIERS
+                    # Keep a bounded window of captured output.
+                    while pending and (barrier or len(pending) >= self.jobs * 4):
+                        n, cmd, future = pending.popleft()
+                        self._report(n, cmd, future.result())
+
+                    if barrier:
+                        self._report(lineno, line, self._run(line))
+                    else:
+                        pending.append((lineno, line, pool.submit(self._run, line)))
+
+                while pending:
+                    n, cmd, future = pending.popleft()
+                    self._report(n, cmd, future.result())
+        finally:
+            sys.stdout.flush()
+            sys.stdout = stdout
+        return self.failed
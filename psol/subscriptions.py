@@ -0,0 +1,133 @@
+import asyncio
+import itertools
+import json
+from typing import AsyncIterator
+
+import websockets
+
+# Notifications buffered by the websocket before it stops reading from the
+# socket, so a slow consumer pushes back on the node instead of growing
+# memory.
+MAX_QUEUE = 64
+MAX_MESSAGE_SIZE = 16 << 20
+
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30
+
+NOTIFICATIONS = {"accountNotification", "programNotification", "logsNotification"}
+
+
+def ws_url_of(rpc_url: str) -> str:
+    # Public RPC nodes serve websockets on the same host and path.
+    if rpc_url.startswith("https://"):
+        return "wss://" + rpc_url[len("https://") :]
+    if rpc_url.startswith("http://"):
+        return "ws://" + rpc_url[len("http://") :]
+    return rpc_url
+
+
+class Subscriptions(object):
+    """
+    Account, program and logs subscriptions over a single websocket.
+
+    Iterating yields `(kind, key, result)` for every notification, where
+    `key` is what was subscribed to (pubkey, program id or logs filter).
+    The connection is re-established with exponential backoff and all
+    subscriptions are sent again when it drops.
+    """
+
+    def __init__(self, ws_url: str, commitment: str = "confirmed") -> None:
+        self.ws_url = ws_url
+        self.commitment = commitment
+        self.requests = []
+        self.reconnects = 0
+        self._ids = itertools.count(1)
+        self._early = []
+
+    def account(self, pubkey: str):
+        config = {"encoding": "base64", "commitment": self.commitment}
+        self.requests.append(("account", pubkey, "accountSubscribe", [pubkey, config]))
+
+    def program(self, program_id: str, filters: list[dict] | None = None):
+        config = {"encoding": "base64", "commitment": self.commitment}
+        if filters:
+            config["filters"] = filters
+        self.requests.append(
+            ("program", program_id, "programSubscribe", [program_id, config])
+        )
+
+    def logs(self, mentions: str | None = None):
+        # All logs if `mentions` is None, else logs mentioning the address.
+        target = {"mentions": [mentions]} if mentions else "all"
+        config = {"commitment": self.commitment}
+        self.requests.append(
+            ("logs", mentions or "all", "logsSubscribe", [target, config])
+        )
+
+    async def _subscribe(self, ws) -> dict:
+        # Send all subscriptions, return subscription id -> (kind, key).
+        pending = {}
+        for kind, key, method, params in self.requests:
+            request_id = next(self._ids)
+            pending[request_id] = (kind, key)
+            await ws.send(
+                json.dumps(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "method": method,
+                        "params": params,
+                    }
+                )
+            )
+
+        subscriptions = {}
+        early = []
+        while pending:
+            msg = json.loads(await ws.recv())
+            if "id" not in msg:
+                # A notification of an already confirmed subscription.
+                early.append(msg)
+                continue
+            if "error" in msg:
+                raise ValueError(f"Subscription failed: {msg['error']}")
+            subscriptions[msg["result"]] = pending.pop(msg["id"])
+
+        self._early = early
+        return subscriptions
+
+    async def __aiter__(self) -> AsyncIterator[tuple[str, str, dict]]:
+        assert self.requests, "Nothing to subscribe"
+
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                async with websockets.connect(
+                    self.ws_url, max_queue=MAX_QUEUE, max_size=MAX_MESSAGE_SIZE
+                ) as ws:
+                    subscriptions = await self._subscribe(ws)
+                    delay = RECONNECT_DELAY
+                    for msg in self._early:
+                        item = self._notification(subscriptions, msg)
+                        if item:
+                            yield item
+                    async for raw in ws:
+                        item = self._notification(subscriptions, json.loads(raw))
+                        if item:
+                            yield item
+            except (websockets.ConnectionClosed, OSError, asyncio.TimeoutError):
+                pass
+
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _notification(self, subscriptions: dict, msg: dict) -> tuple | None:
+        if msg.get("method") not in NOTIFICATIONS:
+            return None
+
+        params = msg["params"]
+        if params["subscription"] not in subscriptions:
+            return None
+        kind, key = subscriptions[params["subscription"]]
+        return kind, key, params["result"]
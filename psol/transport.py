@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import threading
+from typing import TYPE_CHECKING, Any, AsyncIterator, Coroutine, Iterator
+
+import httpx
+from solana.rpc.api import Client
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.providers.http import HTTPProvider
+
+from .cache import CacheMiss, RpcCache, cacheable
+from .profiler import profiler
+
+if TYPE_CHECKING:
+    from anchorpy import Provider
+
+# Max open connections per client, they are kept alive between requests.
+POOL_SIZE = 32
+TIMEOUT = httpx.Timeout(30, connect=10)
+
+# Requests per JSON-RPC batch array.
+BATCH_SIZE = 100
+
+
+class RPCError(Exception):
+
+    def __init__(self, error: dict) -> None:
+        self.code = error.get("code")
+        self.message = error.get("message")
+        self.data = error.get("data")
+        if self.code is None:
+            super().__init__(self.message)
+        else:
+            super().__init__(f"RPC error {self.code}: {self.message}")
+
+
+class OfflineError(RPCError):
+
+    def __init__(self, method: str) -> None:
+        super().__init__({"message": f"{method} is not cached, can not fetch offline"})
+
+
+class PooledHTTPProvider(HTTPProvider):
+    # solana's HTTPProvider opens a new connection for every request.
+    # Requests go through the transport session and cache.
+
+    def __init__(self, endpoint: str, transport: "Transport") -> None:
+        super().__init__(endpoint)
+        self.transport = transport
+
+    def make_request_unparsed(self, body) -> str:
+        payload = json.loads(body.to_json())
+        if self.transport.offline or cacheable(payload["method"], payload["params"]):
+            return json.dumps(self.transport.request(payload))
+
+        profiler.count_rpc(payload["method"])
+        with profiler.section("rpc"):
+            r = self.transport.session.post(**self._before_request(body=body))
+        r.raise_for_status()
+        profiler.count_bytes(len(r.content))
+        return r.text
+
+    def make_batch_request_unparsed(self, reqs) -> str:
+        if self.transport.offline:
+            raise OfflineError("Batch request")
+        for req in reqs:
+            profiler.count_rpc(json.loads(req.to_json())["method"])
+        with profiler.section("rpc"):
+            r = self.transport.session.post(**self._before_batch_request(reqs))
+        r.raise_for_status()
+        profiler.count_bytes(len(r.content))
+        return r.text
+
+
+class Transport(object):
+    """
+    Long-lived RPC transport shared by everything in a `Psol` instance.
+
+    Sync requests go through one pooled keep-alive `httpx.Client`, async
+    ones through one `AsyncClient` bound to an event loop that runs in a
+    background thread for the lifetime of the transport. `run()` may be
+    called from any thread. `batch()` sends many calls as a JSON-RPC batch
+    array in a single HTTP round trip.
+
+    Immutable results are stored in `cache` under `namespace`, the RPC
+    endpoint by default: cluster names are not unique, e.g. a local
+    validator may be used as mainnet. In offline mode only cached results
+    are served.
+    """
+
+    def __init__(
+        self,
+        rpc_url: str,
+        pool_size: int = POOL_SIZE,
+        cache: RpcCache | None = None,
+        namespace: str | None = None,
+        offline: bool = False,
+    ) -> None:
+        assert cache or not offline, "Offline mode needs a cache"
+        self.rpc_url = rpc_url
+        self.cache = cache
+        self.namespace = namespace or rpc_url
+        self.offline = offline
+        self.limits = httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size
+        )
+        self.session = httpx.Client(limits=self.limits, timeout=TIMEOUT)
+
+        self.client = Client(rpc_url)
+        self.client._provider = PooledHTTPProvider(rpc_url, self)
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._async_client = None
+        self._provider = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="psol-transport", daemon=True
+                ).start()
+        return self._loop
+
+    @property
+    def async_client(self) -> AsyncClient:
+        # Only use it from coroutines passed to `run()`.
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = AsyncClient(self.rpc_url)
+                self._async_client._provider.session = httpx.AsyncClient(
+                    limits=self.limits, timeout=TIMEOUT
+                )
+        return self._async_client
+
+    @property
+    def async_session(self) -> httpx.AsyncClient:
+        return self.async_client._provider.session
+
+    @property
+    def provider(self) -> Provider:
+        # Read-only use, so no local keypair is needed.
+        if self._provider is None:
+            from anchorpy import Provider, Wallet
+
+            self._provider = Provider(self.async_client, Wallet.dummy())
+        return self._provider
+
+    def run(self, coro: Coroutine) -> Any:
+        # Run a coroutine on the transport loop and wait for the result.
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate(self, agen: AsyncIterator) -> Iterator:
+        # Drive an async generator on the transport loop from a sync caller.
+        future = None
+        try:
+            while True:
+                future = asyncio.run_coroutine_threadsafe(agen.__anext__(), self.loop)
+                try:
+                    item = future.result()
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            if future is not None and not future.done():
+                future.cancel()
+            try:
+                self.run(agen.aclose())
+            except RuntimeError:
+                # Still unwinding from the cancel, it closes itself.
+                pass
+
+    def _payload(self, method: str, params: list | None) -> dict:
+        return {
+            "jsonrpc": "2.0",
+            "id": next(self._ids),
+            "method": method,
+            "params": params or [],
+        }
+
+    def _cache_key(self, payload: dict) -> str | None:
+        if self.cache is None or not cacheable(payload["method"], payload["params"]):
+            return None
+        return self.cache.key(self.namespace, payload["method"], payload["params"])
+
+    def _cached(self, payload: dict) -> tuple[str | None, dict | None]:
+        # Cache key of the request and its cached response if any.
+        key = self._cache_key(payload)
+        if key is not None:
+            try:
+                result = self.cache.get(key)
+                return key, {"jsonrpc": "2.0", "id": payload["id"], "result": result}
+            except CacheMiss:
+                pass
+        if self.offline:
+            raise OfflineError(payload["method"])
+        return key, None
+
+    def _store(self, key: str | None, payload: dict, resp: dict):
+        result = resp.get("result")
+        if key is not None and result is not None:
+            if cacheable(payload["method"], payload["params"], result):
+                self.cache.put(key, payload["method"], result)
+
+    def request(self, payload: dict) -> dict:
+        # Send one JSON-RPC request object, return the response object.
+        key, resp = self._cached(payload)
+        if resp is None:
+            profiler.count_rpc(payload["method"])
+            with profiler.section("rpc"):
+                r = self.session.post(self.rpc_url, json=payload)
+            r.raise_for_status()
+            profiler.count_bytes(len(r.content))
+            resp = r.json()
+            self._store(key, payload, resp)
+        return resp
+
+    async def request_async(self, payload: dict) -> dict:
+        key, resp = self._cached(payload)
+        if resp is None:
+            profiler.count_rpc(payload["method"])
+            with profiler.section("rpc"):
+                r = await self.async_session.post(self.rpc_url, json=payload)
+            r.raise_for_status()
+            profiler.count_bytes(len(r.content))
+            resp = r.json()
+            self._store(key, payload, resp)
+        return resp
+
+    def _split_batch(self, payloads: list[dict]) -> tuple[dict, list, dict]:
+        # Cached responses by id, payloads to send and their cache keys.
+        responses = {}
+        pending = []
+        keys = {}
+        for payload in payloads:
+            try:
+                key, resp = self._cached(payload)
+            except OfflineError as e:
+                resp = {"id": payload["id"], "error": {"message": e.message}}
+                key = None
+            if resp is not None:
+                responses[payload["id"]] = resp
+            else:
+                pending.append(payload)
+                keys[payload["id"]] = key
+        return responses, pending, keys
+
+    def _merge_batch(self, pending: list, keys: dict, resp: list | dict) -> list:
+        # Store the cacheable results of a batch response.
+        if isinstance(resp, dict):
+            raise RPCError(resp.get("error") or {"message": json.dumps(resp)})
+
+        by_id = {payload["id"]: payload for payload in pending}
+        for item in resp:
+            payload = by_id.get(item.get("id"))
+            if payload is not None:
+                self._store(keys[payload["id"]], payload, item)
+        return resp
+
+    def call(self, method: str, params: list | None = None) -> Any:
+        return _result(self.request(self._payload(method, params)))
+
+    def batch(
+        self, calls: list[tuple[str, list]], batch_size: int = BATCH_SIZE
+    ) -> list:
+        # Results in call order, a failed call is returned as its RPCError.
+        results = []
+        for i in range(0, len(calls), batch_size):
+            payloads = [self._payload(m, p) for m, p in calls[i : i + batch_size]]
+            responses, pending, keys = self._split_batch(payloads)
+            if pending:
+                _count_batch(pending)
+                with profiler.section("rpc"):
+                    r = self.session.post(self.rpc_url, json=pending)
+                r.raise_for_status()
+                profiler.count_bytes(len(r.content))
+                for item in self._merge_batch(pending, keys, r.json()):
+                    responses[item.get("id")] = item
+            results += _batch_results(payloads, list(responses.values()))
+        return results
+
+    async def call_async(self, method: str, params: list | None = None) -> Any:
+        return _result(await self.request_async(self._payload(method, params)))
+
+    async def batch_async(
+        self, calls: list[tuple[str, list]], batch_size: int = BATCH_SIZE
+    ) -> list:
+        results = []
+        for i in range(0, len(calls), batch_size):
+            payloads = [self._payload(m, p) for m, p in calls[i : i + batch_size]]
+            responses, pending, keys = self._split_batch(payloads)
+            if pending:
+                _count_batch(pending)
+                with profiler.section("rpc"):
+                    r = await self.async_session.post(self.rpc_url, json=pending)
+                r.raise_for_status()
+                profiler.count_bytes(len(r.content))
+                for item in self._merge_batch(pending, keys, r.json()):
+                    responses[item.get("id")] = item
+            results += _batch_results(payloads, list(responses.values()))
+        return results
+
+    def stream(
+        self,
+        method: str,
+        params: list | None = None,
+        chunk_size: int = 1 << 16,
+        timeout: httpx.Timeout = TIMEOUT,
+    ) -> Iterator[bytes]:
+        # Yield the raw response body while it is being downloaded.
+        if self.offline:
+            raise OfflineError(method)
+
+        profiler.count_rpc(method)
+        with self.session.stream(
+            "POST",
+            self.rpc_url,
+            json=self._payload(method, params),
+            timeout=timeout,
+        ) as r:
+            r.raise_for_status()
+            chunks = r.iter_bytes(chunk_size)
+            while True:
+                # Only the wait for the next chunk is RPC time.
+                with profiler.section("rpc"):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                profiler.count_bytes(len(chunk))
+                yield chunk
+
+    def close(self):
+        self.session.close()
+        if self._loop is None:
+            return
+
+        if self._async_client is not None:
+            self.run(self._async_client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def _result(resp: dict) -> Any:
+    if "error" in resp:
+        raise RPCError(resp["error"])
+    return resp["result"]
+
+
+def _count_batch(payloads: list[dict]):
+    for payload in payloads:
+        profiler.count_rpc(payload["method"])
+
+
+def _batch_results(payloads: list[dict], resp: list | dict) -> list:
+    # Batch responses may come back in any order, match them by id.
+    if isinstance(resp, dict):
+        # The whole batch was rejected, e.g. batching is not supported.
+        raise RPCError(resp.get("error") or {"message": json.dumps(resp)})
+
+    by_id = {item.get("id"): item for item in resp}
+    results = []
+    for payload in payloads:
+        item = by_id.get(payload["id"])
+        if item is None:
+            results.append(RPCError({"message": "Missing batch response"}))
+        elif "error" in item:
+            results.append(RPCError(item["error"]))
+        else:
+            results.append(item["result"])
+    return results
@@ -1,10 +1,17 @@
+import codecs
 import json
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 from solders.pubkey import Pubkey
 
+from .profiler import profiler
+
 
 class SolanaJSONEncoder(json.JSONEncoder):
+    def encode(self, obj):
+        with profiler.section("serialize"):
+            return super().encode(obj)
+
     def default(self, obj):
         if isinstance(obj, Pubkey):
             return str(obj)
@@ -32,3 +39,89 @@ def to_dict(obj: Any):
         return to_dict(obj.params)
 
     return obj
+
+
+def diff(old: Any, new: Any, path: str = "") -> dict[str, list]:
+    # Changed leaves of two decoded values as {"a.b.0": [old, new]}. Lists
+    # of different lengths are compared as a whole.
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        for key in list(old) + [k for k in new if k not in old]:
+            sub = f"{path}.{key}" if path else str(key)
+            changes.update(diff(old.get(key), new.get(key), sub))
+        return changes
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        changes = {}
+        for i, (a, b) in enumerate(zip(old, new)):
+            changes.update(diff(a, b, f"{path}.{i}" if path else str(i)))
+        return changes
+
+    return {path: [old, new]} if old != new else {}
+
+
+def iter_json_array(chunks: Iterable[bytes], key: str = "result") -> Iterator[Any]:
+    # Yield the items of the JSON array stored under `key` from a streamed
+    # document without loading the whole body. If `key` is missing (e.g. a
+    # JSON-RPC error), a ValueError carrying the decoded document is raised.
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    eof = False
+
+    def _read(min_size=1) -> bool:
+        # Append at least `min_size` chars unless the stream ends first.
+        nonlocal buf, eof
+        size = len(buf)
+        while not eof and len(buf) < size + min_size:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                buf += utf8.decode(b"", final=True)
+            else:
+                buf += utf8.decode(chunk)
+        return len(buf) > size
+
+    def _skip(pos: int, chars: str) -> int:
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or not _read():
+                return pos
+
+    # Locate `"key"` followed by `:` and `[`.
+    marker = f'"{key}"'
+    while True:
+        i = buf.find(marker)
+        if i >= 0:
+            pos = _skip(i + len(marker), " \t\r\n:")
+            if pos < len(buf) and buf[pos] == "[":
+                break
+        if not _read():
+            raise ValueError(json.loads(buf))
+
+    pos += 1
+    while True:
+        pos = _skip(pos, " \t\r\n,")
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of JSON array")
+        if buf[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+            # A number may be cut at the chunk boundary, read on to be sure.
+            if end == len(buf) and _read():
+                continue
+        except json.JSONDecodeError:
+            # Grow the buffer geometrically so huge items stay linear.
+            if not _read(len(buf) - pos):
+                raise
+            continue
+
+        yield item
+        pos = end
+        if pos > len(buf) // 2:
+            buf = buf[pos:]
+            pos = 0
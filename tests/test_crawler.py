@@ -0,0 +1,145 @@
+import json
+
+import httpx
+from solders.signature import Signature
+
+from psol import crawler
+from psol.cache import RpcCache
+from psol.crawler import Crawler
+from psol.psol import Psol
+
+ADDRESS = "11111111111111111111111111111111"
+SIGNATURES = [
+    str(Signature(i.to_bytes(2, "little") + bytes(62))) for i in range(1, 1301)
+]
+
+
+class Node(object):
+    # getSignaturesForAddress and getTransaction of a mock RPC node.
+
+    def __init__(self, failing: set[str]) -> None:
+        self.failing = failing
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        if isinstance(body, list):
+            return httpx.Response(200, json=[self.transaction(r) for r in body])
+        return httpx.Response(200, json=self.signatures(body))
+
+    def signatures(self, req: dict) -> dict:
+        config = req["params"][1]
+        signatures = SIGNATURES
+        if config.get("before"):
+            signatures = signatures[signatures.index(config["before"]) + 1 :]
+        if config.get("until"):
+            signatures = signatures[: signatures.index(config["until"])]
+        items = [
+            {
+                "signature": signature,
+                "slot": 1,
+                "err": None,
+                "memo": None,
+                "blockTime": 0,
+                "confirmationStatus": "finalized",
+            }
+            for signature in signatures[: config["limit"]]
+        ]
+        return {"jsonrpc": "2.0", "id": req["id"], "result": items}
+
+    def transaction(self, req: dict) -> dict:
+        signature = req["params"][0]
+        if signature in self.failing:
+            error = {"code": -32011, "message": "Transaction history not available"}
+            return {"jsonrpc": "2.0", "id": req["id"], "error": error}
+        tx = {
+            "slot": 1,
+            "blockTime": 0,
+            "transaction": {
+                "signatures": [signature],
+                "message": {"accountKeys": [], "instructions": []},
+            },
+            "meta": {"err": None},
+        }
+        return {"jsonrpc": "2.0", "id": req["id"], "result": tx}
+
+
+def make_crawler(tmp_path, node: Node) -> Crawler:
+    psol = Psol("mainnet", rpc_cache=RpcCache(tmp_path / "rpc_cache.db"))
+    mock = httpx.MockTransport(node.handle)
+    psol.transport.session = httpx.Client(transport=mock)
+    psol.transport.async_client._provider.session = httpx.AsyncClient(transport=mock)
+    return Crawler(psol, ADDRESS, output=str(tmp_path / "txs.ndjson"))
+
+
+def written(tmp_path) -> list[str]:
+    lines = (tmp_path / "txs.ndjson").read_text().splitlines()
+    return [json.loads(line)["signature"] for line in lines]
+
+
+def test_resume(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawler, "CRAWL_DATA", tmp_path)
+    node = Node(set())
+
+    assert make_crawler(tmp_path, node).run(limit=250) == 250
+    c = make_crawler(tmp_path, node)
+    assert c.run() == len(SIGNATURES) - 250
+    assert c.count == len(SIGNATURES)
+    assert written(tmp_path) == SIGNATURES
+
+
+def test_failed_signatures_are_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawler, "CRAWL_DATA", tmp_path)
+    node = Node({SIGNATURES[5], SIGNATURES[1200]})
+
+    c = make_crawler(tmp_path, node)
+    assert c.run() == len(SIGNATURES) - 2
+    assert c.failed == [SIGNATURES[5], SIGNATURES[1200]]
+    assert SIGNATURES[5] not in written(tmp_path)
+    checkpoint = json.loads(c.checkpoint_path.read_text())
+    assert checkpoint["before"] == SIGNATURES[-1]
+    assert checkpoint["failed"] == c.failed
+
+    # The next run only fetches the failed txs again, one still fails.
+    node.failing = {SIGNATURES[1200]}
+    c = make_crawler(tmp_path, node)
+    assert c.run() == 1
+    assert c.failed == [SIGNATURES[1200]]
+    assert written(tmp_path)[-1] == SIGNATURES[5]
+
+    node.failing = set()
+    c = make_crawler(tmp_path, node)
+    assert c.run() == 1
+    assert c.failed == []
+    assert sorted(written(tmp_path)) == sorted(SIGNATURES)
+
+
+def test_outputs_keep_their_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawler, "CRAWL_DATA", tmp_path)
+    node = Node(set())
+    other = tmp_path / "other.ndjson"
+    other.write_text('{"kept": true}\n')
+
+    default = make_crawler(tmp_path, node)
+    assert default.run(limit=100) == 100
+    c = Crawler(default.psol, ADDRESS, output=str(other))
+    assert c.run(limit=50) == 50
+    assert c.checkpoint_path != default.checkpoint_path
+    assert other.read_text().startswith('{"kept": true}\n')
+
+    # The crawl into the default file resumes from its own checkpoint.
+    default = Crawler(c.psol, ADDRESS, output=default.output)
+    assert default.run(limit=100) == 100
+    assert written(tmp_path) == SIGNATURES[:200]
+
+
+def test_checkpoint_of_another_output(tmp_path, monkeypatch):
+    # A checkpoint left by another output is not resumed and does not
+    # truncate the file.
+    monkeypatch.setattr(crawler, "CRAWL_DATA", tmp_path)
+    c = make_crawler(tmp_path, Node(set()))
+    checkpoint = {"output": str(tmp_path / "elsewhere.ndjson"), "offset": 0}
+    c.checkpoint_path.write_text(json.dumps(checkpoint))
+    (tmp_path / "txs.ndjson").write_text(json.dumps({"signature": "kept"}) + "\n")
+
+    assert c.run(limit=10) == 10
+    assert written(tmp_path) == ["kept", *SIGNATURES[:10]]
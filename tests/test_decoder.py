@@ -0,0 +1,212 @@
+import json
+import random
+from hashlib import sha256
+
+import pytest
+from anchorpy import Coder, Idl
+
+from benchmarks.common import (
+    account_blobs,
+    idl_types,
+    instruction_blobs,
+    load_idl,
+    normalize,
+    random_borsh,
+)
+from psol import idl as idl_module
+from psol.decoder import CompiledCoder, UnsupportedType
+from psol.idl import IdlCache, IdlDatabase
+from psol.psol import Psol
+
+BLOBS = 300
+
+# Accounts whose fields nest the types with a variable layout.
+NESTED_IDL = {
+    "version": "0.1.0",
+    "name": "nested",
+    "instructions": [],
+    "accounts": [
+        {
+            "name": "Enums",
+            "type": {
+                "kind": "struct",
+                "fields": [
+                    {"name": "shape", "type": {"defined": "Shape"}},
+                    {"name": "shapes", "type": {"vec": {"defined": "Shape"}}},
+                    {"name": "pair", "type": {"array": [{"defined": "Shape"}, 2]}},
+                    {"name": "maybe", "type": {"option": {"defined": "Shape"}}},
+                ],
+            },
+        },
+        {
+            "name": "Options",
+            "type": {
+                "kind": "struct",
+                "fields": [
+                    {"name": "small", "type": {"option": "u8"}},
+                    {"name": "wide", "type": {"option": "u128"}},
+                    {"name": "key", "type": {"option": "publicKey"}},
+                    {"name": "label", "type": {"option": "string"}},
+                    {"name": "point", "type": {"option": {"defined": "Point"}}},
+                    {"name": "items", "type": {"option": {"vec": "u32"}}},
+                    {"name": "after", "type": "u16"},
+                ],
+            },
+        },
+        {
+            "name": "Vecs",
+            "type": {
+                "kind": "struct",
+                "fields": [
+                    {"name": "empty", "type": {"vec": "u8"}},
+                    {"name": "points", "type": {"vec": {"defined": "Point"}}},
+                    {"name": "nested", "type": {"vec": {"vec": "i16"}}},
+                    {"name": "grid", "type": {"vec": {"array": ["u8", 3]}}},
+                    {"name": "names", "type": {"vec": "string"}},
+                    {"name": "blobs", "type": {"vec": "bytes"}},
+                    {"name": "maybes", "type": {"vec": {"option": "i64"}}},
+                    {"name": "after", "type": "u16"},
+                ],
+            },
+        },
+    ],
+    "types": [
+        {
+            "name": "Point",
+            "type": {
+                "kind": "struct",
+                "fields": [
+                    {"name": "x", "type": "i32"},
+                    {"name": "y", "type": "i32"},
+                ],
+            },
+        },
+        {
+            "name": "Shape",
+            "type": {
+                "kind": "enum",
+                "variants": [
+                    {"name": "Empty"},
+                    {
+                        "name": "Dot",
+                        "fields": [{"name": "at", "type": {"defined": "Point"}}],
+                    },
+                    {
+                        "name": "Line",
+                        "fields": [{"defined": "Point"}, {"defined": "Point"}],
+                    },
+                    {
+                        "name": "Poly",
+                        "fields": [
+                            {"name": "points", "type": {"vec": {"defined": "Point"}}}
+                        ],
+                    },
+                    {
+                        "name": "Tagged",
+                        "fields": [{"name": "tag", "type": {"option": "string"}}],
+                    },
+                ],
+            },
+        },
+    ],
+}
+
+
+def coders(idl: dict) -> tuple[Coder, CompiledCoder]:
+    return Coder(Idl.from_json(json.dumps(idl))), CompiledCoder(idl)
+
+
+def account_blob(idl: dict, name: str, rnd: random.Random) -> bytes:
+    disc = sha256(f"account:{name}".encode()).digest()[:8]
+    return disc + random_borsh({"defined": name}, idl_types(idl), rnd)
+
+
+def test_accounts():
+    idl = load_idl()
+    anchor, compiled = coders(idl)
+    for blob in account_blobs(idl, BLOBS):
+        expected = normalize(anchor.accounts.decode(blob))
+        _, got = compiled.decode_account(blob)
+        assert json.dumps(got) == json.dumps(expected), blob.hex()
+
+
+def test_instructions():
+    idl = load_idl()
+    anchor, compiled = coders(idl)
+    for blob in instruction_blobs(idl, BLOBS):
+        parsed = anchor.instruction.parse(blob)
+        expected = [parsed.name, normalize(parsed.data)]
+        got = list(compiled.decode_instruction(blob))
+        assert json.dumps(got) == json.dumps(expected), blob.hex()
+
+
+@pytest.mark.parametrize("account", ["Enums", "Options", "Vecs"])
+def test_nested(account):
+    anchor, compiled = coders(NESTED_IDL)
+    rnd = random.Random(account)
+    for _ in range(BLOBS):
+        blob = account_blob(NESTED_IDL, account, rnd)
+        expected = normalize(anchor.accounts.decode(blob))
+        name, got = compiled.decode_account(blob)
+        assert name == account
+        assert json.dumps(got) == json.dumps(expected), blob.hex()
+
+
+def test_generic_array_length(tmp_path):
+    idl = json.loads(json.dumps(NESTED_IDL))
+    idl["types"][0]["type"]["fields"][0]["type"] = {"array": ["u16", {"generic": "N"}]}
+    with pytest.raises(UnsupportedType):
+        CompiledCoder(idl)
+
+    path = tmp_path / "idl.json"
+    path.write_text(json.dumps(idl))
+    assert IdlCache().get_compiled(str(path)) is None
+
+
+def test_field_slice():
+    idl = load_idl()
+    compiled = CompiledCoder(idl)
+    structs = len(compiled._structs)
+    disc = sha256(b"account:OrderBook").digest()[:8]
+    blobs = [b for b in account_blobs(idl, 30) if b[:8] == disc]
+    for path in ["market", "seq_num", "bids.3.price", "bids.15", "bids.0.side"]:
+        offset, _, decode = compiled.field_slice("OrderBook", path)
+        assert compiled.field_slice("OrderBook", path)[2] is decode
+        for blob in blobs:
+            _, expected = compiled.decode_account(blob)
+            for part in path.split("."):
+                expected = expected[int(part) if part.isdigit() else part]
+            assert decode(memoryview(blob), offset) == expected
+
+    # Fields after a variable-size one have no fixed offset.
+    assert compiled.field_slice("OrderBook", "owners.2") is None
+    # Members of vecs and options are only known once decoded.
+    assert compiled.field_slice("OrderBook", "asks.0.price") is None
+    assert compiled.field_slice("OrderBook", "best.price") is None
+    with pytest.raises(KeyError):
+        compiled.field_slice("OrderBook", "bids.0.missing")
+    assert len(compiled._structs) == structs
+
+
+def test_compiled_falls_back(tmp_path, monkeypatch):
+    # Errors of the compiled decoder are retried with the anchorpy coder.
+    monkeypatch.setattr(idl_module, "IDL_CACHE", tmp_path / "idl_cache")
+    idl = load_idl()
+    db = IdlDatabase(tmp_path / "index.db")
+    db.save_idl("mainnet", "Bench111", json.dumps(idl))
+    psol = Psol("mainnet", offline=True)
+    psol._idl_db = db
+
+    def fail(self, data):
+        raise UnsupportedType("unsupported")
+
+    monkeypatch.setattr(CompiledCoder, "decode_instruction", fail)
+    monkeypatch.setattr(CompiledCoder, "decode_account", fail)
+    anchor = Coder(Idl.from_json(json.dumps(idl)))
+    blob = next(iter(instruction_blobs(idl, 1)))
+    parsed = anchor.instruction.parse(blob)
+    assert psol.decode_ix_data(blob.hex())["name"] == parsed.name
+    blob = next(iter(account_blobs(idl, 1)))
+    name, data = psol.decode_account_data(blob)
+    assert name == anchor.accounts.discriminator_to_acc_name[blob[:8]]
+    assert data == anchor.accounts.decode(blob).__dict__
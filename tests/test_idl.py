@@ -0,0 +1,50 @@
+import json
+from hashlib import sha256
+
+from benchmarks.common import load_idl
+from psol import idl as idl_module
+from psol.idl import IdlDatabase
+
+
+def discriminator(preimage: str) -> str:
+    return sha256(preimage.encode()).digest()[:8].hex()
+
+
+def test_legacy_local_idl(tmp_path, monkeypatch):
+    # An IDL loaded with local_idl before the SQLite index, listed in the
+    # JSON index files and saved under idl_cache/local.
+    for name in ("ACCOUNTS_IDL", "INSTRUCTIONS_IDL", "NAMES"):
+        monkeypatch.setattr(idl_module, name, tmp_path / f"{name.lower()}.json")
+    saved = tmp_path / "idl_cache" / "local" / "bench.json"
+    saved.parent.mkdir(parents=True)
+    saved.write_text(json.dumps(load_idl()))
+    account = discriminator("account:OrderBook")
+    ix = discriminator("global:initialize")
+    idl_module.ACCOUNTS_IDL.write_text(json.dumps({account: [str(saved), "OrderBook"]}))
+    idl_module.INSTRUCTIONS_IDL.write_text(json.dumps({ix: [str(saved), "initialize"]}))
+
+    db = IdlDatabase(tmp_path / "index.db")
+    assert not idl_module.ACCOUNTS_IDL.exists()
+    for cluster in ("mainnet", "devnet", "local"):
+        _, coder, name = db.load_coder_by_account_discriminator(cluster, account)
+        assert coder is not None and name == "OrderBook"
+        _, coder, name = db.load_coder_by_instruction_discriminator(cluster, ix)
+        assert coder is not None and name == "initialize"
+    # Events are indexed again from the saved file.
+    event = discriminator("event:Sent")
+    assert db.load_coder_by_event_discriminator("mainnet", event)[2] == "Sent"
+
+
+def test_cluster_entries_win(tmp_path, monkeypatch):
+    monkeypatch.setattr(idl_module, "IDL_CACHE", tmp_path / "idl_cache")
+    db = IdlDatabase(tmp_path / "index.db")
+    idl = json.dumps(load_idl())
+    local = db.save_idl("local", "bench", idl)
+    mainnet = db.save_idl("mainnet", "Bench111", idl)
+    devnet = db.save_idl("devnet", "Bench222", idl)
+
+    account = discriminator("account:Config")
+    assert db._lookup("mainnet", "account", account) == (mainnet, "Config")
+    assert db._lookup("devnet", "account", account, "Bench222") == (devnet, "Config")
+    assert db._lookup("testnet", "account", account) == (local, "Config")
+    assert db._lookup("local", "account", account) == (local, "Config")
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+from anchorpy import Coder, Idl
+
+from benchmarks.common import account_blobs, load_idl, normalize
+from psol import output
+
+from .test_decoder import NESTED_IDL
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(output, "_orjson", False)
+    elif not output._fast_json():
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_anchorpy_values(encoder):
+    # Nested structs, enums, pubkeys and bytes of anchorpy decoded accounts
+    # come out as the compiled decoder's plain values.
+    for idl in (load_idl(), NESTED_IDL):
+        anchor = Coder(Idl.from_json(json.dumps(idl)))
+        for blob in account_blobs(idl, 90):
+            value = anchor.accounts.decode(blob)
+            expected = normalize(value)
+            assert json.loads(output.dumps(value)) == expected
+            assert json.loads(output.dumps(value, pretty=True)) == expected
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import websockets
+
+from psol import subscriptions
+from psol.subscriptions import Subscriptions
+
+PUBKEY = "So11111111111111111111111111111111111111112"
+PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGqPFXCWuBvf9Ss623VQ5DA"
+
+
+def notification(method: str, subscription: int, value) -> str:
+    return json.dumps(
+        {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": {"subscription": subscription, "result": {"value": value}},
+        }
+    )
+
+
+def reply(request: dict, subscription: int) -> str:
+    return json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": subscription})
+
+
+async def collect(handler, setup, count: int) -> tuple[Subscriptions, list]:
+    # Run `setup(subs)` and collect `count` notifications from a local server
+    # answering with `handler(ws, connection)`.
+    connections = 0
+
+    async def serve(ws, path=None):
+        nonlocal connections
+        connections += 1
+        await handler(ws, connections)
+
+    async with websockets.serve(serve, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        subs = Subscriptions(f"ws://127.0.0.1:{port}")
+        setup(subs)
+        items = []
+        async for item in subs:
+            items.append(item)
+            if len(items) == count:
+                break
+    return subs, items
+
+
+def test_subscribe_and_notify():
+    async def handler(ws, connection):
+        requests = [json.loads(await ws.recv()) for _ in range(3)]
+        assert [r["method"] for r in requests] == [
+            "accountSubscribe",
+            "programSubscribe",
+            "logsSubscribe",
+        ]
+        for i, request in enumerate(requests):
+            await ws.send(reply(request, 10 + i))
+        await ws.send(notification("logsNotification", 12, "logs"))
+        await ws.send(notification("accountNotification", 10, "account"))
+        # Unknown subscriptions are ignored.
+        await ws.send(notification("accountNotification", 99, "other"))
+        await ws.send(notification("programNotification", 11, "program"))
+        await ws.wait_closed()
+
+    def setup(subs):
+        subs.account(PUBKEY)
+        subs.program(PROGRAM_ID)
+        subs.logs(PROGRAM_ID)
+
+    subs, items = asyncio.run(collect(handler, setup, 3))
+    assert items == [
+        ("logs", PROGRAM_ID, {"value": "logs"}),
+        ("account", PUBKEY, {"value": "account"}),
+        ("program", PROGRAM_ID, {"value": "program"}),
+    ]
+    assert subs.reconnects == 0
+
+
+def test_early_notification():
+    # The first subscription notifies before the second one is confirmed.
+    async def handler(ws, connection):
+        first = json.loads(await ws.recv())
+        second = json.loads(await ws.recv())
+        await ws.send(reply(first, 1))
+        await ws.send(notification("accountNotification", 1, "early"))
+        await ws.send(reply(second, 2))
+        await ws.send(notification("accountNotification", 2, "late"))
+        await ws.wait_closed()
+
+    def setup(subs):
+        subs.account(PUBKEY)
+        subs.account(PROGRAM_ID)
+
+    _, items = asyncio.run(collect(handler, setup, 2))
+    assert items == [
+        ("account", PUBKEY, {"value": "early"}),
+        ("account", PROGRAM_ID, {"value": "late"}),
+    ]
+
+
+def test_reconnect(monkeypatch):
+    monkeypatch.setattr(subscriptions, "RECONNECT_DELAY", 0.01)
+
+    # The server drops the first connection after one notification, the
+    # subscription is sent again and gets a new id.
+    async def handler(ws, connection):
+        request = json.loads(await ws.recv())
+        assert request["method"] == "accountSubscribe"
+        await ws.send(reply(request, connection))
+        await ws.send(notification("accountNotification", connection, connection))
+        if connection == 1:
+            await ws.close()
+        else:
+            await ws.wait_closed()
+
+    subs, items = asyncio.run(collect(handler, lambda subs: subs.account(PUBKEY), 2))
+    assert items == [
+        ("account", PUBKEY, {"value": 1}),
+        ("account", PUBKEY, {"value": 2}),
+    ]
+    assert subs.reconnects == 1
@@ -0,0 +1,157 @@
+import json
+
+import httpx
+import pytest
+from solders.pubkey import Pubkey
+
+from psol.cache import RpcCache
+from psol.transport import RPCError, Transport
+from psol.utils import iter_json_array
+
+RPC_URL = "http://rpc.test"
+
+
+def make_transport(handler, **kwargs) -> Transport:
+    # Transport whose sync requests are answered by `handler(body)`.
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        return httpx.Response(200, json=handler(body))
+
+    transport = Transport(RPC_URL, **kwargs)
+    transport.session = httpx.Client(transport=httpx.MockTransport(respond))
+    transport.requests = requests
+    return transport
+
+
+def test_call():
+    transport = make_transport(
+        lambda req: {"jsonrpc": "2.0", "id": req["id"], "result": 42}
+    )
+    assert transport.call("getSlot") == 42
+    assert transport.requests[0]["method"] == "getSlot"
+    assert transport.requests[0]["params"] == []
+
+
+def test_call_error():
+    transport = make_transport(
+        lambda req: {
+            "jsonrpc": "2.0",
+            "id": req["id"],
+            "error": {"code": -32602, "message": "Invalid params"},
+        }
+    )
+    with pytest.raises(RPCError) as e:
+        transport.call("getBalance", ["bad"])
+    assert e.value.code == -32602
+    assert e.value.message == "Invalid params"
+
+
+def test_batch():
+    # Responses come back reversed and the second call fails.
+    def handler(reqs):
+        resp = []
+        for req in reqs:
+            if req["params"] == [2]:
+                error = {"code": -32009, "message": "Slot skipped"}
+                resp.append({"jsonrpc": "2.0", "id": req["id"], "error": error})
+            else:
+                resp.append(
+                    {"jsonrpc": "2.0", "id": req["id"], "result": req["params"][0]}
+                )
+        return resp[::-1]
+
+    transport = make_transport(handler)
+    results = transport.batch([("getBlock", [i]) for i in range(5)], batch_size=3)
+    assert len(transport.requests) == 2
+    assert [results[i] for i in (0, 1, 3, 4)] == [0, 1, 3, 4]
+    assert isinstance(results[2], RPCError)
+    assert results[2].code == -32009
+
+
+def test_batch_missing_response():
+    transport = make_transport(
+        lambda reqs: [{"jsonrpc": "2.0", "id": reqs[0]["id"], "result": 1}]
+    )
+    first, second = transport.batch([("getSlot", []), ("getSlot", [])])
+    assert first == 1
+    assert isinstance(second, RPCError)
+
+
+def test_batch_rejected():
+    transport = make_transport(
+        lambda reqs: {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {"code": -32600, "message": "Batch requests are disabled"},
+        }
+    )
+    with pytest.raises(RPCError) as e:
+        transport.batch([("getSlot", []), ("getSlot", [])])
+    assert e.value.code == -32600
+
+
+def test_stream():
+    items = [{"slot": i, "memo": "é日" * i} for i in range(50)]
+    transport = make_transport(
+        lambda req: {"jsonrpc": "2.0", "id": req["id"], "result": items}
+    )
+    # Small chunks split the multi-byte characters and the items.
+    chunks = transport.stream("getProgramAccounts", ["Prog"], chunk_size=7)
+    assert list(iter_json_array(chunks)) == items
+
+
+def test_stream_error():
+    error = {"code": -32010, "message": "Excluded from account secondary indexes"}
+    transport = make_transport(
+        lambda req: {"jsonrpc": "2.0", "id": req["id"], "error": error}
+    )
+    with pytest.raises(ValueError) as e:
+        list(iter_json_array(transport.stream("getProgramAccounts", ["Prog"])))
+    assert e.value.args[0]["error"] == error
+
+
+def test_cached_call(tmp_path):
+    transport = make_transport(
+        lambda req: {"jsonrpc": "2.0", "id": req["id"], "result": {"slot": 7}},
+        cache=RpcCache(tmp_path / "rpc_cache.db"),
+    )
+    assert transport.call("getTransaction", ["sig"]) == {"slot": 7}
+    assert transport.call("getTransaction", ["sig"]) == {"slot": 7}
+    assert len(transport.requests) == 1
+
+    # Another endpoint does not share the cached results.
+    other = make_transport(
+        lambda req: {"jsonrpc": "2.0", "id": req["id"], "result": {"slot": 8}},
+        cache=transport.cache,
+        namespace="http://other.test",
+    )
+    assert other.call("getTransaction", ["sig"]) == {"slot": 8}
+
+
+def test_client(tmp_path):
+    # solana Client requests go through the pooled session and cache.
+    account = {
+        "data": ["", "base64"],
+        "executable": True,
+        "lamports": 1,
+        "owner": "BPFLoaderUpgradeab1e11111111111111111111111",
+        "rentEpoch": 0,
+        "space": 0,
+    }
+
+    def handler(req):
+        if req["method"] == "getSlot":
+            result = 99
+        else:
+            result = {"context": {"slot": 99}, "value": account}
+        return {"jsonrpc": "2.0", "id": req["id"], "result": result}
+
+    transport = make_transport(handler, cache=RpcCache(tmp_path / "rpc_cache.db"))
+    program = Pubkey.from_string("11111111111111111111111111111111")
+    assert transport.client.get_slot().value == 99
+    for _ in range(2):
+        assert transport.client.get_account_info(program).value.executable
+    assert [r["method"] for r in transport.requests] == ["getSlot", "getAccountInfo"]